@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "auth_project.settings")
 
 application = get_asgi_application()
+
+# Do the first request's one-off work now, before a preforking server forks
+from users.warmup import maybe_warm_up  # noqa: E402
+
+maybe_warm_up()
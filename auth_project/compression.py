@@ -0,0 +1,193 @@
+"""
+Response compression.
+
+CompressionMiddleware compresses text responses with brotli (when the
+brotli package is installed and the client accepts it) or gzip:
+
+- Responses shorter than COMPRESSION_MIN_SIZE bytes, or whose content type
+  is not in COMPRESSION_CONTENT_TYPES, are sent as they are.
+- Responses of views decorated with @shared_response, whose body is the
+  same for every user (the AJAX validators, the postal lookup), are kept
+  compressed in a small LRU keyed by a hash of the uncompressed body, so
+  each distinct body is compressed once per process. Other responses are
+  compressed every time; pages that render the user or the session
+  (Vary: Cookie) are never kept in memory, even when marked.
+- A response that rendered a CSRF token is never served from, or stored in,
+  that cache, and is compressed with gzip plus a random-length padding in the
+  gzip header, like Django's GZipMiddleware, so its compressed length does
+  not leak the token through BREACH-style attacks. Django's per-response
+  token masking covers the rest.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import has_vary_header, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Random bytes of padding for responses carrying a CSRF token
+MAX_RANDOM_BYTES = 100
+
+
+def accepted_encodings(header):
+    """Encodings the Accept-Encoding header allows, with their q-values"""
+    encodings = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        encodings[name] = quality
+    return {name for name, quality in encodings.items() if quality > 0}
+
+
+class CompressedBodyCache:
+    """Thread-safe LRU of compressed bodies keyed by (body digest, encoding)"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, key, body):
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+body_cache = CompressedBodyCache(settings.COMPRESSION_CACHE_ENTRIES)
+
+
+def shared_response(view_func):
+    """Mark the view's responses as identical for every user, see the module docstring"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        response.shared_body = True
+        return response
+    return wrapper
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_SIZE:
+            return response
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type not in settings.COMPRESSION_CONTENT_TYPES:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        carries_token = self.carries_csrf_token(request, response)
+
+        if response.streaming:
+            # Only gzip can be padded as it streams; Django's helper does it
+            if 'gzip' not in accepted or response.is_async:
+                return response
+            response.streaming_content = compress_sequence(
+                response.streaming_content, max_random_bytes=MAX_RANDOM_BYTES
+            )
+            del response.headers['Content-Length']
+            return self.mark_compressed(response, 'gzip')
+
+        if carries_token:
+            if 'gzip' not in accepted:
+                return response
+            encoding = 'gzip'
+            compressed = compress_string(response.content, max_random_bytes=MAX_RANDOM_BYTES)
+        else:
+            if brotli is not None and 'br' in accepted:
+                encoding = 'br'
+            elif 'gzip' in accepted:
+                encoding = 'gzip'
+            else:
+                return response
+            if self.is_shared(request, response):
+                compressed = self.compress_shared(response.content, encoding)
+            else:
+                compressed = compress(response.content, encoding)
+
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        return self.mark_compressed(response, encoding)
+
+    def carries_csrf_token(self, request, response):
+        """Whether get_token() was called while rendering this response"""
+        # CsrfViewMiddleware clears the flag once it has (re)sent the cookie
+        return bool(request.META.get('CSRF_COOKIE_NEEDS_UPDATE')) or settings.CSRF_COOKIE_NAME in response.cookies
+
+    def is_shared(self, request, response):
+        """Whether the body may be kept for other users: marked, and not per session"""
+        return (
+            getattr(response, 'shared_body', False)
+            and not has_vary_header(response, 'Cookie')
+            and not request.META.get('HTTP_AUTHORIZATION')
+        )
+
+    def compress_shared(self, content, encoding):
+        """Compress a body that may be sent to other users too, through the LRU"""
+        if len(content) > settings.COMPRESSION_CACHE_MAX_BODY:
+            return compress(content, encoding)
+        key = (hashlib.sha1(content).digest(), encoding)
+        compressed = body_cache.get(key)
+        if compressed is None:
+            compressed = compress(content, encoding)
+            body_cache.set(key, compressed)
+        return compressed
+
+    def mark_compressed(self, response, encoding):
+        # A strong ETag no longer matches the bytes sent
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,128 @@
+"""
+Primary/replica database routing.
+
+Reads go to one of settings.DATABASE_REPLICAS and writes to the primary
+('default'). Once a request writes, its remaining reads stay on the primary
+so it sees its own writes, and a short-lived cookie keeps the same client on
+the primary for the next few requests (e.g. the redirect after signup) while
+the replicas catch up. Replicas that fail to connect are skipped for
+REPLICA_RETRY_SECONDS and reads fall back to the primary. A replica that
+connects but then fails a query (a copy without the tables, a dropped
+connection) is skipped the same way, and that query is run again on the
+primary by fall_back_to_primary(), so the caller never sees the error.
+"""
+
+import logging
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, InterfaceError, OperationalError, connections
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE_NAME = 'db_primary_pin'
+
+_pinned = ContextVar('db_pinned_to_primary', default=False)
+_wrote = ContextVar('db_wrote_to_primary', default=False)
+
+# alias -> monotonic time until which the replica is considered down
+_replica_down_until = {}
+
+
+def pin_to_primary():
+    """Send every following read of the current request/context to the primary"""
+    _pinned.set(True)
+
+
+def reset_pinning(pinned=False):
+    _pinned.set(pinned)
+    _wrote.set(False)
+
+
+def mark_replica_down(alias):
+    _replica_down_until[alias] = time.monotonic() + settings.REPLICA_RETRY_SECONDS
+    logger.warning('Database replica %r is unavailable, reading from the primary', alias)
+
+
+def fall_back_to_primary(execute, sql, params, many, context):
+    """
+    Execute wrapper installed on replica connections: a query the replica
+    fails is run on the primary instead, and the replica is skipped for a
+    while. The primary's cursor is swapped into the caller's cursor wrapper,
+    so the rows are fetched from there.
+    """
+    try:
+        return execute(sql, params, many, context)
+    except (OperationalError, InterfaceError):
+        mark_replica_down(context['connection'].alias)
+    primary = connections[DEFAULT_DB_ALIAS].cursor()
+    result = primary.executemany(sql, params) if many else primary.execute(sql, params)
+    context['cursor'].cursor = primary.cursor
+    return result
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return self.pick_replica() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _pinned.set(True)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+    def pick_replica(self):
+        replicas = list(getattr(settings, 'DATABASE_REPLICAS', []))
+        random.shuffle(replicas)
+        now = time.monotonic()
+        for alias in replicas:
+            if _replica_down_until.get(alias, 0) > now:
+                continue
+            if self.replica_available(alias):
+                return alias
+            mark_replica_down(alias)
+        return None
+
+    def replica_available(self, alias):
+        connection = connections[alias]
+        try:
+            connection.ensure_connection()
+        except Exception:
+            return False
+        if fall_back_to_primary not in connection.execute_wrappers:
+            connection.execute_wrappers.append(fall_back_to_primary)
+        return True
+
+
+class ReplicaPinningMiddleware(MiddlewareMixin):
+    """
+    Resets read pinning for every request and carries it across requests in
+    a cookie for REPLICA_PIN_SECONDS after a write
+    """
+    def process_request(self, request):
+        reset_pinning(pinned=PIN_COOKIE_NAME in request.COOKIES)
+
+    def process_response(self, request, response):
+        if _wrote.get() and getattr(settings, 'DATABASE_REPLICAS', None):
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        reset_pinning()
+        return response
@@ -0,0 +1,166 @@
+"""
+Statistical profiling of live requests.
+
+With PROFILING_ENABLED, ProfilingMiddleware picks PROFILING_SAMPLE_RATE of
+the requests at random, plus any request a staff user makes with
+`?_profile=1`, and registers the thread serving it with the sampler. A single
+daemon thread per process wakes every PROFILING_INTERVAL seconds while such
+requests are in flight, reads their stacks from sys._current_frames() and
+counts them as collapsed stacks under the view's name:
+
+    users:login;django.core.handlers.base:BaseHandler._get_response;...;hashlib:pbkdf2_hmac 12
+
+Counts are appended to PROFILING_DIR/profile-<pid>.collapsed every
+PROFILING_FLUSH_INTERVAL seconds; `manage.py profile_report` merges the files
+into flamegraph.pl / speedscope input.
+
+With PROFILING_ENABLED off the middleware raises MiddlewareNotUsed, so it is
+dropped from the chain when the handler is built and costs nothing.
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.deprecation import MiddlewareMixin
+
+from users.background import PeriodicFlusher
+
+FORCE_PARAMETER = '_profile'
+MAX_DEPTH = 128
+FILE_SUFFIX = '.collapsed'
+
+
+def frame_label(code, module):
+    return f'{module}:{code.co_qualname}'
+
+
+class Sampler:
+    """Samples the stacks of registered threads from a daemon thread"""
+
+    def __init__(self):
+        self._active = {}
+        self._counts = Counter()
+        self._labels = {}
+        self._lock = threading.Lock()
+        self._busy = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.flusher = PeriodicFlusher(
+            'profiling-flusher', self.flush, lambda: settings.PROFILING_FLUSH_INTERVAL
+        )
+
+    def start(self, view_name, thread_id=None):
+        self._ensure_thread()
+        with self._lock:
+            self._active[thread_id or threading.get_ident()] = view_name
+            self._busy.set()
+
+    def stop(self, thread_id=None):
+        with self._lock:
+            self._active.pop(thread_id or threading.get_ident(), None)
+            if not self._active:
+                self._busy.clear()
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='profiling-sampler', daemon=True)
+            self._thread.start()
+        self.flusher.start()
+
+    def _run(self):
+        while True:
+            self._busy.wait()
+            self.sample()
+            time.sleep(settings.PROFILING_INTERVAL)
+
+    def label(self, frame):
+        code = frame.f_code
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = frame_label(code, frame.f_globals.get('__name__', '?'))
+        return label
+
+    def sample(self):
+        with self._lock:
+            active = dict(self._active)
+        if not active:
+            return
+        frames = sys._current_frames()
+        stacks = []
+        for thread_id, view_name in active.items():
+            frame = frames.get(thread_id)
+            labels = []
+            while frame is not None and len(labels) < MAX_DEPTH:
+                labels.append(self.label(frame))
+                frame = frame.f_back
+            if labels:
+                labels.append(view_name)
+                stacks.append(';'.join(reversed(labels)))
+        with self._lock:
+            self._counts.update(stacks)
+
+    def take_counts(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+        return counts
+
+    def flush(self):
+        counts = self.take_counts()
+        if not counts:
+            return
+        directory = Path(settings.PROFILING_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / f'profile-{os.getpid()}{FILE_SUFFIX}', 'a', encoding='utf-8') as output:
+            output.writelines(f'{stack} {count}\n' for stack, count in counts.items())
+
+
+sampler = Sampler()
+
+
+def read_profiles(directory):
+    """Collapsed stack counts summed over every profile file in directory"""
+    counts = Counter()
+    for path in sorted(Path(directory).glob(f'*{FILE_SUFFIX}')):
+        with open(path, encoding='utf-8') as source:
+            for line in source:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    counts[stack] += int(count)
+    return counts
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if random.random() < settings.PROFILING_SAMPLE_RATE or self.forced(request):
+            request._profiled_thread = threading.get_ident()
+            sampler.start(request.resolver_match.view_name, request._profiled_thread)
+
+    def process_response(self, request, response):
+        thread_id = getattr(request, '_profiled_thread', None)
+        if thread_id is not None:
+            sampler.stop(thread_id)
+        return response
+
+    def forced(self, request):
+        """Staff may profile their own request with ?_profile=1"""
+        if request.GET.get(FORCE_PARAMETER) != '1':
+            return False
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_staff
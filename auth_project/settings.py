@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,10 +42,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'auth_project.compression.CompressionMiddleware',
+    'auth_project.db_routers.ReplicaPinningMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'auth_project.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,6 +79,25 @@ DATABASES = {
     }
 }
 
+# Read replicas, used by auth_project.db_routers.PrimaryReplicaRouter.
+# Point REPLICA_DATABASE_NAME at a copy of db.sqlite3 to try it locally; it is
+# opened read-only, so a missing file counts as an unavailable replica.
+DATABASE_REPLICAS = []
+if os.environ.get('REPLICA_DATABASE_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'file:{}?mode=ro'.format(os.environ['REPLICA_DATABASE_NAME']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS = ['replica']
+
+DATABASE_ROUTERS = ['auth_project.db_routers.PrimaryReplicaRouter']
+
+# Keep a client reading from the primary this long after it wrote something
+REPLICA_PIN_SECONDS = 5
+# Skip a replica this long after it failed to connect
+REPLICA_RETRY_SECONDS = 30
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -108,11 +132,118 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Custom user model setting:
 AUTH_USER_MODEL = 'users.CustomUser'
 
+# Loads request.user with a narrow column set
+AUTHENTICATION_BACKENDS = ['users.backends.SlimUserBackend']
+
+# last_login is buffered in memory and written at most this many seconds
+# after a login (0 writes it during the login), or sooner once this many
+# logins are pending
+LAST_LOGIN_FLUSH_INTERVAL = 30
+LAST_LOGIN_BUFFER_SIZE = 1000
+
+# Login attempts are audited through an in-memory queue of at most
+# AUDIT_LOG_BUFFER_SIZE events, written in batches of AUDIT_LOG_BATCH_SIZE
+# every AUDIT_LOG_FLUSH_INTERVAL seconds (0 writes each event right away). A
+# login waits up to AUDIT_LOG_ENQUEUE_TIMEOUT seconds for room in a full queue
+# before its event is dropped.
+AUDIT_LOG_FLUSH_INTERVAL = 2
+AUDIT_LOG_BATCH_SIZE = 500
+AUDIT_LOG_BUFFER_SIZE = 10000
+AUDIT_LOG_ENQUEUE_TIMEOUT = 0.5
+AUDIT_LOG_RETENTION_DAYS = 90
+
+# Warm up templates, validators, URLs and Pillow when wsgi.py / asgi.py load,
+# and freeze the result out of the garbage collector so forked workers share
+# it. DJANGO_WORKER_WARMUP=0 turns this off.
+WORKER_WARMUP = os.environ.get('DJANGO_WORKER_WARMUP', '1') != '0'
+WORKER_WARMUP_GC_FREEZE = True
+
+# Doctor directory pages; cached pages are dropped when a user changes and
+# expire after DOCTOR_DIRECTORY_CACHE_TIMEOUT seconds regardless
+DOCTOR_DIRECTORY_PAGE_SIZE = 20
+DOCTOR_DIRECTORY_CACHE_TIMEOUT = 300
+
+# Serve login and signup with async views that hash passwords in a pool of
+# PASSWORD_HASHING_WORKERS processes (users/hashing.py); for ASGI servers.
+# Past PASSWORD_HASHING_MAX_PENDING queued hashes, logins get a 503
+ASYNC_AUTH_VIEWS = os.environ.get('DJANGO_ASYNC_AUTH_VIEWS', '0') == '1'
+PASSWORD_HASHING_WORKERS = int(os.environ.get('DJANGO_PASSWORD_HASHING_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASHING_MAX_PENDING = 8 * PASSWORD_HASHING_WORKERS
+
+# Users without a login for this many days are moved to the archive table by
+# `manage.py archive_inactive_users`, and restored when they log in again
+ARCHIVE_INACTIVE_DAYS = 365
+ARCHIVE_BATCH_SIZE = 1000
+
+# Response compression (auth_project/compression.py); brotli is used when the
+# brotli package is installed
+COMPRESSION_MIN_SIZE = 512
+COMPRESSION_CONTENT_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml',
+}
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_CACHE_ENTRIES = 256
+COMPRESSION_CACHE_MAX_BODY = 256 * 1024
+
+# Sampling profiler (auth_project/profiling.py); off unless DJANGO_PROFILING=1.
+# Staff can profile a single request with ?_profile=1 while it is on, and
+# `manage.py profile_report` prints the collected stacks
+PROFILING_ENABLED = os.environ.get('DJANGO_PROFILING', '0') == '1'
+PROFILING_SAMPLE_RATE = float(os.environ.get('DJANGO_PROFILING_SAMPLE_RATE', '0.01'))
+PROFILING_INTERVAL = 0.005
+PROFILING_FLUSH_INTERVAL = 10
+PROFILING_DIR = BASE_DIR / 'profiles'
+
+# Admin bulk actions change users BULK_ACTION_BATCH_SIZE at a time; larger
+# selections than BULK_ACTION_BACKGROUND_THRESHOLD run in a background thread
+# that records its progress in a BulkJob row. `manage.py run_bulk_jobs`
+# resumes jobs without progress for BULK_ACTION_STALE_SECONDS and deletes
+# finished ones after BULK_ACTION_JOB_TTL seconds
+BULK_ACTION_BATCH_SIZE = 1000
+BULK_ACTION_BACKGROUND_THRESHOLD = 5000
+BULK_ACTION_STALE_SECONDS = 300
+BULK_ACTION_JOB_TTL = 7 * 24 * 3600
+
+# Pincode/city index for the signup autocomplete, built with
+# manage.py build_postal_index
+POSTAL_INDEX_PATH = BASE_DIR / 'postal_index.bin'
+
+# Outgoing email; the console backend prints messages in development
+EMAIL_BACKEND = os.environ.get('DJANGO_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('DJANGO_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('DJANGO_EMAIL_PORT', '25'))
+EMAIL_HOST_USER = os.environ.get('DJANGO_EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('DJANGO_EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('DJANGO_EMAIL_USE_TLS', '0') == '1'
+DEFAULT_FROM_EMAIL = os.environ.get('DJANGO_DEFAULT_FROM_EMAIL', 'AuthApp <no-reply@localhost>')
+
+# Email verification links expire after EMAIL_VERIFICATION_MAX_AGE. Emails go
+# through the outbox (users/outbox.py): each process sends what is due every
+# EMAIL_OUTBOX_DISPATCH_INTERVAL seconds (0: only `manage.py dispatch_outbox`)
+# in batches over one connection, retrying failures with exponential backoff
+EMAIL_VERIFICATION_MAX_AGE = timedelta(days=3)
+EMAIL_OUTBOX_DISPATCH_INTERVAL = 5
+EMAIL_OUTBOX_BATCH_SIZE = 100
+EMAIL_OUTBOX_MAX_ATTEMPTS = 6
+EMAIL_OUTBOX_RETRY_DELAY = 30
+EMAIL_OUTBOX_MAX_RETRY_DELAY = 3600
+EMAIL_OUTBOX_CLAIM_SECONDS = 300
+
+# Password reset links are valid this many seconds. Links in emails sent
+# outside a request (admin bulk actions) point at SITE_URL
+PASSWORD_RESET_TIMEOUT = 3 * 24 * 60 * 60
+SITE_URL = os.environ.get('DJANGO_SITE_URL', 'http://localhost:8000')
+
+# Token API lifetimes
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=5)
+REFRESH_TOKEN_LIFETIME = timedelta(days=14)
+
 # Login / Logout Redirect URLs (optional improved UX)
 LOGIN_REDIRECT_URL = 'users:dashboard_redirect'
 LOGOUT_REDIRECT_URL = 'users:login'
 
-import os
 # assuming BASE_DIR is already defined
 
 STATIC_URL = '/static/'
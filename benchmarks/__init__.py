@@ -0,0 +1,5 @@
+"""
+Offline benchmark suite for the auth flows.
+
+Run ``python -m benchmarks.loadtest --help`` for the HTTP load test.
+"""
@@ -0,0 +1,73 @@
+"""
+Admin changelist render time at 100 rows per page.
+
+Renders /admin/users/customuser/ in-process with the narrowed changelist
+queryset and with whole rows, and reports latency and queries per page:
+
+    python -m benchmarks.admin_changelist --users 100000 --pages 50
+"""
+
+import argparse
+import os
+import random
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies, time_calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the CustomUser admin changelist.')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--pages', type=int, default=50, help='pages rendered per variant')
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    setup_django()
+
+    from django.db import connection
+    from django.test import Client
+
+    from users.admin import CustomUserAdmin
+    from users.models import CustomUser
+
+    from .common import prepare_database
+    from .fixtures import seed_users
+
+    prepare_database()
+    seed_users(args.users)
+    admin_user, _ = CustomUser.objects.get_or_create(
+        username='bench_admin',
+        defaults={'email': 'bench_admin@example.com', 'is_staff': True, 'is_superuser': True},
+    )
+    client = Client()
+    client.force_login(admin_user)
+
+    last_page = max(1, CustomUser.objects.count() // CustomUserAdmin.list_per_page)
+    rng = random.Random(0)
+
+    def render_page():
+        response = client.get('/admin/users/customuser/', {'p': rng.randrange(1, last_page + 1)})
+        assert response.status_code == 200, response.status_code
+
+    results = {}
+    default_fields = CustomUserAdmin.changelist_fields
+    for variant, fields in [('narrow_columns', default_fields), ('full_rows', None)]:
+        CustomUserAdmin.changelist_fields = fields
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *rest: queries.append(sql) or execute(sql, *rest)):
+            render_page()
+        results[variant] = {
+            'latency_ms': summarize_latencies(time_calls(render_page, args.pages)),
+            'queries_per_page': len(queries),
+        }
+    CustomUserAdmin.changelist_fields = default_fields
+
+    emit_report({
+        'meta': run_metadata(users=args.users, rows_per_page=CustomUserAdmin.list_per_page),
+        'admin_changelist': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Hot table size and query latency before and after archiving dormant users.
+
+Seeds users whose last logins are spread over --spread-days past days, then
+measures the size of users_customuser and its indexes and the latency of the
+queries every request path pays for (login lookup, availability checks, the
+admin changelist count, a doctor directory page), archives everyone inactive
+for --days with archive_inactive_users, VACUUMs and measures again. Use a
+fresh --db: the archived users stay archived.
+
+    python -m benchmarks.archiving --users 500000 --spread-days 1500 --db /tmp/archive.sqlite3
+"""
+
+import argparse
+import os
+import random
+import time
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies, time_calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark archiving inactive users.')
+    parser.add_argument('--users', type=int, default=500000)
+    parser.add_argument('--spread-days', type=int, default=1500, help='last logins spread over this many days')
+    parser.add_argument('--days', type=int, default=365, help='archive users inactive this long')
+    parser.add_argument('--iterations', type=int, default=500, help='timed calls per query')
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    os.environ.setdefault('BENCH_FAST_HASHER', '1')
+    setup_django()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    from users.archive import is_taken
+    from users.directory import search_doctors
+    from users.models import ArchivedUser, CustomUser
+
+    from .common import prepare_database
+    from .fixtures import BENCH_PASSWORD, BENCH_USERNAME, seed_users
+
+    prepare_database()
+    seed_users(args.users, last_login_days=args.spread_days)
+    rng = random.Random(0)
+
+    def table_size():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name, SUM(pgsize) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE tbl_name = 'users_customuser') GROUP BY name"
+            )
+            sizes = dict(cursor.fetchall())
+        return {
+            'rows': CustomUser.objects.count(),
+            'table_mib': round(sizes.pop('users_customuser', 0) / 2 ** 20, 1),
+            'indexes_mib': round(sum(sizes.values()) / 2 ** 20, 1),
+        }
+
+    def login_lookup():
+        username = BENCH_USERNAME.format(rng.randrange(args.users))
+        CustomUser.objects.filter(username=username).first()
+
+    def username_check():
+        is_taken('username', BENCH_USERNAME.format(rng.randrange(args.users * 2)))
+
+    def changelist_count():
+        CustomUser.objects.count()
+
+    def directory_page():
+        search_doctors(city=rng.choice(['Mumbai', 'Pune', 'Delhi', 'Chennai']))
+
+    def measure():
+        return {
+            'size': table_size(),
+            'latency_ms': {
+                name: summarize_latencies(time_calls(func, args.iterations))
+                for name, func in [
+                    ('login_lookup', login_lookup),
+                    ('username_check', username_check),
+                    ('changelist_count', changelist_count),
+                    ('directory_page', directory_page),
+                ]
+            },
+        }
+
+    before = measure()
+
+    began = time.perf_counter()
+    call_command('archive_inactive_users', days=args.days, verbosity=0)
+    archive_seconds = time.perf_counter() - began
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM')
+
+    after = measure()
+
+    # A login by an archived user pays for the restore once
+    from django.contrib.auth import authenticate
+
+    archived_names = list(ArchivedUser.objects.values_list('username', flat=True)[:50])
+    restores = []
+    for username in archived_names:
+        began = time.perf_counter()
+        assert authenticate(username=username, password=BENCH_PASSWORD) is not None
+        restores.append(time.perf_counter() - began)
+
+    emit_report({
+        'meta': run_metadata(users=args.users, spread_days=args.spread_days, days=args.days),
+        'archived': ArchivedUser.objects.count() + len(archived_names),
+        'archive_seconds': round(archive_seconds, 2),
+        'before': before,
+        'after': after,
+        'restore_on_login_ms': summarize_latencies(restores),
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Logins and signups per second per core: sync views against the async views
+that hash in the users.hashing process pool.
+
+Runs benchmarks.loadtest for the login and signup scenarios three ways (sync
+views under WSGI, sync views under ASGI, async views under ASGI) and reports
+req/s, req/s per core, latency and the share of requests shed with a 503:
+
+    python -m benchmarks.async_auth --users 1000 --concurrency 16 --requests 200
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+from . import loadtest
+from .common import REPO_ROOT, emit_report, run_metadata
+
+VARIANTS = [
+    ('wsgi_sync', ['--server', 'wsgi']),
+    ('asgi_sync', ['--server', 'asgi']),
+    ('asgi_async', ['--server', 'asgi', '--async-auth']),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark async login/signup against the sync views.')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+    parser.add_argument('--scenarios', default='login_username,signup')
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    cores = os.cpu_count() or 1
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for variant, options in VARIANTS:
+            report_path = os.path.join(directory, f'{variant}.json')
+            loadtest.main([
+                *options,
+                '--users', str(args.users),
+                '--concurrency', str(args.concurrency),
+                '--requests', str(args.requests),
+                '--scenarios', args.scenarios,
+                '--db', args.db,
+                '--output', report_path,
+            ])
+            with open(report_path) as report:
+                scenarios = json.load(report)['scenarios']
+            results[variant] = {
+                name: {
+                    'rps': scenario['rps'],
+                    'rps_per_core': round(scenario['rps'] / cores, 2) if scenario['rps'] else None,
+                    'shed_or_failed': scenario['failed'],
+                    'latency_ms': scenario['latency_ms'],
+                }
+                for name, scenario in scenarios.items()
+            }
+
+    emit_report({
+        'meta': run_metadata(
+            users=args.users,
+            concurrency=args.concurrency,
+            requests_per_scenario=args.requests,
+            cores=cores,
+        ),
+        'variants': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
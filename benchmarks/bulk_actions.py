@@ -0,0 +1,99 @@
+"""
+Admin bulk actions over a large selection.
+
+Seeds a throwaway batch of users, then times every users.bulk action over
+all of them, and compares with what the stock admin does per user (a save()
+for changes, the collector's delete for deletes) on a smaller sample:
+
+    python -m benchmarks.bulk_actions --selected 100000 --sample 2000
+"""
+
+import argparse
+import os
+import time
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django
+
+PREFIX = 'bulk_bench_'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark set-based admin bulk actions.')
+    parser.add_argument('--selected', type=int, default=100000, help='users in the selection')
+    parser.add_argument('--sample', type=int, default=2000, help='users changed one by one for comparison')
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    os.environ.setdefault('BENCH_FAST_HASHER', '1')
+    setup_django()
+
+    from django.core.management import call_command
+    from django.db import connection
+
+    from users.bulk import apply_bulk_action
+    from users.models import CustomUser
+
+    from .common import prepare_database
+
+    prepare_database()
+
+    def seed(count):
+        CustomUser.objects.filter(username__startswith=PREFIX).delete()
+        call_command('seed_users', count, prefix=PREFIX, start=0, email_domain='bulk.example.com', verbosity=0)
+        return list(CustomUser.objects.filter(username__startswith=PREFIX).order_by('pk').values_list('pk', flat=True))
+
+    def timed(func):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        began = time.perf_counter()
+        with connection.execute_wrapper(count):
+            func()
+        return time.perf_counter() - began, len(queries)
+
+    pks = seed(args.selected)
+    results = {}
+    for action in ['deactivate', 'activate', 'make_doctor', 'make_patient', 'force_password_reset', 'delete']:
+        seconds, queries = timed(lambda: apply_bulk_action(action, pks))
+        results[action] = {
+            'users': len(pks),
+            'seconds': round(seconds, 3),
+            'users_per_second': round(len(pks) / seconds),
+            'queries': queries,
+        }
+
+    # The stock admin path, per user
+    sample = seed(args.sample)
+
+    def save_each():
+        for user in CustomUser.objects.filter(pk__in=sample).iterator():
+            user.is_active = False
+            user.save()
+
+    def collector_delete():
+        CustomUser.objects.filter(pk__in=sample).delete()
+
+    per_object = {}
+    for variant, func in [('save_each', save_each), ('collector_delete', collector_delete)]:
+        seconds, queries = timed(func)
+        per_object[variant] = {
+            'users': len(sample),
+            'seconds': round(seconds, 3),
+            'users_per_second': round(len(sample) / seconds),
+            'queries': queries,
+        }
+
+    emit_report({
+        'meta': run_metadata(selected=args.selected, sample=args.sample),
+        'bulk_actions': results,
+        'per_object': per_object,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Helpers shared by the benchmark scripts.
+"""
+
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django(settings_module='benchmarks.settings'):
+    """Configure Django for an in-process benchmark"""
+    if str(REPO_ROOT) not in sys.path:
+        sys.path.insert(0, str(REPO_ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def prepare_database(verbosity=0):
+    """Apply migrations to the benchmark database"""
+    from django.core.management import call_command
+    call_command('migrate', verbosity=verbosity, interactive=False)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+def summarize_latencies(seconds):
+    """Return latency statistics in milliseconds"""
+    values = sorted(s * 1000 for s in seconds)
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'mean': round(sum(values) / len(values), 3),
+        'p50': round(percentile(values, 50), 3),
+        'p95': round(percentile(values, 95), 3),
+        'p99': round(percentile(values, 99), 3),
+        'max': round(values[-1], 3),
+    }
+
+
+def time_calls(func, iterations, warmup=5):
+    """Call func repeatedly and return the list of durations in seconds"""
+    for _ in range(warmup):
+        func()
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=REPO_ROOT, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_metadata(**extra):
+    """Environment details recorded with every report"""
+    import django
+    meta = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': git_revision(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    meta.update(extra)
+    return meta
+
+
+def emit_report(report, output=None):
+    """Write the report as JSON to a file or stdout"""
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output and output != '-':
+        Path(output).write_text(text + '\n')
+    else:
+        print(text)
@@ -0,0 +1,107 @@
+"""
+CPU cost against bytes saved by response compression, per endpoint.
+
+Fetches each endpoint uncompressed, then reports its size with gzip (and
+brotli when installed), the time the middleware spends compressing it, and
+the whole request's latency with and without an Accept-Encoding header.
+Pages carrying a CSRF token are always compressed afresh with padding;
+responses of @shared_response views are served from the compressed body
+cache after the first request, and the rest are compressed every time:
+
+    python -m benchmarks.compression --users 1000 --iterations 300
+"""
+
+import argparse
+import os
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies, time_calls
+
+# (name, method, path, data, signed in)
+ENDPOINTS = [
+    ('login_page', 'get', '/users/login/', {}, False),
+    ('signup_page', 'get', '/users/signup/', {}, False),
+    ('patient_dashboard', 'get', '/users/dashboard/patient/', {}, True),
+    ('doctor_directory', 'get', '/users/doctors/', {'city': 'Mumbai'}, True),
+    ('postal_lookup', 'get', '/users/ajax/postal-lookup/', {'q': 'Mu'}, False),
+    ('check_username', 'post', '/users/ajax/check-username/', {'username': 'bench_user_1'}, False),
+    ('api_profile', 'get', '/users/api/profile/', {}, False),
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark response compression per endpoint.')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=300, help='timed calls per variant')
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    setup_django()
+
+    from django.test import Client
+    from django.utils.text import compress_string
+
+    from auth_project import compression
+    from users.models import CustomUser
+    from users.tokens import issue_access_token
+
+    from .common import prepare_database
+    from .fixtures import seed_users
+
+    prepare_database()
+    seed_users(args.users)
+    patient = CustomUser.objects.filter(user_type='patient').only('pk').first()
+    anonymous = Client()
+    signed_in = Client()
+    signed_in.force_login(patient)
+    bearer = {'HTTP_AUTHORIZATION': f'Bearer {issue_access_token(patient)}'}
+
+    encodings = ['gzip'] + (['br'] if compression.brotli is not None else [])
+    results = {}
+    for name, method, path, data, signed in ENDPOINTS:
+        client = signed_in if signed else anonymous
+
+        def request(accept):
+            headers = dict(bearer) if name == 'api_profile' else {}
+            if accept:
+                headers['HTTP_ACCEPT_ENCODING'] = accept
+            response = getattr(client, method)(path, data, **headers)
+            assert response.status_code == 200, (name, response.status_code)
+            return response
+
+        body = request(None).content
+        endpoint = {'bytes': len(body), 'encodings': {}}
+        for encoding in encodings:
+            compressed = compression.compress(body, encoding)
+            samples = time_calls(lambda: compression.compress(body, encoding), args.iterations)
+            endpoint['encodings'][encoding] = {
+                'bytes': len(compressed),
+                'saved_pct': round(100 - 100 * len(compressed) / len(body), 1),
+                'compress_ms': summarize_latencies(samples),
+            }
+        endpoint['encodings']['gzip_padded'] = {
+            'compress_ms': summarize_latencies(time_calls(
+                lambda: compress_string(body, max_random_bytes=compression.MAX_RANDOM_BYTES), args.iterations
+            )),
+        }
+
+        served = request('br, gzip')
+        endpoint['served_encoding'] = served.get('Content-Encoding', 'identity')
+        endpoint['served_bytes'] = len(served.content)
+        endpoint['request_ms'] = {
+            'identity': summarize_latencies(time_calls(lambda: request(None), args.iterations)),
+            'compressed': summarize_latencies(time_calls(lambda: request('br, gzip'), args.iterations)),
+        }
+        results[name] = endpoint
+
+    emit_report({
+        'meta': run_metadata(users=args.users, brotli=compression.brotli is not None),
+        'endpoints': results,
+        'body_cache': {'entries': len(compression.body_cache), 'hits': compression.body_cache.hits,
+                       'misses': compression.body_cache.misses},
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Doctor directory latency on a large seeded table.
+
+Times the directory query for a mix of city/state/pincode/name filters, on
+the first page and after following the cursor deep into the results, and the
+whole /users/doctors/ view with a cold and a warm cache:
+
+    python -m benchmarks.doctor_directory --users 1000000 --iterations 200
+"""
+
+import argparse
+import os
+import random
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies, time_calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the doctor directory.')
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--iterations', type=int, default=200, help='timed calls per variant')
+    parser.add_argument('--depth', type=int, default=50, help='pages followed for the deep page variant')
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    setup_django()
+
+    from django.core.cache import cache
+    from django.db import connection
+    from django.test import Client
+
+    from users.directory import search_doctors
+    from users.management.commands.seed_users import FIRST_NAMES, LOCATIONS
+    from users.models import CustomUser
+
+    from .common import prepare_database
+    from .fixtures import seed_users
+
+    prepare_database()
+    seed_users(args.users)
+    patient = CustomUser.objects.filter(user_type='patient').only('pk').first()
+    client = Client()
+    client.force_login(patient)
+
+    rng = random.Random(0)
+
+    def random_filters():
+        city, state, pin_prefix = rng.choice(LOCATIONS)
+        name = rng.choice(FIRST_NAMES).lower()[:rng.randint(1, 4)]
+        return rng.choice([
+            {'city': city},
+            {'state': state},
+            {'pincode': f'{pin_prefix}{rng.randrange(1000):03d}'},
+            {'name': name},
+            {'city': city, 'name': name},
+            {'state': state, 'name': name},
+        ])
+
+    def first_page():
+        search_doctors(**random_filters())
+
+    # Cursors some way into the results of broad filters
+    deep_cursors = []
+    for city, _, _ in LOCATIONS:
+        cursor = None
+        for _ in range(args.depth):
+            _, next_cursor = search_doctors(city=city, cursor=cursor)
+            if next_cursor is None:
+                break
+            cursor = next_cursor
+        deep_cursors.append(({'city': city}, cursor))
+
+    def deep_page():
+        filters, cursor = rng.choice(deep_cursors)
+        search_doctors(cursor=cursor, **filters)
+
+    def view_cold():
+        cache.clear()
+        response = client.get('/users/doctors/', random_filters())
+        assert response.status_code == 200, response.status_code
+
+    warm_filters = [random_filters() for _ in range(20)]
+
+    def view_warm():
+        response = client.get('/users/doctors/', rng.choice(warm_filters))
+        assert response.status_code == 200, response.status_code
+
+    plans = {}
+    with connection.cursor() as db_cursor:
+        for label, filters in [('city_name', {'city': 'Pune', 'name': 'an'}), ('pincode', {'pincode': '411001'})]:
+            queryset = CustomUser.objects.filter(user_type='doctor', is_active=True, **{
+                key if key != 'name' else 'search_name__gte': value for key, value in filters.items()
+            }).order_by('search_name', 'id')
+            sql, params = queryset.query.sql_with_params()
+            db_cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plans[label] = [row[-1] for row in db_cursor.fetchall()]
+
+    for warm_filter in warm_filters:
+        client.get('/users/doctors/', warm_filter)
+
+    results = {}
+    for variant, func in [
+        ('query_first_page', first_page),
+        ('query_deep_page', deep_page),
+        ('view_cold_cache', view_cold),
+        ('view_warm_cache', view_warm),
+    ]:
+        results[variant] = {'latency_ms': summarize_latencies(time_calls(func, args.iterations))}
+
+    emit_report({
+        'meta': run_metadata(
+            users=args.users,
+            doctors=CustomUser.objects.filter(user_type='doctor').count(),
+            depth=args.depth,
+        ),
+        'query_plans': plans,
+        'doctor_directory': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
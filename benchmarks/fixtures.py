@@ -0,0 +1,25 @@
+"""
+User fixtures for the benchmarks, generated with the seed_users command.
+"""
+
+BENCH_PASSWORD = 'BenchPass!2024'
+BENCH_PREFIX = 'bench_user_'
+BENCH_USERNAME = BENCH_PREFIX + '{}'
+BENCH_EMAIL = BENCH_PREFIX + '{}@example.com'
+
+
+def seed_users(count, password=BENCH_PASSWORD, **options):
+    """Make sure bench_user_0 .. bench_user_<count-1> exist, return how many were added"""
+    from django.core.management import call_command
+
+    from users.models import CustomUser
+
+    existing = CustomUser.objects.filter(username__startswith=BENCH_PREFIX).count()
+    if existing >= count:
+        return 0
+    call_command(
+        'seed_users', count - existing,
+        prefix=BENCH_PREFIX, start=existing, password=password,
+        email_domain='example.com', verbosity=0, **options
+    )
+    return count - existing
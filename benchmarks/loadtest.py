@@ -0,0 +1,391 @@
+"""
+HTTP load test for the auth flows.
+
+Seeds users into a dedicated SQLite database, starts the project under a
+local WSGI or ASGI server and drives each scenario with concurrent clients.
+The report (req/s, latency percentiles and DB queries per request for every
+scenario) is printed as JSON, or written to --output so that runs can be
+compared across commits:
+
+    python -m benchmarks.loadtest --server wsgi --users 10000 --concurrency 8
+"""
+
+import argparse
+import http.client
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies
+from .fixtures import BENCH_EMAIL, BENCH_PASSWORD, BENCH_USERNAME
+from .middleware import QUERY_COUNT_HEADER
+
+SIGNUP_PASSWORD = 'Str0ng!Passw0rd#'
+
+
+class Client:
+    """A minimal keep-alive HTTP client with a cookie jar"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+        self.cookies = {}
+        self.samples = []
+
+    def request(self, method, path, fields=None):
+        headers = {'Host': f'{self.host}:{self.port}'}
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        body = None
+        if method == 'POST':
+            body = urlencode(fields or {})
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['X-CSRFToken'] = self.cookies.get('csrftoken', '')
+        try:
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            # The server closed a kept-alive connection, retry once
+            self.conn.close()
+            self.conn.request(method, path, body=body, headers=headers)
+            response = self.conn.getresponse()
+        response.read()
+        for header in response.msg.get_all('Set-Cookie') or []:
+            for name, morsel in SimpleCookie(header).items():
+                if morsel.value and morsel['max-age'] != '0':
+                    self.cookies[name] = morsel.value
+                else:
+                    self.cookies.pop(name, None)
+        return response
+
+    def measure(self, method, path, fields=None, expect=(200,)):
+        """Issue a request and record its latency, status and query count"""
+        start = time.perf_counter()
+        response = self.request(method, path, fields)
+        elapsed = time.perf_counter() - start
+        queries = response.getheader(QUERY_COUNT_HEADER)
+        self.samples.append((
+            elapsed,
+            response.status in expect,
+            int(queries) if queries is not None else None,
+        ))
+        return response
+
+    def logout_locally(self):
+        """Forget the session cookie so the next login is a fresh one"""
+        self.cookies.pop('sessionid', None)
+
+    def close(self):
+        self.conn.close()
+
+
+# ==================== Scenarios ====================
+
+class Scenario:
+    name = None
+
+    def __init__(self, users, run_id):
+        self.users = users
+        self.run_id = run_id
+
+    def setup(self, client, worker):
+        client.request('GET', '/users/login/')
+
+    def step(self, client, worker, index):
+        raise NotImplementedError
+
+    def pick_user(self):
+        return random.randrange(self.users)
+
+
+class SignupScenario(Scenario):
+    name = 'signup'
+
+    def setup(self, client, worker):
+        client.request('GET', '/users/signup/')
+
+    def step(self, client, worker, index):
+        client.logout_locally()
+        username = f'load_{self.run_id}_{worker}_{index}'
+        client.measure('POST', '/users/signup/', {
+            'user_type': random.choice(['patient', 'doctor']),
+            'first_name': 'Load',
+            'last_name': f'Tester{index}',
+            'username': username,
+            'email': f'{username}@example.com',
+            'phone_number': '+919876543210',
+            'address_line1': '1 Load Test Road',
+            'city': 'Pune',
+            'state': 'Maharashtra',
+            'pincode': '411001',
+            'password1': SIGNUP_PASSWORD,
+            'password2': SIGNUP_PASSWORD,
+        }, expect=(302,))
+
+
+class LoginUsernameScenario(Scenario):
+    name = 'login_username'
+
+    def credential(self, index):
+        return BENCH_USERNAME.format(index)
+
+    def step(self, client, worker, index):
+        client.logout_locally()
+        client.measure('POST', '/users/login/', {
+            'username': self.credential(self.pick_user()),
+            'password': BENCH_PASSWORD,
+        }, expect=(302,))
+
+
+class LoginEmailScenario(LoginUsernameScenario):
+    name = 'login_email'
+
+    def credential(self, index):
+        return BENCH_EMAIL.format(index)
+
+
+class DashboardScenario(Scenario):
+    name = 'dashboard'
+
+    def setup(self, client, worker):
+        super().setup(client, worker)
+        client.request('POST', '/users/login/', {
+            'username': BENCH_USERNAME.format(self.pick_user()),
+            'password': BENCH_PASSWORD,
+        })
+        # The redirect tells us which role dashboard this user gets
+        response = client.request('GET', '/users/dashboard/')
+        client.dashboard = response.getheader('Location')
+
+    def step(self, client, worker, index):
+        client.measure('GET', client.dashboard)
+
+
+class DashboardRedirectScenario(DashboardScenario):
+    name = 'dashboard_redirect'
+
+    def step(self, client, worker, index):
+        client.measure('GET', '/users/dashboard/', expect=(302,))
+
+
+class AjaxUsernameScenario(Scenario):
+    name = 'ajax_username'
+
+    def step(self, client, worker, index):
+        # Alternate between taken and free names
+        if index % 2:
+            username = BENCH_USERNAME.format(self.pick_user())
+        else:
+            username = f'free_{self.run_id}_{worker}_{index}'
+        client.measure('POST', '/users/ajax/check-username/', {'username': username})
+
+
+class AjaxEmailScenario(Scenario):
+    name = 'ajax_email'
+
+    def step(self, client, worker, index):
+        if index % 2:
+            email = BENCH_EMAIL.format(self.pick_user())
+        else:
+            email = f'free_{self.run_id}_{worker}_{index}@example.com'
+        client.measure('POST', '/users/ajax/check-email/', {'email': email})
+
+
+class AjaxPasswordScenario(Scenario):
+    name = 'ajax_password'
+
+    def step(self, client, worker, index):
+        client.measure('POST', '/users/ajax/validate-password/', {
+            'password': random.choice(['weak', 'Medium123', SIGNUP_PASSWORD]),
+        })
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [
+        SignupScenario,
+        LoginUsernameScenario,
+        LoginEmailScenario,
+        DashboardRedirectScenario,
+        DashboardScenario,
+        AjaxUsernameScenario,
+        AjaxEmailScenario,
+        AjaxPasswordScenario,
+    ]
+}
+
+
+# ==================== Runner ====================
+
+def run_scenario(scenario, host, port, concurrency, requests, warmup):
+    """Drive one scenario with `concurrency` clients and summarize the samples"""
+    clients = [Client(host, port) for _ in range(concurrency)]
+    for worker, client in enumerate(clients):
+        scenario.setup(client, worker)
+        for index in range(warmup):
+            scenario.step(client, worker, -index - 1)
+        client.samples.clear()
+
+    per_client = max(1, -(-requests // concurrency))
+    barrier = threading.Barrier(concurrency + 1)
+    errors = []
+
+    def worker_loop(worker, client):
+        barrier.wait()
+        try:
+            for index in range(per_client):
+                scenario.step(client, worker, index)
+        except Exception as exc:  # report, but keep the other workers going
+            errors.append(repr(exc))
+
+    threads = [
+        threading.Thread(target=worker_loop, args=(worker, client))
+        for worker, client in enumerate(clients)
+    ]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    samples = [sample for client in clients for sample in client.samples]
+    for client in clients:
+        client.close()
+    queries = [q for _, _, q in samples if q is not None]
+    return {
+        'requests': len(samples),
+        'failed': sum(1 for _, ok, _ in samples if not ok),
+        'client_errors': errors[:10],
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'latency_ms': summarize_latencies([s for s, _, _ in samples]),
+        'db_queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+    }
+
+
+def wait_for_port(host, port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode}')
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f'Server did not start listening on {host}:{port}')
+
+
+def free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def seed(users, verbosity):
+    """Migrate the benchmark database and make sure `users` bench users exist"""
+    from django.db import connections
+
+    from .common import prepare_database
+    from .fixtures import seed_users
+
+    prepare_database(verbosity=verbosity)
+    start = time.perf_counter()
+    created = seed_users(users)
+    elapsed = time.perf_counter() - start
+    connections.close_all()
+    return {'created': created, 'seconds': round(elapsed, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Load test the auth flows against a local WSGI/ASGI server.'
+    )
+    parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+    parser.add_argument('--users', type=int, default=1000, help='number of seeded users')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=400, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='unmeasured requests per client')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'),
+                        help='SQLite file used for the run')
+    parser.add_argument('--fresh', action='store_true', help='delete the database file first')
+    parser.add_argument('--fast-hasher', action='store_true',
+                        help='use the MD5 hasher to measure everything but PBKDF2')
+    parser.add_argument('--async-auth', action='store_true',
+                        help='serve login and signup with the async views (ASYNC_AUTH_VIEWS)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0, help='0 picks a free port')
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for user selection')
+    parser.add_argument('--verbosity', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios: ' + ', '.join(sorted(unknown)))
+
+    if args.fresh and os.path.exists(args.db):
+        os.remove(args.db)
+    os.environ['BENCH_DB'] = args.db
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+    if args.fast_hasher:
+        os.environ['BENCH_FAST_HASHER'] = '1'
+    os.environ['DJANGO_ASYNC_AUTH_VIEWS'] = '1' if args.async_auth else '0'
+    setup_django()
+    seeding = seed(args.users, args.verbosity)
+
+    random.seed(args.seed)
+    port = args.port or free_port(args.host)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.serve', args.server, args.host, str(port)],
+        cwd=REPO_ROOT, env=os.environ.copy(),
+    )
+    results = {}
+    try:
+        wait_for_port(args.host, port, server)
+        run_id = format(int(time.time() * 1000), 'x')
+        for name in names:
+            scenario = SCENARIOS[name](args.users, run_id)
+            results[name] = run_scenario(
+                scenario, args.host, port, args.concurrency, args.requests, args.warmup
+            )
+            if args.verbosity:
+                print(f'{name}: {results[name]["rps"]} req/s', file=sys.stderr)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    emit_report({
+        'meta': run_metadata(
+            server=args.server,
+            users=args.users,
+            concurrency=args.concurrency,
+            requests_per_scenario=args.requests,
+            fast_hasher=args.fast_hasher,
+            async_auth=args.async_auth,
+            seeding=seeding,
+        ),
+        'scenarios': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from contextlib import ExitStack
+
+from django.db import connections
+from django.utils.deprecation import MiddlewareMixin
+
+QUERY_COUNT_HEADER = 'X-Bench-Queries'
+
+
+class QueryCountMiddleware(MiddlewareMixin):
+    """
+    Counts the DB queries executed while handling a request and reports
+    the total in the X-Bench-Queries response header
+    """
+
+    def process_request(self, request):
+        request._bench_queries = 0
+        request._bench_stack = ExitStack()
+
+        def counter(execute, sql, params, many, context):
+            request._bench_queries += 1
+            return execute(sql, params, many, context)
+
+        for connection in connections.all(initialized_only=False):
+            request._bench_stack.enter_context(connection.execute_wrapper(counter))
+
+    def process_response(self, request, response):
+        stack = getattr(request, '_bench_stack', None)
+        if stack is not None:
+            stack.close()
+            response[QUERY_COUNT_HEADER] = str(request._bench_queries)
+        return response
@@ -0,0 +1,110 @@
+"""
+Memory and latency of the postal autocomplete index.
+
+Builds an index from a synthetic directory the size of India's (about 20k
+pincodes over 750 districts), maps it, and reports the file size, the memory
+the mapping adds, and the latency of pincode and city prefix lookups in
+microseconds, both direct and through the AJAX endpoint:
+
+    python -m benchmarks.postal_lookup --pincodes 20000 --iterations 20000
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies, time_calls
+
+
+def synthetic_rows(pincodes, districts, rng):
+    states = [f'State {index}' for index in range(36)]
+    places = [(f'District {index}', rng.choice(states)) for index in range(districts)]
+    for pincode in rng.sample(range(110000, 860000), pincodes):
+        city, state = rng.choice(places)
+        yield f'{pincode:06d}', city, state
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the postal autocomplete index.')
+    parser.add_argument('--pincodes', type=int, default=20000)
+    parser.add_argument('--districts', type=int, default=750)
+    parser.add_argument('--iterations', type=int, default=20000, help='timed lookups per variant')
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    setup_django()
+
+    from django.test import Client, override_settings
+
+    from users.management.commands.profile_startup import memory_usage
+    from users.postal import PostalIndex, build_index, get_postal_index, reset_postal_index
+
+    from .common import prepare_database
+
+    prepare_database()
+    rng = random.Random(0)
+    rows = list(synthetic_rows(args.pincodes, args.districts, rng))
+
+    began = time.perf_counter()
+    data = build_index(rows)
+    build_seconds = time.perf_counter() - began
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'postal_index.bin'
+        path.write_bytes(data)
+
+        before = memory_usage()
+        began = time.perf_counter()
+        index = PostalIndex.open(path)
+        open_seconds = time.perf_counter() - began
+        pincode_queries = [pincode[:rng.randint(2, 6)] for pincode, _, _ in rng.sample(rows, 1000)]
+        city_queries = [f'district {rng.randrange(args.districts)}'[:rng.randint(2, 13)] for _ in range(1000)]
+        for query in pincode_queries + city_queries:
+            index.lookup(query)
+        after = memory_usage()
+
+        def lookups(queries):
+            def call():
+                index.lookup(rng.choice(queries))
+            return call
+
+        results = {}
+        for variant, queries in [('pincode_prefix', pincode_queries), ('city_prefix', city_queries)]:
+            samples = time_calls(lookups(queries), args.iterations)
+            results[variant] = {'latency_us': summarize_latencies([s * 1000 for s in samples])}
+
+        with override_settings(POSTAL_INDEX_PATH=path):
+            reset_postal_index()
+            get_postal_index()
+            client = Client()
+
+            def endpoint():
+                response = client.get('/users/ajax/postal-lookup/', {'q': rng.choice(pincode_queries)})
+                assert response.status_code == 200, response.status_code
+
+            results['endpoint'] = {
+                'latency_ms': summarize_latencies(time_calls(endpoint, min(args.iterations, 2000)))
+            }
+            reset_postal_index()
+
+    emit_report({
+        'meta': run_metadata(pincodes=args.pincodes, districts=args.districts),
+        'index': {
+            'file_kib': round(len(data) / 1024, 1),
+            'entries': len(index),
+            'places': len(index.place_key),
+            'build_ms': round(build_seconds * 1000, 1),
+            'open_us': round(open_seconds * 1e6, 1),
+            'rss_added_kib': after.get('rss_kb', 0) - before.get('rss_kb', 0),
+        },
+        'postal_lookup': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Start the project under a local WSGI or ASGI server.
+
+    python -m benchmarks.serve wsgi 127.0.0.1 8765
+    python -m benchmarks.serve asgi 127.0.0.1 8765
+
+The WSGI server is the threaded wsgiref server from the standard library so
+the suite runs without extra packages; the ASGI server needs uvicorn.
+"""
+
+import argparse
+import os
+import sys
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from .common import REPO_ROOT
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_wsgi(host, port):
+    from auth_project.wsgi import application
+    httpd = make_server(host, port, application, ThreadingWSGIServer, QuietHandler)
+    httpd.serve_forever()
+
+
+def serve_asgi(host, port):
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('The ASGI benchmark server needs uvicorn (pip install uvicorn).')
+    uvicorn.run('auth_project.asgi:application', host=host, port=port, log_level='warning')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('server', choices=['wsgi', 'asgi'])
+    parser.add_argument('host')
+    parser.add_argument('port', type=int)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(REPO_ROOT))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    if args.server == 'wsgi':
+        serve_wsgi(args.host, args.port)
+    else:
+        serve_asgi(args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
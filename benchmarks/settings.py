@@ -0,0 +1,47 @@
+"""
+Settings used by the benchmark suite.
+
+Everything is inherited from the project settings; only the database file,
+DEBUG and the query-counting middleware differ so that runs are repeatable
+and never touch the development database.
+"""
+
+import os
+
+from auth_project.settings import *  # noqa: F401,F403
+from auth_project.settings import BASE_DIR, DATABASES, MIDDLEWARE
+
+DEBUG = False
+
+ALLOWED_HOSTS = ['127.0.0.1', 'localhost', 'testserver']
+
+# Replicas configured by the project settings are kept
+DATABASES = {
+    **DATABASES,
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCH_DB', str(BASE_DIR / 'bench.sqlite3')),
+        'OPTIONS': {
+            'timeout': 30,
+        },
+    }
+}
+
+# Reports the number of DB queries per request in a response header
+MIDDLEWARE = ['benchmarks.middleware.QueryCountMiddleware'] + MIDDLEWARE
+
+# Measure everything except the password hash when asked to. PBKDF2 stays
+# as a secondary hasher, so a bench DB seeded without BENCH_FAST_HASHER still
+# accepts its passwords (each user's first login rehashes it to MD5)
+if os.environ.get('BENCH_FAST_HASHER') == '1':
+    PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    ]
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'root': {'handlers': ['console'], 'level': 'WARNING'},
+}
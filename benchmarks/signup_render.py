@@ -0,0 +1,63 @@
+"""
+Signup page rendering cost.
+
+Times GET /users/signup/ served from the cached page skeleton and with the
+form re-rendered on every request (the behaviour while DEBUG is on), and
+measures the messages stored by an invalid POST:
+
+    python -m benchmarks.signup_render --iterations 500
+"""
+
+import argparse
+import os
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies, time_calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the signup page render.')
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    setup_django()
+
+    from django.contrib.messages.storage.cookie import CookieStorage
+    from django.test import Client, override_settings
+
+    from .common import prepare_database
+
+    prepare_database()
+    client = Client()
+
+    def get_signup():
+        response = client.get('/users/signup/')
+        assert response.status_code == 200, response.status_code
+
+    results = {}
+    for variant, debug in [('cached_skeleton', False), ('full_render', True)]:
+        with override_settings(DEBUG=debug):
+            results[variant] = {
+                'latency_ms': summarize_latencies(time_calls(get_signup, args.iterations)),
+            }
+
+    # An empty POST fails validation on every required field
+    client.post('/users/signup/', {})
+    cookie = client.cookies.get(CookieStorage.cookie_name)
+    storage = CookieStorage(None)
+    stored = storage._decode(cookie.value) if cookie else []
+    results['invalid_post'] = {
+        'messages_stored': len(stored or []),
+        'messages_cookie_bytes': len(cookie.value) if cookie else 0,
+    }
+
+    emit_report({
+        'meta': run_metadata(iterations=args.iterations),
+        'signup_render': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Session versus access token authentication for the API endpoints.
+
+Times GET /users/api/dashboard/ and /users/api/profile/ authenticated with
+a session cookie and with a Bearer access token, and the bare token
+verification:
+
+    python -m benchmarks.token_auth --iterations 1000
+"""
+
+import argparse
+import os
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies, time_calls
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark session vs token auth.')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    setup_django()
+
+    from django.db import connection
+    from django.test import Client
+
+    from users.models import CustomUser
+    from users.tokens import issue_access_token, verify_access_token
+
+    from .common import prepare_database
+    from .fixtures import BENCH_USERNAME, seed_users
+
+    prepare_database()
+    seed_users(args.users)
+    user = CustomUser.objects.get(username=BENCH_USERNAME.format(0))
+
+    session_client = Client()
+    session_client.force_login(user)
+    token = issue_access_token(user)
+    token_client = Client(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    results = {}
+    for endpoint in ['/users/api/dashboard/', '/users/api/profile/']:
+        results[endpoint] = {}
+        for variant, client in [('session', session_client), ('token', token_client)]:
+            queries = []
+            with connection.execute_wrapper(
+                lambda execute, sql, *rest: queries.append(sql) or execute(sql, *rest)
+            ):
+                assert client.get(endpoint).status_code == 200
+            results[endpoint][variant] = {
+                'latency_ms': summarize_latencies(time_calls(lambda: client.get(endpoint), args.iterations)),
+                'queries': len(queries),
+            }
+    results['verify_access_token'] = {
+        'latency_ms': summarize_latencies(time_calls(lambda: verify_access_token(token), args.iterations)),
+    }
+
+    emit_report({
+        'meta': run_metadata(users=args.users, iterations=args.iterations),
+        'token_auth': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
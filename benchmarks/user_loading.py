@@ -0,0 +1,95 @@
+"""
+Cost of loading the authenticated user on each request.
+
+Compares the slim column set loaded by SlimUserBackend with whole rows
+loaded by Django's ModelBackend: bytes fetched for the user, backend
+get_user() time, and end-to-end time per request on the dashboard path:
+
+    python -m benchmarks.user_loading --users 100000 --iterations 500
+"""
+
+import argparse
+import os
+import random
+
+from .common import REPO_ROOT, emit_report, run_metadata, setup_django, summarize_latencies, time_calls
+
+BACKENDS = {
+    'slim': 'users.backends.SlimUserBackend',
+    'full_rows': 'django.contrib.auth.backends.ModelBackend',
+}
+
+
+def row_bytes(row):
+    """Approximate payload size of a fetched row"""
+    return sum(len(str(value).encode()) for value in row if value is not None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark per-request user loading.')
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--db', default=str(REPO_ROOT / 'bench.sqlite3'))
+    parser.add_argument('--output')
+    args = parser.parse_args(argv)
+
+    os.environ['BENCH_DB'] = args.db
+    setup_django()
+
+    from django.contrib.auth import load_backend
+    from django.db import connection
+    from django.test import Client, override_settings
+
+    from users.models import CustomUser
+
+    from .common import prepare_database
+    from .fixtures import seed_users
+
+    prepare_database()
+    seed_users(args.users)
+    rng = random.Random(0)
+    pks = list(CustomUser.objects.filter(username__startswith='bench_user_')
+               .values_list('pk', flat=True)[:5000])
+    sample = CustomUser.objects.get(pk=pks[0])
+    all_columns = [f.attname for f in CustomUser._meta.concrete_fields]
+
+    results = {}
+    for variant, backend_path in BACKENDS.items():
+        backend = load_backend(backend_path)
+        columns = CustomUser.SESSION_FIELDS if variant == 'slim' else all_columns
+        fetched = CustomUser.objects.filter(pk=sample.pk).values_list(*columns).get()
+
+        with override_settings(AUTHENTICATION_BACKENDS=[backend_path]):
+            paths = {}
+            for page in ['/users/dashboard/', '/users/dashboard/{}/'.format(sample.user_type)]:
+                client = Client()
+                client.force_login(sample, backend=backend_path)
+                queries = []
+                with connection.execute_wrapper(
+                    lambda execute, sql, *rest: queries.append(sql) or execute(sql, *rest)
+                ):
+                    client.get(page)
+                paths[page] = {
+                    'latency_ms': summarize_latencies(
+                        time_calls(lambda: client.get(page), args.iterations)
+                    ),
+                    'queries': len(queries),
+                }
+
+        results[variant] = {
+            'user_columns': len(columns),
+            'user_row_bytes': row_bytes(fetched),
+            'get_user_ms': summarize_latencies(
+                time_calls(lambda: backend.get_user(rng.choice(pks)), args.iterations)
+            ),
+            'requests': paths,
+        }
+
+    emit_report({
+        'meta': run_metadata(users=args.users, iterations=args.iterations),
+        'user_loading': results,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
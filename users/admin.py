@@ -1,13 +1,45 @@
 
 # Register your models here.
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from .archive import restore_user
+from .bulk import apply_bulk_action, get_bulk_job, start_bulk_job
+from .models import ArchivedUser, CustomUser, EmailOutbox, LoginEvent
+
+
+class CustomUserChangeList(ChangeList):
+    """
+    Changelist that only loads the columns it renders
+    """
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.model_admin.changelist_fields:
+            queryset = queryset.only(*self.model_admin.changelist_fields)
+        return queryset
+
+
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
     """
     Custom admin interface for CustomUser model
     """
+    # Columns loaded for the changelist; None loads whole rows
+    changelist_fields = CustomUser.LISTING_FIELDS
+
+    list_per_page = 100
+
+    # Skip the second COUNT(*) over the whole table on every page
+    show_full_result_count = False
+
     list_display = [
         'username', 'email', 'first_name', 'last_name',
         'user_type', 'is_staff', 'created_at'
@@ -32,6 +64,97 @@ class CustomUserAdmin(UserAdmin):
     )
     
     readonly_fields = ['created_at', 'updated_at']
+
+    # Set-based replacements for delete_selected, see users.bulk
+    actions = [
+        'activate_users', 'deactivate_users', 'make_doctors', 'make_patients',
+        'force_password_reset', 'delete_users',
+    ]
+
+    def get_changelist(self, request, **kwargs):
+        return CustomUserChangeList
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_urls(self):
+        return [
+            path(
+                'bulk-jobs/<uuid:job_id>/',
+                self.admin_site.admin_view(self.bulk_job_view),
+                name='users_customuser_bulk_job',
+            ),
+        ] + super().get_urls()
+
+    # ==================== Bulk actions ====================
+
+    def run_bulk_action(self, request, queryset, action, done_label):
+        """Apply a users.bulk action to the selection, leaving out the acting user"""
+        pks = list(queryset.exclude(pk=request.user.pk).order_by('pk').values_list('pk', flat=True))
+        if queryset.filter(pk=request.user.pk).exists():
+            self.message_user(request, 'Your own account was left out.', messages.WARNING)
+
+        if len(pks) > settings.BULK_ACTION_BACKGROUND_THRESHOLD:
+            job_id = start_bulk_job(action, pks, request.user)
+            return redirect('admin:users_customuser_bulk_job', job_id=job_id)
+
+        count = apply_bulk_action(action, pks, request.user)
+        self.message_user(request, f'{done_label} {count} users.', messages.SUCCESS)
+        return None
+
+    @admin.action(description='Activate selected users', permissions=['change'])
+    def activate_users(self, request, queryset):
+        return self.run_bulk_action(request, queryset, 'activate', 'Activated')
+
+    @admin.action(description='Deactivate selected users', permissions=['change'])
+    def deactivate_users(self, request, queryset):
+        return self.run_bulk_action(request, queryset, 'deactivate', 'Deactivated')
+
+    @admin.action(description='Make selected users doctors', permissions=['change'])
+    def make_doctors(self, request, queryset):
+        return self.run_bulk_action(request, queryset, 'make_doctor', 'Made doctors of')
+
+    @admin.action(description='Make selected users patients', permissions=['change'])
+    def make_patients(self, request, queryset):
+        return self.run_bulk_action(request, queryset, 'make_patient', 'Made patients of')
+
+    @admin.action(description='Force a password reset for selected users', permissions=['change'])
+    def force_password_reset(self, request, queryset):
+        return self.run_bulk_action(request, queryset, 'force_password_reset', 'Reset the password of')
+
+    @admin.action(description='Delete selected users', permissions=['delete'])
+    def delete_users(self, request, queryset):
+        if request.POST.get('post'):
+            return self.run_bulk_action(request, queryset, 'delete', 'Deleted')
+
+        select_across = request.POST.get('select_across') == '1'
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Are you sure?',
+            'opts': self.model._meta,
+            'count': queryset.exclude(pk=request.user.pk).count(),
+            'select_across': select_across,
+            'selected': [] if select_across else request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, 'admin/users/customuser/bulk_delete_confirmation.html', context)
+
+    def bulk_job_view(self, request, job_id):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+        job = get_bulk_job(job_id)
+        if job is None:
+            raise Http404('Unknown or expired bulk job')
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Bulk action progress',
+            'opts': self.model._meta,
+            'job': job,
+            'percent': int(job.done * 100 / job.total) if job.total else 100,
+        }
+        return TemplateResponse(request, 'admin/users/customuser/bulk_job.html', context)
     
     add_fieldsets = UserAdmin.add_fieldsets + (
         ('Additional Info', {
@@ -41,4 +164,91 @@ class CustomUserAdmin(UserAdmin):
                 'address_line1', 'city', 'state', 'pincode'
             )
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(ArchivedUser)
+class ArchivedUserAdmin(admin.ModelAdmin):
+    """Users moved out by archive_inactive_users, restorable by hand"""
+    list_display = ['username', 'email', 'archived_at']
+    search_fields = ['=username', '=email']
+    actions = ['restore_users']
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description='Restore selected users', permissions=['delete'])
+    def restore_users(self, request, queryset):
+        restored = sum(restore_user(archived) is not None for archived in queryset)
+        self.message_user(request, f'Restored {restored} users.', messages.SUCCESS)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """Queued, sent and failed emails; failed ones can be queued again"""
+    list_display = ['subject', 'to_email', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['=to_email']
+    readonly_fields = [field.name for field in EmailOutbox._meta.fields]
+    actions = ['retry_emails']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Send selected emails again', permissions=['change'])
+    def retry_emails(self, request, queryset):
+        count = queryset.exclude(status=EmailOutbox.SENT).update(
+            status=EmailOutbox.PENDING, attempts=0, send_after=timezone.now()
+        )
+        self.message_user(request, f'Queued {count} emails again.', messages.SUCCESS)
+
+
+@admin.register(LoginEvent)
+class LoginEventAdmin(admin.ModelAdmin):
+    """
+    Read-only view of the login audit log. The stock changelist counts and
+    offsets through the whole table, so events are paged with a cursor instead.
+    """
+    list_per_page = 100
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+
+        queryset = LoginEvent.objects.all()
+        event = request.GET.get('event')
+        if event in dict(LoginEvent.EVENT_CHOICES):
+            queryset = queryset.filter(event=event)
+        username = request.GET.get('username', '').strip()
+        if username:
+            queryset = queryset.filter(username=username)
+        try:
+            events, next_cursor = queryset.page(request.GET.get('cursor'), self.list_per_page)
+        except ValueError:
+            events, next_cursor = queryset.page(None, self.list_per_page)
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Login events',
+            'opts': self.model._meta,
+            'events': events,
+            'next_cursor': next_cursor,
+            'event': event or '',
+            'username': username,
+            'event_choices': LoginEvent.EVENT_CHOICES,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, 'admin/users/loginevent/change_list.html', context)
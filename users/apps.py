@@ -4,3 +4,32 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "users"
+
+    def ready(self):
+        from django.contrib.auth.models import update_last_login
+        from django.contrib.auth.signals import user_logged_in, user_login_failed
+        from django.core.signals import request_started
+        from django.db.models.signals import post_delete, post_save
+
+        from .audit import audit_login_failure, audit_login_success
+        from .directory import directory_user_deleted, directory_user_saved, directory_users_bulk_changed
+        from .last_login import buffer_last_login
+        from .outbox import start_dispatcher
+        from .signals import users_bulk_changed
+
+        # Logins only touch memory; last_login is written in batches
+        user_logged_in.disconnect(update_last_login, dispatch_uid='update_last_login')
+        user_logged_in.connect(buffer_last_login, dispatch_uid='buffer_last_login')
+        user_logged_in.connect(audit_login_success, dispatch_uid='audit_login_success')
+        user_login_failed.connect(audit_login_failure, dispatch_uid='audit_login_failure')
+
+        # Cached doctor directory pages are dropped when users change
+        post_save.connect(directory_user_saved, sender=self.get_model('CustomUser'),
+                          dispatch_uid='directory_user_saved')
+        post_delete.connect(directory_user_deleted, sender=self.get_model('CustomUser'),
+                            dispatch_uid='directory_user_deleted')
+        users_bulk_changed.connect(directory_users_bulk_changed, dispatch_uid='directory_users_bulk_changed')
+
+        # Every serving process sends due outbox emails, not only the ones
+        # that queued some since they started
+        request_started.connect(start_dispatcher, dispatch_uid='start_outbox_dispatcher')
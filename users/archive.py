@@ -0,0 +1,146 @@
+"""
+Hot/cold partitioning of users.
+
+archive_inactive_users moves users who have not logged in for a while out of
+users_customuser into ArchivedUser: the username and email as indexed
+columns, everything else (password hash, profile, group and permission ids)
+as a JSON document. Their refresh tokens go with them, as a bulk delete does.
+
+Archived usernames and emails stay taken: the availability checks look at
+both tables in one UNION ALL query. When an archived user logs in with the right
+password, SlimUserBackend restores the row under its original id and the
+login carries on as usual.
+"""
+
+import logging
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import check_password
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import bulk
+from .models import ArchivedUser, CustomUser
+from .signals import users_bulk_changed
+
+logger = logging.getLogger(__name__)
+
+FIELDS = [field for field in CustomUser._meta.concrete_fields if not field.primary_key]
+# Set by auto_now / auto_now_add on insert, written back after a restore
+TIMESTAMP_FIELDS = ('created_at', 'updated_at')
+
+
+def to_json(value):
+    # isoformat() keeps the microseconds DjangoJSONEncoder would drop
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def inactive_users(cutoff):
+    """Users without a login since cutoff (or, never logged in, joined before it)"""
+    return CustomUser._base_manager.filter(is_staff=False, is_superuser=False).filter(
+        Q(last_login__lt=cutoff) | Q(last_login__isnull=True, date_joined__lt=cutoff)
+    )
+
+
+def archive_users(pks, cutoff):
+    """
+    Move the users in pks that are still inactive since cutoff to the
+    archive, in one transaction. Returns the number archived.
+    """
+    with transaction.atomic():
+        rows = list(inactive_users(cutoff).filter(pk__in=pks).values('pk', *(f.attname for f in FIELDS)))
+        if not rows:
+            return 0
+        archived_pks = [row['pk'] for row in rows]
+
+        relations = {}
+        for field in CustomUser._meta.many_to_many:
+            through = field.remote_field.through._base_manager
+            links = through.filter(**{f'{field.m2m_field_name()}__in': archived_pks}).values_list(
+                f'{field.m2m_field_name()}_id', f'{field.m2m_reverse_field_name()}_id'
+            )
+            for user_id, related_id in links:
+                relations.setdefault(user_id, {}).setdefault(field.name, []).append(related_id)
+
+        now = timezone.now()
+        ArchivedUser.objects.bulk_create([
+            ArchivedUser(
+                id=row['pk'],
+                username=row['username'],
+                email=row['email'],
+                data={
+                    **{name: to_json(value) for name, value in row.items() if name != 'pk'},
+                    **relations.get(row['pk'], {}),
+                },
+                archived_at=now,
+            )
+            for row in rows
+        ])
+        bulk.delete(archived_pks, now)
+    users_bulk_changed.send(sender=CustomUser, action='archive', pks=archived_pks, changes={}, actor=None)
+    return len(archived_pks)
+
+
+def restore_user(archived):
+    """Put an archived user back in users_customuser, returns the user"""
+    data = archived.data
+    user = CustomUser(pk=archived.pk, **{
+        field.attname: field.to_python(data[field.attname]) for field in FIELDS if field.attname in data
+    })
+    timestamps = {name: getattr(user, name) for name in TIMESTAMP_FIELDS}
+    try:
+        with transaction.atomic():
+            if not ArchivedUser.objects.filter(pk=archived.pk).delete()[0]:
+                # Restored by a concurrent login
+                return CustomUser.objects.filter(pk=archived.pk).first()
+            user.save(force_insert=True)
+            CustomUser._base_manager.filter(pk=user.pk).update(**timestamps)
+            for field in CustomUser._meta.many_to_many:
+                if data.get(field.name):
+                    getattr(user, field.name).set(data[field.name])
+    except IntegrityError:
+        logger.exception('Could not restore archived user %s', archived.username)
+        return None
+    for name, value in timestamps.items():
+        setattr(user, name, value)
+    logger.info('Restored archived user %s', user.username)
+    return user
+
+
+def archived_lookup(username):
+    """Filter for the archived user with this username (or email)"""
+    lookup = Q(username=username)
+    if '@' in username:
+        lookup |= Q(email=username)
+    return lookup
+
+
+def restore_on_login(username, password):
+    """The archived user matching username (or email) and password, restored"""
+    archived = ArchivedUser.objects.filter(archived_lookup(username)).first()
+    if archived is None or not check_password(password, archived.data.get('password')):
+        return None
+    return restore_user(archived)
+
+
+async def arestore_on_login(username, password):
+    """restore_on_login() with the password checked in the hashing pool"""
+    from .hashing import verify_password
+
+    archived = await ArchivedUser.objects.filter(archived_lookup(username)).afirst()
+    if archived is None:
+        return None
+    is_correct, _ = await verify_password(password, archived.data.get('password'))
+    if not is_correct:
+        return None
+    return await sync_to_async(restore_user)(archived)
+
+
+def is_taken(field, value):
+    """Whether a live or archived user has this username or email, in one query"""
+    lookup = {field: value}
+    return CustomUser._base_manager.filter(**lookup).order_by().values('pk').union(
+        ArchivedUser.objects.filter(**lookup).order_by().values('pk'), all=True
+    ).exists()
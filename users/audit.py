@@ -0,0 +1,147 @@
+"""
+Buffered login audit log.
+
+Every login attempt becomes a LoginEvent, but instead of an INSERT on the
+login path events go into a bounded in-process queue and a background thread
+writes them with bulk_create, every AUDIT_LOG_FLUSH_INTERVAL seconds or as
+soon as AUDIT_LOG_BATCH_SIZE events are waiting. When the queue is full the
+request waits up to AUDIT_LOG_ENQUEUE_TIMEOUT seconds for room (the flusher
+is woken to make some) and the event is dropped and counted after that, so a
+slow database can delay logins but never pile up unbounded memory. Whatever is
+left in the queue is written when the process exits.
+
+Events stay in one table indexed by time; prune_login_events drops the ones
+past AUDIT_LOG_RETENTION_DAYS in batches, which keeps it bounded the way a
+partitioned table or rolling files would.
+"""
+
+import logging
+import queue
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from .background import PeriodicFlusher
+
+logger = logging.getLogger(__name__)
+
+
+def client_ip(request):
+    """The address the request came from, None when there is no request"""
+    if request is None:
+        return None
+    return request.META.get('REMOTE_ADDR') or None
+
+
+class AuditLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = None
+        self.dropped = 0
+        self.flusher = PeriodicFlusher(
+            'audit-log-flusher', self.flush, lambda: settings.AUDIT_LOG_FLUSH_INTERVAL
+        )
+
+    @property
+    def queue(self):
+        # Created on first use so the size comes from the configured settings
+        if self._queue is None:
+            with self._lock:
+                if self._queue is None:
+                    self._queue = queue.Queue(maxsize=settings.AUDIT_LOG_BUFFER_SIZE)
+        return self._queue
+
+    def record(self, event, request=None, username='', user=None):
+        """Queue a login event, returns False if it had to be dropped"""
+        from .models import LoginEvent
+
+        meta = request.META if request is not None else {}
+        entry = LoginEvent(
+            event=event,
+            username=(username or getattr(user, 'username', '') or '')[:254],
+            user_id=getattr(user, 'pk', None),
+            ip_address=client_ip(request),
+            user_agent=meta.get('HTTP_USER_AGENT', '')[:255],
+            created_at=timezone.now(),
+        )
+        if settings.AUDIT_LOG_FLUSH_INTERVAL <= 0:
+            entry.save()
+            return True
+
+        self.flusher.start()
+        try:
+            self.queue.put_nowait(entry)
+        except queue.Full:
+            # Backpressure: make the flusher drain the queue and wait for room
+            self.flusher.wake()
+            try:
+                self.queue.put(entry, timeout=settings.AUDIT_LOG_ENQUEUE_TIMEOUT)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                logger.warning('Audit log buffer full, dropped %s event for %r', event, entry.username)
+                return False
+        if self.queue.qsize() >= settings.AUDIT_LOG_BATCH_SIZE:
+            self.flusher.wake()
+        return True
+
+    def flush(self):
+        """Write all queued events, returns how many were written"""
+        from .models import LoginEvent
+
+        written = 0
+        while True:
+            batch = []
+            try:
+                while len(batch) < settings.AUDIT_LOG_BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                return written
+            try:
+                LoginEvent.objects.bulk_create(batch)
+            except Exception:
+                # Put back what fits so the next flush can retry
+                for entry in batch:
+                    try:
+                        self.queue.put_nowait(entry)
+                    except queue.Full:
+                        with self._lock:
+                            self.dropped += 1
+                raise
+            written += len(batch)
+
+    def __len__(self):
+        return self.queue.qsize()
+
+
+audit_log = AuditLog()
+
+
+def flag_lockout(request, user):
+    """
+    Note that the right password was given for a deactivated user, so the
+    failed login is audited as a lockout
+    """
+    if request is not None:
+        request.login_locked_out_user = user
+
+
+def audit_login_success(sender, request, user, **kwargs):
+    """user_logged_in receiver"""
+    from .models import LoginEvent
+
+    audit_log.record(LoginEvent.SUCCESS, request, user=user)
+
+
+def audit_login_failure(sender, credentials, request=None, **kwargs):
+    """user_login_failed receiver, credentials are already scrubbed by Django"""
+    from .models import LoginEvent
+
+    locked_out = getattr(request, 'login_locked_out_user', None)
+    if locked_out is not None:
+        audit_log.record(LoginEvent.LOCKOUT, request, username=credentials.get('username', ''), user=locked_out)
+    else:
+        audit_log.record(LoginEvent.FAILURE, request, username=credentials.get('username', ''))
@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .audit import flag_lockout
+
+
+class SlimUserBackend(ModelBackend):
+    """
+    Authentication backend that loads the user attached to each request with
+    a narrow column set. The remaining columns are fetched together, once,
+    the first time one of them is read.
+
+    Users moved to the archive by archive_inactive_users are restored when
+    they log in with the right password.
+
+    aauthenticate() checks passwords in the users.hashing process pool, so
+    the async views never hash on the event loop.
+
+    The right password for a deactivated user is flagged on the request, so
+    the audit log records the refused login as a lockout.
+    """
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            from .archive import restore_on_login
+
+            user = restore_on_login(username, password)
+            if user is None:
+                # Hash once anyway, so unknown usernames take as long as wrong
+                # passwords (#20760)
+                UserModel().set_password(password)
+                return None
+        else:
+            if not user.check_password(password):
+                return None
+        return self.refuse_inactive(request, user)
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.only(*UserModel.SESSION_FIELDS).get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        user.load_deferred_together = True
+        return user if self.user_can_authenticate(user) else None
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        from .archive import arestore_on_login
+        from .hashing import make_password, verify_password
+
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            user = await arestore_on_login(username, password)
+            if user is None:
+                # Hash once anyway, so unknown usernames take as long as wrong
+                # passwords (#20760)
+                await make_password(password)
+                return None
+        else:
+            is_correct, rehash = await verify_password(password, user.password)
+            if not is_correct:
+                return None
+            if rehash:
+                user.password = rehash
+                await user.asave(update_fields=['password'])
+        return self.refuse_inactive(request, user)
+
+    def refuse_inactive(self, request, user):
+        if self.user_can_authenticate(user):
+            return user
+        flag_lockout(request, user)
+        return None
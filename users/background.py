@@ -0,0 +1,60 @@
+import atexit
+import logging
+import os
+import threading
+
+from django.db import close_old_connections
+
+from auth_project.db_routers import pin_to_primary
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicFlusher:
+    """
+    Calls `flush` from a daemon thread every `interval` seconds, sooner when
+    woken, and once more when the interpreter exits unless flush_at_exit is
+    False. The thread is started lazily and again after a fork, since threads do not survive one. The
+    thread reads from the primary, as no request middleware resets its
+    replica pinning.
+    """
+    def __init__(self, name, flush, interval, flush_at_exit=True):
+        self.name = name
+        self.flush = flush
+        self.interval = interval
+        self.flush_at_exit = flush_at_exit
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._atexit_registered = False
+
+    def start(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            if self.flush_at_exit and not self._atexit_registered:
+                atexit.register(self.flush_now)
+                self._atexit_registered = True
+
+    def wake(self):
+        self._wake.set()
+
+    def flush_now(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('%s: flush failed', self.name)
+
+    def _run(self):
+        pin_to_primary()
+        while True:
+            self._wake.wait(self.interval() if callable(self.interval) else self.interval)
+            self._wake.clear()
+            close_old_connections()
+            self.flush_now()
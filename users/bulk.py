@@ -0,0 +1,175 @@
+"""
+Set-based bulk changes to users, for admin actions over large selections.
+
+The selected ids are processed in chunks of BULK_ACTION_BATCH_SIZE, each one
+a single UPDATE or DELETE in its own transaction, and users_bulk_changed is
+sent once per chunk instead of save/delete signals per user. Deletes cascade
+by hand, one statement per related table, so no user row is ever loaded.
+
+Selections larger than BULK_ACTION_BACKGROUND_THRESHOLD run in a background
+thread that records its progress in a BulkJob row, see start_bulk_job().
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connections, models, router, transaction
+from django.utils import timezone
+
+from auth_project.db_routers import pin_to_primary
+
+from .models import BulkJob, CustomUser, RefreshToken
+from .outbox import queue_emails
+from .password_reset import RESET_FIELDS, reset_email
+from .signals import users_bulk_changed
+
+logger = logging.getLogger(__name__)
+
+
+def revoke_refresh_tokens(pks, now):
+    RefreshToken.objects.filter(user_id__in=pks, revoked_at__isnull=True).update(revoked_at=now)
+
+
+def activate(pks, now):
+    changes = {'is_active': True}
+    CustomUser.objects.filter(pk__in=pks).update(updated_at=now, **changes)
+    return changes
+
+
+def deactivate(pks, now):
+    changes = {'is_active': False}
+    CustomUser.objects.filter(pk__in=pks).update(updated_at=now, **changes)
+    revoke_refresh_tokens(pks, now)
+    return changes
+
+
+def make_doctor(pks, now):
+    changes = {'user_type': 'doctor'}
+    CustomUser.objects.filter(pk__in=pks).update(updated_at=now, **changes)
+    return changes
+
+
+def make_patient(pks, now):
+    changes = {'user_type': 'patient'}
+    CustomUser.objects.filter(pk__in=pks).update(updated_at=now, **changes)
+    return changes
+
+
+def force_password_reset(pks, now):
+    # An unusable password also fails every session's auth hash check, so
+    # the users are logged out everywhere. Each one is emailed a link to
+    # choose a new password, made after the update so it matches the new hash.
+    CustomUser.objects.filter(pk__in=pks).update(password=make_password(None), updated_at=now)
+    revoke_refresh_tokens(pks, now)
+    users = CustomUser.objects.filter(pk__in=pks).exclude(email='').only(*RESET_FIELDS)
+    queue_emails([reset_email(user, forced=True) for user in users])
+    return {'password': None}
+
+
+def delete(pks, now):
+    for relation in CustomUser._meta.related_objects:
+        if relation.many_to_many or relation.on_delete is models.DO_NOTHING:
+            continue
+        related = relation.related_model._base_manager.filter(**{f'{relation.field.name}__in': pks})
+        if relation.on_delete is models.CASCADE:
+            related.delete()
+        elif relation.on_delete is models.SET_NULL:
+            related.update(**{relation.field.name: None})
+        else:
+            raise ValueError(f'Cannot bulk delete users referenced by {relation.related_model.__name__}')
+    for field in CustomUser._meta.many_to_many:
+        field.remote_field.through._base_manager.filter(**{f'{field.m2m_field_name()}__in': pks}).delete()
+    # Everything pointing at the users is gone, so the rows can be removed
+    # directly instead of through the collector, which loads each one to
+    # send delete signals
+    users = CustomUser._base_manager.filter(pk__in=pks)
+    users._raw_delete(router.db_for_write(CustomUser))
+    return {}
+
+
+ACTIONS = {
+    'activate': activate,
+    'deactivate': deactivate,
+    'make_doctor': make_doctor,
+    'make_patient': make_patient,
+    'force_password_reset': force_password_reset,
+    'delete': delete,
+}
+
+
+def apply_bulk_action(action, pks, actor=None, progress=None):
+    """
+    Run action over the user ids in pks chunk by chunk. progress, if given,
+    is called with (done, total) after every chunk. Returns the number of
+    users processed.
+    """
+    change = ACTIONS[action]
+    pks = list(pks)
+    total = len(pks)
+    size = settings.BULK_ACTION_BATCH_SIZE
+    for start in range(0, total, size):
+        batch = pks[start:start + size]
+        with transaction.atomic():
+            changes = change(batch, timezone.now())
+        users_bulk_changed.send(sender=CustomUser, action=action, pks=batch, changes=changes, actor=actor)
+        done = start + len(batch)
+        logger.info('Bulk %s: %d/%d users', action, done, total)
+        if progress:
+            progress(done, total)
+    return total
+
+
+# ==================== Background jobs ====================
+
+def get_bulk_job(job_id):
+    return BulkJob.objects.filter(pk=job_id).first()
+
+
+def start_bulk_job(action, pks, actor=None):
+    """Run apply_bulk_action in a thread, returns the BulkJob id to poll"""
+    job = BulkJob.objects.create(
+        action=action, pks=list(pks), total=len(pks), actor_id=getattr(actor, 'pk', None)
+    )
+    # Not a daemon, so a graceful shutdown lets the current chunk finish; if
+    # the worker dies anyway, run_bulk_jobs picks the job up where it stopped
+    threading.Thread(
+        target=run_bulk_job, args=(job,), name=f'bulk-{action}-{job.pk.hex[:8]}'
+    ).start()
+    return job.pk
+
+
+def run_bulk_job(job):
+    """Apply the job's action to the users it has not reached yet"""
+    # Outside a request nothing resets replica pinning; read what was written
+    pin_to_primary()
+    jobs = BulkJob.objects.filter(pk=job.pk)
+    start = job.done
+    actor = CustomUser.objects.filter(pk=job.actor_id).first() if job.actor_id else None
+
+    def progress(done, total):
+        jobs.update(done=start + done, updated_at=timezone.now())
+
+    try:
+        apply_bulk_action(job.action, job.pks[start:], actor, progress)
+    except Exception as exc:
+        logger.exception('Bulk %s job %s failed', job.action, job.pk)
+        jobs.update(state=BulkJob.FAILED, error=str(exc), finished_at=timezone.now())
+    else:
+        jobs.update(state=BulkJob.DONE, finished_at=timezone.now())
+    finally:
+        connections.close_all()
+
+
+def claim_stale_jobs(stale_after, now):
+    """Running jobs not touched for stale_after seconds, claimed for this process"""
+    pin_to_primary()
+    cutoff = now - timedelta(seconds=stale_after)
+    claimed = []
+    for job in BulkJob.objects.filter(state=BulkJob.RUNNING, updated_at__lt=cutoff):
+        # Another process may resume the same job, only one update matches
+        if BulkJob.objects.filter(pk=job.pk, updated_at=job.updated_at).update(updated_at=now):
+            claimed.append(job)
+    return claimed
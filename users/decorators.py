@@ -0,0 +1,37 @@
+from functools import wraps
+
+from django.http import JsonResponse
+
+from .tokens import InvalidToken, TokenUser, verify_access_token
+
+
+def invalid_token_response(message):
+    response = JsonResponse({'error': 'invalid_token', 'message': message}, status=401)
+    response['WWW-Authenticate'] = 'Bearer error="invalid_token"'
+    return response
+
+
+def token_or_session_required(view_func):
+    """
+    Authenticate an API request from a Bearer access token, falling back to
+    the session. Token requests are verified without any DB query and get a
+    TokenUser as request.user.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if header.startswith('Bearer '):
+            try:
+                claims = verify_access_token(header[len('Bearer '):].strip())
+            except InvalidToken as e:
+                return invalid_token_response(str(e))
+            request.user = TokenUser(claims)
+        elif not request.user.is_authenticated:
+            response = JsonResponse({
+                'error': 'authentication_required',
+                'message': 'Authentication credentials were not provided',
+            }, status=401)
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+        return view_func(request, *args, **kwargs)
+    return wrapper
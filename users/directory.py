@@ -0,0 +1,129 @@
+"""
+Doctor directory queries.
+
+Every filter combination is answered from one of the partial active doctor indexes
+on CustomUser: equality on city, state or pincode, then a range on
+search_name for the name prefix, then (search_name, id) for both the order
+and the keyset cursor, so a page costs the same at any depth and any table
+size. Only DIRECTORY_FIELDS are read.
+
+Pages are cached per filter and cursor under a generation number that is
+bumped whenever a user is saved (except for new patients and login-only
+updates) or deleted, which drops every cached page at once without having to
+know which ones a change affects. With the default per-process cache other
+workers see a change after DOCTOR_DIRECTORY_CACHE_TIMEOUT at the latest;
+configure a shared cache to make it immediate.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from .models import CustomUser
+
+CURSOR_SALT = 'users.directory.cursor'
+GENERATION_KEY = 'doctor-directory:generation'
+
+# Sorts after every character a name can contain, closing the prefix range
+PREFIX_END = '\U0010ffff'
+
+
+def encode_cursor(row):
+    return signing.dumps([row['search_name'], row['id']], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    """The (search_name, id) a cursor points after, None if it is invalid"""
+    try:
+        search_name, pk = signing.loads(cursor, salt=CURSOR_SALT)
+        return str(search_name), int(pk)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def search_doctors(name='', city='', state='', pincode='', cursor=None, limit=20):
+    """
+    One page of active doctors ordered by name. Returns the rows as dicts of
+    DIRECTORY_FIELDS plus picture_url, and the cursor of the next page, which
+    is None on the last page.
+    """
+    queryset = CustomUser.objects.filter(user_type='doctor', is_active=True)
+    if city:
+        queryset = queryset.filter(city=city)
+    if state:
+        queryset = queryset.filter(state=state)
+    if pincode:
+        queryset = queryset.filter(pincode=pincode)
+    if name:
+        queryset = queryset.filter(search_name__gte=name, search_name__lt=name + PREFIX_END)
+
+    after = decode_cursor(cursor) if cursor else None
+    if after:
+        search_name, pk = after
+        queryset = queryset.filter(search_name__gte=search_name).exclude(
+            search_name=search_name, id__lte=pk
+        )
+
+    rows = list(
+        queryset.order_by('search_name', 'id').values(*CustomUser.DIRECTORY_FIELDS)[:limit + 1]
+    )
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    rows = rows[:limit]
+    for row in rows:
+        picture = row['profile_picture']
+        row['picture_url'] = default_storage.url(picture) if picture else None
+    return rows, next_cursor
+
+
+def new_generation():
+    # Never reuses a number whose pages may still be cached after the
+    # generation key itself was evicted
+    return time.time_ns()
+
+
+def cache_key(generation, filters, cursor, limit):
+    parts = [filters.get(key, '') for key in ('name', 'city', 'state', 'pincode')]
+    raw = '\x1f'.join(parts + [cursor or '', str(limit)])
+    return f'doctor-directory:{generation}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def cached_search_doctors(filters, cursor=None, limit=20):
+    """search_doctors() through the cache, see the module docstring"""
+    generation = cache.get_or_set(GENERATION_KEY, new_generation, None)
+    key = cache_key(generation, filters, cursor, limit)
+    page = cache.get(key)
+    if page is None:
+        page = search_doctors(cursor=cursor, limit=limit, **filters)
+        cache.set(key, page, settings.DOCTOR_DIRECTORY_CACHE_TIMEOUT)
+    return page
+
+
+def invalidate_directory():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, new_generation(), None)
+
+
+def directory_user_saved(sender, instance, created, **kwargs):
+    """post_save receiver; a new patient cannot change any directory page"""
+    if created and instance.user_type != 'doctor':
+        return
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login', 'password'}:
+        return
+    invalidate_directory()
+
+
+def directory_user_deleted(sender, instance, **kwargs):
+    """post_delete receiver"""
+    invalidate_directory()
+
+
+def directory_users_bulk_changed(sender, **kwargs):
+    """users_bulk_changed receiver, once per batch"""
+    invalidate_directory()
@@ -1,7 +1,11 @@
+from asgiref.sync import sync_to_async
 from django import forms
-from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.contrib.auth import aauthenticate
+from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, SetPasswordForm
 from django.core.exceptions import ValidationError
-from .models import CustomUser
+from .archive import is_taken
+from .models import ArchivedUser, CustomUser
+from .postal import fold, get_postal_index
 class SignUpForm(UserCreationForm):
     """
     Extended signup form with all required fields
@@ -81,7 +85,9 @@ class SignUpForm(UserCreationForm):
         required=True,
         widget=forms.TextInput(attrs={
             'class': 'form-control',
-            'placeholder': 'City'
+            'placeholder': 'City',
+            'list': 'cityOptions',
+            'autocomplete': 'off'
         })
     )
     
@@ -99,7 +105,10 @@ class SignUpForm(UserCreationForm):
         required=True,
         widget=forms.TextInput(attrs={
             'class': 'form-control',
-            'placeholder': 'Pincode'
+            'placeholder': 'Pincode',
+            'list': 'pincodeOptions',
+            'autocomplete': 'off',
+            'inputmode': 'numeric'
         })
     )
     
@@ -131,14 +140,14 @@ class SignUpForm(UserCreationForm):
     def clean_email(self):
         """Validate email uniqueness"""
         email = self.cleaned_data.get('email')
-        if CustomUser.objects.filter(email=email).exists():
+        if is_taken('email', email):
             raise ValidationError('This email address is already registered.')
         return email
     
     def clean_username(self):
         """Validate username"""
         username = self.cleaned_data.get('username')
-        if CustomUser.objects.filter(username=username).exists():
+        if is_taken('username', username):
             raise ValidationError('This username is already taken.')
         return username
     
@@ -152,11 +161,33 @@ class SignUpForm(UserCreationForm):
             raise ValidationError({
                 'password2': 'Passwords do not match.'
             })
+
+        #Store known places with their canonical spelling
+        pincode = cleaned_data.get('pincode', '').strip()
+        city = cleaned_data.get('city', '').strip().casefold()
+        for entry in get_postal_index().by_pincode_prefix(pincode):
+            if entry['pincode'] == pincode and entry['city'].casefold() == city:
+                cleaned_data['city'] = entry['city']
+                cleaned_data['state'] = entry['state']
+                break
         
         return cleaned_data
     
-    def save(self, commit=True):
+    # Set by save(encoded_password=...), see users.hashing
+    encoded_password = None
+
+    def set_password_and_save(self, user, password_field_name='password1', commit=True):
+        """Use the password hashed in advance when there is one"""
+        if self.encoded_password is None:
+            return super().set_password_and_save(user, password_field_name, commit)
+        user.password = self.encoded_password
+        if commit:
+            user.save()
+        return user
+
+    def save(self, commit=True, encoded_password=None):
         """Save user with all fields"""
+        self.encoded_password = encoded_password
         user = super().save(commit=False)
         user.email = self.cleaned_data['email']
         user.first_name = self.cleaned_data['first_name']
@@ -194,6 +225,37 @@ class LoginForm(AuthenticationForm):
         })
     )
     
+    # Set by ais_valid(), which authenticates after the fields are clean
+    defer_authentication = False
+
+    def clean(self):
+        if self.defer_authentication:
+            return self.cleaned_data
+        return super().clean()
+
+    async def ais_valid(self):
+        """
+        is_valid() for async views: the fields are cleaned in a thread and the
+        credentials checked with aauthenticate(), which hashes in the
+        users.hashing pool. Raises HashingOverloaded when the pool is full.
+        """
+        self.defer_authentication = True
+        if not await sync_to_async(self.is_valid)():
+            return False
+        self.user_cache = await aauthenticate(
+            self.request,
+            username=self.cleaned_data['username'],
+            password=self.cleaned_data['password'],
+        )
+        try:
+            if self.user_cache is None:
+                raise self.get_invalid_login_error()
+            self.confirm_login_allowed(self.user_cache)
+        except ValidationError as e:
+            self.add_error(None, e)
+            return False
+        return True
+
     def clean_username(self):
         """Allow login with email or username"""
         username = self.cleaned_data.get('username')
@@ -205,5 +267,104 @@ class LoginForm(AuthenticationForm):
                 return user.username
             except CustomUser.DoesNotExist:
                 pass
+            # Archived users are restored by the backend under their username
+            archived = ArchivedUser.objects.filter(email=username).values_list('username', flat=True).first()
+            if archived:
+                return archived
         
-        return username
\ No newline at end of file
+        return username
+
+class PasswordResetRequestForm(forms.Form):
+    """
+    Email address to send a password reset link to
+    """
+    email = forms.EmailField(
+        widget=forms.EmailInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Email address'
+        })
+    )
+
+class ResetPasswordForm(SetPasswordForm):
+    """
+    New password, chosen from a reset link
+    """
+    new_password1 = forms.CharField(
+        strip=False,
+        widget=forms.PasswordInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'New password',
+            'autocomplete': 'new-password'
+        })
+    )
+
+    new_password2 = forms.CharField(
+        strip=False,
+        widget=forms.PasswordInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Confirm new password',
+            'autocomplete': 'new-password'
+        })
+    )
+
+class DoctorDirectoryForm(forms.Form):
+    """
+    Filters for the doctor directory. City and state are spelled the way
+    the postal index does, so they match what sign up stored; pincode
+    matches exactly and name matches the start of the full name in any case.
+    """
+    name = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Doctor name'
+        })
+    )
+
+    city = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'City'
+        })
+    )
+
+    state = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'State'
+        })
+    )
+
+    pincode = forms.CharField(
+        required=False,
+        max_length=10,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Pincode'
+        })
+    )
+
+    def clean_name(self):
+        return CustomUser.compose_search_name(self.cleaned_data['name'])
+
+    def clean(self):
+        cleaned_data = super().clean()
+        index = get_postal_index()
+
+        #Spell known states and cities the way sign up stores them
+        state = cleaned_data.get('state', '')
+        if state:
+            cleaned_data['state'] = index.canonical_state(state) or state
+        city = cleaned_data.get('city', '')
+        places = [place for place in index.by_city_prefix(city) if fold(place['city']) == fold(city)]
+        for place in places:
+            if not state or place['state'] == cleaned_data['state']:
+                cleaned_data['city'] = place['city']
+                break
+
+        return cleaned_data
@@ -0,0 +1,126 @@
+"""
+Password hashing off the event loop.
+
+Django's async authentication still runs PBKDF2 on the thread that awaits it,
+which under ASGI is the event loop: every login stalls every other request
+for the length of a hash. The coroutines here hand the work to a process
+pool of PASSWORD_HASHING_WORKERS instead, so hashes run in parallel on all
+cores and outside the GIL while the loop keeps serving.
+
+At most PASSWORD_HASHING_MAX_PENDING hashes are queued or running at once.
+Past that, HashingOverloaded is raised straight away and the async views
+answer 503, so a burst of logins is shed instead of piling up behind the
+pool with ever longer waits. A pool whose worker died is dropped and
+started again on the next hash; the hashes it was running fail with
+HashingOverloaded too, rather than taking the pool down for good.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+
+class HashingOverloaded(Exception):
+    """Too many password hashes are already pending"""
+
+
+def _init_worker(settings_module):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+def _make_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
+
+
+def _verify_password(password, encoded):
+    """(is_correct, a rehash with the preferred hasher if the hash is outdated)"""
+    from django.contrib.auth.hashers import make_password, verify_password
+    is_correct, must_update = verify_password(password, encoded)
+    return is_correct, make_password(password) if is_correct and must_update else None
+
+
+class HashingPool:
+    def __init__(self):
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def executor(self):
+        # Started on first use, and again in a forked worker: the parent's
+        # pool processes do not belong to it
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS,
+                # Not fork: the pool is started from a process with threads running
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'auth_project.settings'),),
+            )
+            self._pid = os.getpid()
+            self._pending = 0
+        return self._executor
+
+    async def submit(self, func, *args):
+        with self._lock:
+            executor = self.executor()
+            if self._pending >= settings.PASSWORD_HASHING_MAX_PENDING:
+                raise HashingOverloaded(f'{self._pending} password hashes pending')
+            self._pending += 1
+        try:
+            future = executor.submit(func, *args)
+            future.add_done_callback(lambda future: self._done(executor))
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool as exc:
+            self._discard(executor)
+            raise HashingOverloaded('password hashing pool broke, restarting it') from exc
+
+    def _done(self, executor):
+        with self._lock:
+            # A discarded pool's count was already reset
+            if executor is self._executor:
+                self._pending -= 1
+
+    def _discard(self, executor):
+        """Drop a broken pool, the next hash starts a new one"""
+        with self._lock:
+            if executor is not self._executor:
+                return
+            self._executor = None
+            self._pending = 0
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
+
+
+pool = HashingPool()
+
+
+async def make_password(password):
+    """Hash password in the pool, see django.contrib.auth.hashers.make_password"""
+    return await pool.submit(_make_password, password)
+
+
+async def verify_password(password, encoded):
+    """
+    Check password against encoded in the pool. Returns (is_correct, rehash),
+    rehash being a new encoded password to store when the hasher or its
+    iteration count has changed, else None.
+    """
+    return await pool.submit(_verify_password, password, encoded)
@@ -0,0 +1,70 @@
+"""
+Coalesced last_login updates.
+
+Django's update_last_login receiver saves the user on every login, which is a
+write (and an updated_at bump) on the login hot path. Instead, login times are
+kept in memory and written with one bulk_update per flush, at most
+LAST_LOGIN_FLUSH_INTERVAL seconds later. bulk_update leaves updated_at alone.
+"""
+
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from .background import PeriodicFlusher
+
+
+class LastLoginBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.flusher = PeriodicFlusher(
+            'last-login-flusher', self.flush, lambda: settings.LAST_LOGIN_FLUSH_INTERVAL
+        )
+
+    def record(self, user):
+        """Remember the login time of user; the instance is updated right away"""
+        user.last_login = timezone.now()
+        if settings.LAST_LOGIN_FLUSH_INTERVAL <= 0:
+            type(user)._default_manager.filter(pk=user.pk).update(last_login=user.last_login)
+            return
+        with self._lock:
+            self._pending[user.pk] = user.last_login
+            pending = len(self._pending)
+        self.flusher.start()
+        if pending >= settings.LAST_LOGIN_BUFFER_SIZE:
+            self.flusher.wake()
+
+    def flush(self):
+        """Write buffered login times, returns the number of users updated"""
+        from .models import CustomUser
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            CustomUser.objects.bulk_update(
+                [CustomUser(pk=pk, last_login=when) for pk, when in pending.items()],
+                ['last_login'],
+                batch_size=500,
+            )
+        except Exception:
+            # Keep the entries for the next flush, unless newer ones arrived
+            with self._lock:
+                for pk, when in pending.items():
+                    self._pending.setdefault(pk, when)
+            raise
+        return len(pending)
+
+    def __len__(self):
+        return len(self._pending)
+
+
+last_login_buffer = LastLoginBuffer()
+
+
+def buffer_last_login(sender, user, **kwargs):
+    """user_logged_in receiver replacing django.contrib.auth.models.update_last_login"""
+    last_login_buffer.record(user)
@@ -0,0 +1,50 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.archive import archive_users, inactive_users
+
+
+class Command(BaseCommand):
+    help = (
+        'Move users who have not logged in for --days days (staff excluded) to '
+        'the archive table, one transaction per chunk. Their usernames and '
+        'emails stay taken, and they are restored when they log in again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_INACTIVE_DAYS,
+                            help='archive users inactive for this many days')
+        parser.add_argument('--chunk-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='only count the users to archive')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1:
+            raise CommandError('--days must be positive')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        if options['dry_run']:
+            count = inactive_users(cutoff).count()
+            self.stdout.write(f'{count} users inactive since {cutoff:%Y-%m-%d} would be archived')
+            return
+
+        archived = 0
+        last_pk = 0
+        while True:
+            # Walk the primary key so every chunk is a short range scan
+            pks = list(
+                inactive_users(cutoff).filter(pk__gt=last_pk).order_by('pk')
+                .values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not pks:
+                break
+            archived += archive_users(pks, cutoff)
+            last_pk = pks[-1]
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Archived {archived} users')
+        if options['verbosity']:
+            self.stdout.write(f'Archived {archived} users inactive since {cutoff:%Y-%m-%d %H:%M}')
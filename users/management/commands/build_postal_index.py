@@ -0,0 +1,46 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from users.postal import PostalIndex, build_index, read_postal_csv
+
+SAMPLE_CSV = Path(__file__).resolve().parents[2] / 'data' / 'postal_codes_sample.csv'
+
+
+class Command(BaseCommand):
+    help = (
+        'Build the memory-mapped pincode/city index used by the signup '
+        'autocomplete from a postal CSV with pincode, city (or district) and '
+        'state columns, such as the India Post pincode directory.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(SAMPLE_CSV),
+                            help='Postal CSV (default: the bundled sample of major cities)')
+        parser.add_argument('--output', default=str(settings.POSTAL_INDEX_PATH),
+                            help='Index file to write (default: POSTAL_INDEX_PATH)')
+
+    def handle(self, *args, **options):
+        began = time.perf_counter()
+        try:
+            data = build_index(read_postal_csv(options['source']))
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        # Write next to the target and swap it in, so running workers keep
+        # their mapping of the old file
+        output = Path(options['output'])
+        output.parent.mkdir(parents=True, exist_ok=True)
+        partial = output.with_name(output.name + '.tmp')
+        partial.write_bytes(data)
+        os.replace(partial, output)
+
+        index = PostalIndex(data)
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {output}: {len(index)} pincode entries, {len(index.place_key)} places, '
+                f'{len(data) / 1024:.1f} KiB in {time.perf_counter() - began:.2f}s'
+            ))
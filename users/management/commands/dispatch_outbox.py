@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from auth_project.db_routers import pin_to_primary
+
+from users.outbox import dispatch_outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Send the emails waiting in the outbox, in batches over one connection '
+        'each. With --loop, keep sending every --interval seconds; use it when '
+        'EMAIL_OUTBOX_DISPATCH_INTERVAL is 0 and the web processes do not send.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='keep running')
+        parser.add_argument('--interval', type=float, default=settings.EMAIL_OUTBOX_DISPATCH_INTERVAL or 5,
+                            help='seconds between rounds with --loop')
+
+    def handle(self, *args, **options):
+        if options['interval'] <= 0:
+            raise CommandError('--interval must be positive')
+        # Claims must see the rows the last round updated
+        pin_to_primary()
+        while True:
+            sent = dispatch_outbox()
+            if options['verbosity'] and (sent or not options['loop']):
+                self.stdout.write(f'Sent {sent} emails')
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
+            close_old_connections()
@@ -0,0 +1,72 @@
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from auth_project.profiling import FILE_SUFFIX, read_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Merge the sampling profiler output of every worker. Prints collapsed '
+        'stacks (one "view;frame;...;frame count" line each) ready for '
+        'flamegraph.pl or speedscope, or with --summary the samples per view '
+        'and the functions they were spent in.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=str(settings.PROFILING_DIR), help='profile directory')
+        parser.add_argument('--view', action='append', dest='views',
+                            help='only this view, e.g. users:login (repeatable)')
+        parser.add_argument('--summary', action='store_true', help='print samples per view instead')
+        parser.add_argument('--top', type=int, default=15, help='functions per view in the summary')
+        parser.add_argument('--output', help='write the stacks to this file instead of stdout')
+        parser.add_argument('--clear', action='store_true', help='delete the profile files afterwards')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir'])
+        if not directory.is_dir():
+            raise CommandError(f'{directory} does not exist, is PROFILING_ENABLED on?')
+        counts = read_profiles(directory)
+        if options['views']:
+            views = set(options['views'])
+            counts = Counter({
+                stack: count for stack, count in counts.items() if stack.split(';', 1)[0] in views
+            })
+
+        if options['summary']:
+            self.write_summary(counts, options['top'])
+        else:
+            lines = ''.join(f'{stack} {count}\n' for stack, count in sorted(counts.items()))
+            if options['output']:
+                Path(options['output']).write_text(lines, encoding='utf-8')
+            else:
+                self.stdout.write(lines, ending='')
+
+        if options['clear']:
+            for path in directory.glob(f'*{FILE_SUFFIX}'):
+                path.unlink()
+
+    def write_summary(self, counts, top):
+        samples = Counter()
+        leaves = defaultdict(Counter)
+        inclusive = defaultdict(Counter)
+        for stack, count in counts.items():
+            view, *frames = stack.split(';')
+            samples[view] += count
+            if frames:
+                leaves[view][frames[-1]] += count
+            for frame in set(frames):
+                inclusive[view][frame] += count
+
+        if not samples:
+            self.stdout.write('No samples.')
+            return
+        for view, total in samples.most_common():
+            self.stdout.write(f'\n{view}: {total} samples')
+            self.stdout.write(f'  {"self %":>7}  {"total %":>7}  function')
+            for frame, count in leaves[view].most_common(top):
+                self.stdout.write(
+                    f'  {100 * count / total:7.1f}  {100 * inclusive[view][frame] / total:7.1f}  {frame}'
+                )
@@ -0,0 +1,279 @@
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import traceback
+from collections import defaultdict
+from io import BytesIO
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+DEFAULT_REQUESTS = [
+    'GET /users/login/',
+    'GET /users/signup/',
+    'POST /users/ajax/validate-password/ password=Warmup!Passw0rd',
+]
+
+# Any 32 character token is accepted as long as the cookie matches it
+PROBE_CSRF_TOKEN = 'w' * 32
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile worker startup: import time per module (aggregated from '
+        'python -X importtime) and, with worker warmup off and on, the time '
+        'to the first response and the memory of workers forked from a '
+        'preloaded parent.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='modules and packages to list')
+        parser.add_argument('--runs', type=int, default=3, help='import time runs to average')
+        parser.add_argument('--workers', type=int, default=4, help='workers to fork per probe')
+        parser.add_argument('--request', action='append', dest='requests',
+                            help='"METHOD /path/ [urlencoded body]" served by each worker, '
+                                 'repeatable (default: login and signup pages, password check)')
+        parser.add_argument('--json', action='store_true', help='print the report as JSON')
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1 or options['workers'] < 1:
+            raise CommandError('--runs and --workers must be positive')
+        requests = options['requests'] or DEFAULT_REQUESTS
+
+        report = {
+            'imports': self.profile_imports(options['runs'], options['top']),
+            'workers': {
+                'cold': self.probe_workers(False, options['workers'], requests),
+                'warm': self.probe_workers(True, options['workers'], requests),
+            },
+        }
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.write_report(report)
+
+    def child_env(self, warmup):
+        env = os.environ.copy()
+        env['DJANGO_SETTINGS_MODULE'] = os.environ.get('DJANGO_SETTINGS_MODULE', 'auth_project.settings')
+        env['DJANGO_WORKER_WARMUP'] = '1' if warmup else '0'
+        return env
+
+    def run_child(self, args, warmup):
+        return subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR, env=self.child_env(warmup),
+            capture_output=True, text=True,
+        )
+
+    # ==================== Import time ====================
+
+    def profile_imports(self, runs, top):
+        """Average `-X importtime` over several fresh interpreters"""
+        self_us = defaultdict(int)
+        cumulative_us = defaultdict(int)
+        total_us = 0
+        for _ in range(runs):
+            result = self.run_child(['-X', 'importtime', '-c', 'import auth_project.wsgi'], warmup=False)
+            if result.returncode:
+                raise CommandError(f'Importing the project failed:\n{result.stderr}')
+            for line in result.stderr.splitlines():
+                match = IMPORTTIME_LINE.match(line)
+                if not match:
+                    continue
+                own, cumulative, _, module = match.groups()
+                self_us[module] += int(own)
+                cumulative_us[module] += int(cumulative)
+                total_us += int(own)
+
+        packages = defaultdict(int)
+        for module, own in self_us.items():
+            packages[module.split('.')[0]] += own
+
+        def ms(us):
+            return round(us / runs / 1000, 2)
+
+        return {
+            'total_ms': ms(total_us),
+            'modules': len(self_us),
+            'packages': [
+                {'package': name, 'self_ms': ms(own)}
+                for name, own in sorted(packages.items(), key=lambda item: -item[1])[:top]
+            ],
+            'slowest_modules': [
+                {'module': name, 'self_ms': ms(own), 'cumulative_ms': ms(cumulative_us[name])}
+                for name, own in sorted(self_us.items(), key=lambda item: -item[1])[:top]
+            ],
+        }
+
+    # ==================== Workers ====================
+
+    def probe_workers(self, warmup, workers, requests):
+        result = self.run_child([
+            '-c', 'import sys; from users.management.commands.profile_startup import probe; '
+                  'probe(int(sys.argv[1]), sys.argv[2:])',
+            str(workers), *requests,
+        ], warmup=warmup)
+        if result.returncode:
+            raise CommandError(f'Worker probe failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def write_report(self, report):
+        imports = report['imports']
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Import time: {imports['total_ms']} ms over {imports['modules']} modules"
+        ))
+        for row in imports['packages']:
+            self.stdout.write(f"  {row['self_ms']:>9.2f} ms  {row['package']}")
+        self.stdout.write(self.style.MIGRATE_HEADING('Slowest modules (self / cumulative)'))
+        for row in imports['slowest_modules']:
+            self.stdout.write(f"  {row['self_ms']:>9.2f} / {row['cumulative_ms']:>9.2f} ms  {row['module']}")
+
+        for label, probe_report in report['workers'].items():
+            parent = probe_report['parent']
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"Workers, warmup {'on' if label == 'warm' else 'off'}: "
+                f"app loaded in {parent['load_ms']} ms, parent RSS {parent['memory'].get('rss_kb')} kB"
+            ))
+            for index, worker in enumerate(probe_report['workers']):
+                memory = worker['memory']
+                self.stdout.write(
+                    f"  worker {index}: first response {worker['first_response_ms']} ms, "
+                    f"RSS {memory.get('rss_kb')} kB, PSS {memory.get('pss_kb')} kB, "
+                    f"private {memory.get('private_kb')} kB"
+                )
+            for row in probe_report['workers'][0]['requests']:
+                self.stdout.write(
+                    f"    {row['request']}: {row['status']} first {row['first_ms']} ms, then {row['warm_ms']} ms"
+                )
+
+
+def memory_usage():
+    """RSS, PSS and private (unshared) memory of this process in kB"""
+    fields = {'Rss': 'rss_kb', 'Pss': 'pss_kb', 'Private_Clean': 'private_kb', 'Private_Dirty': 'private_kb'}
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            for line in smaps:
+                name, _, value = line.partition(':')
+                if name in fields:
+                    key = fields[name]
+                    usage[key] = usage.get(key, 0) + int(value.split()[0])
+    except OSError:
+        import resource
+        usage['rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage
+
+
+def call_application(application, spec):
+    """Serve one "METHOD /path/ [body]" request, returns the status code"""
+    method, path, *body = spec.split(' ', 2)
+    body = body[0].encode() if body else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'CONTENT_LENGTH': str(len(body)),
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'HTTP_COOKIE': f'{settings.CSRF_COOKIE_NAME}={PROBE_CSRF_TOKEN}',
+        'HTTP_X_CSRFTOKEN': PROBE_CSRF_TOKEN,
+        'wsgi.input': BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    status = []
+    chunks = application(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in chunks:
+            pass
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+    return int(status[0].split()[0])
+
+
+def serve_requests(application, requests):
+    began = time.perf_counter()
+    rows = []
+    for spec in requests:
+        start = time.perf_counter()
+        status = call_application(application, spec)
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        call_application(application, spec)
+        warm = time.perf_counter() - start
+        rows.append({
+            'request': spec.split(' ', 2)[1] if ' ' in spec else spec,
+            'status': status,
+            'first_ms': round(first * 1000, 2),
+            'warm_ms': round(warm * 1000, 2),
+        })
+        if len(rows) == 1:
+            first_response = time.perf_counter() - began
+    return {'first_response_ms': round(first_response * 1000, 2), 'requests': rows}
+
+
+def probe(workers, requests):
+    """
+    Run in a fresh interpreter by the command: load the WSGI application the
+    way a preforking server does, fork `workers` children that each serve
+    `requests`, and print one JSON line with their timings and memory. The
+    memory is sampled while all workers are alive so PSS splits the shared
+    pages between all of them.
+    """
+    start = time.perf_counter()
+    from auth_project.wsgi import application
+    parent = {'load_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+    if not hasattr(os, 'fork'):
+        report = serve_requests(application, requests)
+        report['memory'] = memory_usage()
+        parent['memory'] = report['memory']
+        print(json.dumps({'parent': parent, 'workers': [report]}))
+        return
+
+    children = []
+    for _ in range(workers):
+        report_read, report_write = os.pipe()
+        go_read, go_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Never return into the parent's code: an exception here would
+            # otherwise carry on with the fork loop and the report
+            status = 1
+            try:
+                os.close(report_read)
+                os.close(go_write)
+                with os.fdopen(report_write, 'w') as out, os.fdopen(go_read) as go:
+                    out.write(json.dumps(serve_requests(application, requests)) + '\n')
+                    out.flush()
+                    go.readline()
+                    out.write(json.dumps(memory_usage()) + '\n')
+                status = 0
+            except BaseException:
+                traceback.print_exc()
+            finally:
+                sys.stderr.flush()
+                os._exit(status)
+        os.close(report_write)
+        os.close(go_read)
+        children.append((pid, os.fdopen(report_read), os.fdopen(go_write, 'w')))
+
+    reports = []
+    for pid, out, _ in children:
+        line = out.readline()
+        if not line:
+            raise RuntimeError(f'Worker {pid} exited without a report, exit status {os.waitpid(pid, 0)[1]}')
+        reports.append(json.loads(line))
+    for _, _, go in children:
+        go.write('\n')
+        go.flush()
+    for report, (pid, out, go) in zip(reports, children):
+        report['memory'] = json.loads(out.readline())
+        out.close()
+        go.close()
+        os.waitpid(pid, 0)
+    parent['memory'] = memory_usage()
+    print(json.dumps({'parent': parent, 'workers': reports}))
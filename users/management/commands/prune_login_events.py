@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.models import LoginEvent
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete login audit events older than the retention period. Rows are '
+        'removed oldest first in chunks along the created_at index, so each '
+        'transaction stays short.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.AUDIT_LOG_RETENTION_DAYS,
+                            help='keep this many days of events')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        deleted = 0
+        while True:
+            ids = list(
+                LoginEvent.objects.filter(created_at__lt=cutoff)
+                .order_by('created_at', 'id')
+                .values_list('id', flat=True)[:options['chunk_size']]
+            )
+            if not ids:
+                break
+            deleted += LoginEvent.objects.filter(id__in=ids).delete()[0]
+        if options['verbosity']:
+            self.stdout.write(f'Deleted {deleted} login events older than {cutoff:%Y-%m-%d %H:%M}')
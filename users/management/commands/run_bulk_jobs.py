@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from users.bulk import claim_stale_jobs, run_bulk_job
+from users.models import BulkJob
+
+
+class Command(BaseCommand):
+    help = (
+        'Resume admin bulk actions whose worker stopped before they finished '
+        '(no progress for --stale-seconds), from the first chunk not done, '
+        'and delete finished jobs older than BULK_ACTION_JOB_TTL seconds. '
+        'Meant to run from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-seconds', type=int, default=settings.BULK_ACTION_STALE_SECONDS,
+                            help='resume running jobs without progress for this long')
+
+    def handle(self, *args, **options):
+        if options['stale_seconds'] < 1:
+            raise CommandError('--stale-seconds must be positive')
+        now = timezone.now()
+        expired = BulkJob.objects.filter(finished_at__lt=now - timedelta(seconds=settings.BULK_ACTION_JOB_TTL))
+        deleted = expired.delete()[0]
+
+        for job in claim_stale_jobs(options['stale_seconds'], now):
+            if options['verbosity']:
+                self.stdout.write(f'Resuming {job.action} job {job.pk} at {job.done}/{job.total} users')
+            run_bulk_job(job)
+        if options['verbosity']:
+            self.stdout.write(f'Deleted {deleted} finished jobs')
@@ -0,0 +1,239 @@
+import random
+import re
+import time
+from datetime import timedelta
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.functions import Length
+from django.utils import timezone
+
+from users.models import CustomUser
+
+FIRST_NAMES = [
+    'Aarav', 'Aditi', 'Akash', 'Ananya', 'Arjun', 'Diya', 'Farhan', 'Gauri',
+    'Ishaan', 'Kavya', 'Kabir', 'Meera', 'Neha', 'Nikhil', 'Pooja', 'Rahul',
+    'Riya', 'Rohan', 'Saanvi', 'Sahil', 'Sneha', 'Tanvi', 'Varun', 'Zoya',
+]
+
+LAST_NAMES = [
+    'Agarwal', 'Banerjee', 'Biswas', 'Chatterjee', 'Das', 'Gupta', 'Iyer',
+    'Joshi', 'Kapoor', 'Khan', 'Kulkarni', 'Menon', 'Mehta', 'Nair', 'Patel',
+    'Rao', 'Reddy', 'Sharma', 'Singh', 'Verma',
+]
+
+# (city, state, first three digits of the pincode)
+LOCATIONS = [
+    ('New Delhi', 'Delhi', '110'),
+    ('Mumbai', 'Maharashtra', '400'),
+    ('Pune', 'Maharashtra', '411'),
+    ('Bengaluru', 'Karnataka', '560'),
+    ('Chennai', 'Tamil Nadu', '600'),
+    ('Hyderabad', 'Telangana', '500'),
+    ('Kolkata', 'West Bengal', '700'),
+    ('Ahmedabad', 'Gujarat', '380'),
+    ('Jaipur', 'Rajasthan', '302'),
+    ('Lucknow', 'Uttar Pradesh', '226'),
+    ('Kochi', 'Kerala', '682'),
+    ('Bhopal', 'Madhya Pradesh', '462'),
+]
+
+STREETS = ['MG Road', 'Station Road', 'Park Street', 'Nehru Nagar', 'Gandhi Marg', 'Lake View']
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate fake users quickly for tests and benchmarks. Every user '
+        'shares one precomputed password hash and rows are inserted in large '
+        'batches inside a single transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help='Number of users to create')
+        parser.add_argument('--prefix', default='seed_user_',
+                            help='Username prefix, followed by a running number')
+        parser.add_argument('--start', type=int,
+                            help='First running number (default: one past the highest existing one)')
+        parser.add_argument('--email-domain', default='example.com')
+        parser.add_argument('--password', default='SeedPass!2024',
+                            help='Password shared by all generated users')
+        parser.add_argument('--doctor-ratio', type=float, default=0.2,
+                            help='Fraction of users created as doctors')
+        parser.add_argument('--joined-days', type=int, default=730,
+                            help='Spread created_at/date_joined over this many past days, in running order')
+        parser.add_argument('--last-login-days', type=int, default=365,
+                            help='Spread last_login over this many past days (0 leaves it empty)')
+        parser.add_argument('--with-pictures', action='store_true',
+                            help='Give users one of a few generated profile pictures')
+        parser.add_argument('--batch-size', type=int, default=20000,
+                            help='Rows inserted per executemany call')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        if count < 0:
+            raise CommandError('count must not be negative')
+        if not 0 <= options['doctor_ratio'] <= 1:
+            raise CommandError('--doctor-ratio must be between 0 and 1')
+
+        prefix = options['prefix']
+        start = options['start']
+        if start is None:
+            start = self.next_number(prefix)
+
+        rng = random.Random(options['seed'])
+        encoded = make_password(options['password'])
+        pictures = self.make_pictures() if options['with_pictures'] else [None]
+        batch_size = max(1, options['batch_size'])
+
+        # Column values that are the same for every row are prepared once from
+        # a prototype instance; only the varying columns are built per row.
+        fields = [f for f in CustomUser._meta.concrete_fields if not f.primary_key]
+        prototype = CustomUser(password=encoded, email_verified=True)
+        defaults = [
+            f.get_db_prep_save(f.pre_save(prototype, add=True), connection)
+            for f in fields
+        ]
+        positions = {f.attname: index for index, f in enumerate(fields)}
+        last_logins = self.last_login_pool(rng, options['last_login_days'])
+        joined = self.joined_pool(rng, options['joined_days'])
+
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            connection.ops.quote_name(CustomUser._meta.db_table),
+            ', '.join(connection.ops.quote_name(f.column) for f in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+
+        began = time.perf_counter()
+        created = 0
+        build_row = self.row_builder(prefix, start, count, defaults, positions, rng, options, pictures,
+                                     last_logins, joined)
+        with transaction.atomic(), connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # A large page cache keeps the username/email indexes in memory
+                cursor.execute('PRAGMA cache_size = -262144')
+            for batch_start in range(start, start + count, batch_size):
+                rows = [build_row(i) for i in range(batch_start, min(batch_start + batch_size, start + count))]
+                cursor.executemany(sql, rows)
+                created += len(rows)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'  {created}/{count} users')
+        elapsed = time.perf_counter() - began
+
+        rate = created / elapsed if elapsed else 0
+        if options['verbosity']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Created {created} users in {elapsed:.2f}s ({rate:,.0f} rows/s)'
+            ))
+
+    def row_builder(self, prefix, start, count, defaults, positions, rng, options, pictures, last_logins, joined):
+        """
+        Return a function building the parameter list for user number i.
+        Everything it touches is bound to locals since it runs once per row.
+        """
+        rand = rng.random
+        domain = options['email_domain'].lower()
+        doctor_ratio = options['doctor_ratio']
+        username_at = positions['username']
+        email_at = positions['email']
+        first_at = positions['first_name']
+        last_at = positions['last_name']
+        type_at = positions['user_type']
+        phone_at = positions['phone_number']
+        street_at = positions['address_line1']
+        city_at = positions['city']
+        state_at = positions['state']
+        pincode_at = positions['pincode']
+        picture_at = positions['profile_picture']
+        login_at = positions['last_login']
+        created_at = positions['created_at']
+        joined_at = positions['date_joined']
+        joined_step = len(joined) / max(count, 1)
+        name_at = positions['display_name']
+        address_at = positions['display_address']
+        search_at = positions['search_name']
+        compose_full_name = CustomUser.compose_full_name
+        compose_address = CustomUser.compose_address
+        compose_search_name = CustomUser.compose_search_name
+
+        def pick(values):
+            return values[int(rand() * len(values))]
+
+        def build_row(i):
+            row = list(defaults)
+            username = f'{prefix}{i}'
+            city, state, pin_prefix = pick(LOCATIONS)
+            row[username_at] = username
+            row[email_at] = f'{username.lower()}@{domain}'
+            row[first_at] = first_name = pick(FIRST_NAMES)
+            row[last_at] = last_name = pick(LAST_NAMES)
+            row[type_at] = 'doctor' if rand() < doctor_ratio else 'patient'
+            row[phone_at] = f'+91{6000000000 + int(rand() * 3999999999)}'
+            row[street_at] = street = f'{1 + int(rand() * 998)} {pick(STREETS)}'
+            row[city_at] = city
+            row[state_at] = state
+            row[pincode_at] = pincode = f'{pin_prefix}{int(rand() * 1000):03d}'
+            row[name_at] = display_name = compose_full_name(first_name, last_name)
+            row[search_at] = compose_search_name(display_name)
+            row[address_at] = compose_address(street, city, state, pincode)
+            row[picture_at] = pick(pictures)
+            row[login_at] = pick(last_logins)
+            # Later running numbers joined later, like rows inserted over time
+            row[created_at] = row[joined_at] = joined[int((i - start) * joined_step)]
+            return row
+
+        return build_row
+
+    def next_number(self, prefix):
+        """One past the highest running number already used with prefix"""
+        # Without leading zeros, the longest then greatest suffix is the highest
+        last = (
+            CustomUser.objects.filter(username__regex=rf'^{re.escape(prefix)}[0-9]+$')
+            .order_by(Length('username').desc(), '-username')
+            .values_list('username', flat=True)
+            .first()
+        )
+        return int(last[len(prefix):]) + 1 if last else 0
+
+    def joined_pool(self, rng, days, size=1000):
+        """Prepared join times over the past `days` days, oldest first"""
+        field = CustomUser._meta.get_field('created_at')
+        now = timezone.now()
+        if not days:
+            return [field.get_db_prep_save(now, connection)]
+        moments = sorted(now - timedelta(seconds=rng.randrange(days * 86400)) for _ in range(size))
+        return [field.get_db_prep_save(moment, connection) for moment in moments]
+
+    def last_login_pool(self, rng, days):
+        """Prepared last_login values spread over the past `days` days, ~10% empty"""
+        if not days:
+            return [None]
+        field = CustomUser._meta.get_field('last_login')
+        now = timezone.now()
+        pool = [
+            field.get_db_prep_save(now - timedelta(seconds=rng.randrange(days * 86400)), connection)
+            for _ in range(900)
+        ]
+        return pool + [None] * 100
+
+    def make_pictures(self, count=8):
+        """Write a few small solid-colour images and return their storage names"""
+        from PIL import Image
+
+        folder = Path(settings.MEDIA_ROOT) / 'profile_pics' / 'seed'
+        folder.mkdir(parents=True, exist_ok=True)
+        names = []
+        for index in range(count):
+            name = f'profile_pics/seed/avatar_{index}.png'
+            path = Path(settings.MEDIA_ROOT) / name
+            if not path.exists():
+                buffer = BytesIO()
+                colour = ((index * 53) % 256, (index * 97) % 256, (index * 151) % 256)
+                Image.new('RGB', (64, 64), colour).save(buffer, format='PNG')
+                path.write_bytes(buffer.getvalue())
+            names.append(name)
+        return names
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:34
+
+import users.models
+from django.db import migrations, models
+
+
+def fill_display_fields(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    batch = []
+    for user in CustomUser.objects.only(
+        'first_name', 'last_name', 'address_line1', 'city', 'state', 'pincode'
+    ).iterator(chunk_size=2000):
+        user.display_name = f"{user.first_name} {user.last_name}".strip()
+        user.display_address = ', '.join(
+            filter(None, [user.address_line1, user.city, user.state, user.pincode])
+        )
+        batch.append(user)
+        if len(batch) >= 2000:
+            CustomUser.objects.bulk_update(batch, ['display_name', 'display_address'])
+            batch = []
+    if batch:
+        CustomUser.objects.bulk_update(batch, ['display_name', 'display_address'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', users.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='display_address',
+            field=models.CharField(blank=True, editable=False, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='display_name',
+            field=models.CharField(blank=True, editable=False, max_length=301),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['created_at'], name='users_created_at_idx'),
+        ),
+        migrations.RunPython(fill_display_fields, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_refresh_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event', models.CharField(choices=[('success', 'Success'), ('failure', 'Failure'), ('lockout', 'Lockout')], max_length=10)),
+                ('username', models.CharField(blank=True, max_length=254)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['created_at', 'id'], name='users_loginevent_time_idx'), models.Index(fields=['user_id', 'created_at'], name='users_loginevent_user_idx')],
+            },
+        ),
+    ]
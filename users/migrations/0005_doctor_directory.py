@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-19 00:53
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    CustomUser = apps.get_model('users', 'CustomUser')
+    batch = []
+    for user in CustomUser.objects.only('display_name').iterator(chunk_size=2000):
+        user.search_name = user.display_name.lower()
+        batch.append(user)
+        if len(batch) >= 2000:
+            CustomUser.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    if batch:
+        CustomUser.objects.bulk_update(batch, ['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_login_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='search_name',
+            field=models.CharField(blank=True, editable=False, max_length=301),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('user_type', 'doctor')), fields=['search_name', 'id'], name='users_doctor_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('user_type', 'doctor')), fields=['city', 'search_name', 'id'], name='users_doctor_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('user_type', 'doctor')), fields=['state', 'search_name', 'id'], name='users_doctor_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('user_type', 'doctor')), fields=['pincode', 'search_name', 'id'], name='users_doctor_pincode_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_bulk_jobs'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='loginevent',
+            index=models.Index(fields=['username', 'created_at', 'id'], name='users_loginevent_username_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loginevent',
+            index=models.Index(fields=['event', 'created_at', 'id'], name='users_loginevent_event_idx'),
+        ),
+    ]
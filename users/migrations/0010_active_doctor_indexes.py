@@ -0,0 +1,46 @@
+# Generated by Django 5.2.7 on 2026-10-19 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0009_login_event_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_doctor_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_doctor_city_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_doctor_state_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customuser',
+            name='users_doctor_pincode_idx',
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', True), ('user_type', 'doctor')), fields=['search_name', 'id'], name='users_doctor_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', True), ('user_type', 'doctor')), fields=['city', 'search_name', 'id'], name='users_doctor_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', True), ('user_type', 'doctor')), fields=['state', 'search_name', 'id'], name='users_doctor_state_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('is_active', True), ('user_type', 'doctor')), fields=['pincode', 'search_name', 'id'], name='users_doctor_pincode_idx'),
+        ),
+    ]
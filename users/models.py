@@ -1,18 +1,77 @@
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+
 from django.db import models
+from django.utils import timezone
 
 # Create your models here.
 
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import RegexValidator
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+class CustomUserQuerySet(models.QuerySet):
+    """
+    Narrow querysets for pages that only show a few columns
+    """
+    def for_listing(self):
+        """Columns needed by the admin changelist"""
+        return self.only(*CustomUser.LISTING_FIELDS)
+
+    def for_dashboard(self):
+        """Columns rendered on the dashboards, without password or the address block"""
+        return self.only(*CustomUser.DASHBOARD_FIELDS)
+
+
+class CustomUserManager(UserManager.from_queryset(CustomUserQuerySet)):
+    pass
+
+
 class CustomUser(AbstractUser):
  
     USER_TYPE_CHOICES = (
     ('patient', 'Patient'),
     ('doctor', 'Doctor'),
     )
+    ROLE_LABELS = dict(USER_TYPE_CHOICES)
+
+    # Fields the display_* columns are derived from
+    DISPLAY_SOURCE_FIELDS = (
+        'first_name', 'last_name', 'address_line1', 'city', 'state', 'pincode'
+    )
+
+    LISTING_FIELDS = (
+        'id', 'username', 'email', 'first_name', 'last_name', 'display_name',
+        'user_type', 'is_staff', 'created_at'
+    )
+
+    # Loaded for the user attached to every request. The password is needed
+    # to verify the session auth hash.
+    SESSION_FIELDS = (
+        'id', 'password', 'username', 'first_name', 'last_name', 'display_name',
+        'user_type', 'is_active', 'is_staff', 'is_superuser', 'email_verified'
+    )
+
+    DASHBOARD_FIELDS = (
+        'id', 'username', 'email', 'first_name', 'last_name', 'display_name',
+        'display_address', 'user_type', 'profile_picture', 'phone_number',
+        'date_joined', 'last_login', 'email_verified'
+    )
+
+    # Columns shown in the doctor directory
+    DIRECTORY_FIELDS = (
+        'id', 'display_name', 'search_name', 'city', 'state', 'pincode',
+        'phone_number', 'profile_picture'
+    )
  # Override email to make it required and unique
     email = models.EmailField(unique=True, blank=False)
 
+    # Set by the link in the verification email, see users.verification
+    email_verified = models.BooleanField(default=False)
+
     user_type = models.CharField(
         max_length=10, 
         choices=USER_TYPE_CHOICES,
@@ -47,30 +106,291 @@ class CustomUser(AbstractUser):
     state = models.CharField(max_length=100, blank=True)
     pincode = models.CharField(max_length=10, blank=True)
     
+    # Precomputed on save from the name and address fields
+    display_name = models.CharField(max_length=301, blank=True, editable=False)
+    display_address = models.CharField(max_length=500, blank=True, editable=False)
+    # Lowercased display_name, for prefix searches as an indexed range query
+    search_name = models.CharField(max_length=301, blank=True, editable=False)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    objects = CustomUserManager()
     
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='users_created_at_idx'),
+            # Active doctor directory: one partial index per filter, each ending in
+            # the (search_name, id) sort and pagination key
+            models.Index(fields=['search_name', 'id'], name='users_doctor_name_idx',
+                         condition=models.Q(user_type='doctor', is_active=True)),
+            models.Index(fields=['city', 'search_name', 'id'], name='users_doctor_city_idx',
+                         condition=models.Q(user_type='doctor', is_active=True)),
+            models.Index(fields=['state', 'search_name', 'id'], name='users_doctor_state_idx',
+                         condition=models.Q(user_type='doctor', is_active=True)),
+            models.Index(fields=['pincode', 'search_name', 'id'], name='users_doctor_pincode_idx',
+                         condition=models.Q(user_type='doctor', is_active=True)),
+        ]
     
     def __str__(self):
-        return f"{self.username} ({self.get_user_type_display()})"
+        return f"{self.username} ({self.role_label})"
+
+    @staticmethod
+    def compose_full_name(first_name, last_name):
+        return f"{first_name} {last_name}".strip()
+
+    @staticmethod
+    def compose_search_name(display_name):
+        return display_name.lower()
+
+    @staticmethod
+    def compose_address(address_line1, city, state, pincode):
+        return ', '.join(filter(None, [address_line1, city, state, pincode]))
+
+    def refresh_display_fields(self):
+        """Recompute display_name, search_name and display_address from their source fields"""
+        self.display_name = self.compose_full_name(self.first_name, self.last_name)
+        self.search_name = self.compose_search_name(self.display_name)
+        self.display_address = self.compose_address(
+            self.address_line1, self.city, self.state, self.pincode
+        )
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        """
+        On instances flagged with load_deferred_together, reading one deferred
+        field loads every deferred field in a single query.
+        """
+        if fields is not None and getattr(self, 'load_deferred_together', False):
+            deferred = self.get_deferred_fields()
+            if set(fields) <= deferred:
+                fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.refresh_display_fields()
+        elif set(update_fields) & set(self.DISPLAY_SOURCE_FIELDS):
+            self.refresh_display_fields()
+            kwargs['update_fields'] = set(update_fields) | {'display_name', 'search_name', 'display_address'}
+        super().save(*args, **kwargs)
     
     def get_full_name(self):
-        """Returns the first_name plus the last_name, with a space in between."""
-        full_name = f"{self.first_name} {self.last_name}".strip()
+        """
+        Returns the first_name plus the last_name, with a space in between.
+        Rows read from the database use the value stored on save as it is,
+        since the name columns are often deferred.
+        """
+        if self._state.adding:
+            full_name = self.compose_full_name(self.first_name, self.last_name)
+        else:
+            full_name = self.display_name
         return full_name or self.username
+
+    @property
+    def role_label(self):
+        return self.ROLE_LABELS.get(self.user_type, self.user_type)
     
     @property
     def full_address(self):
-        """Returns formatted complete address"""
-        address_parts = [
-            self.address_line1,
-            self.city,
-            self.state,
-            self.pincode
+        """Returns formatted complete address, as stored on save for saved rows"""
+        if self._state.adding:
+            return self.compose_address(self.address_line1, self.city, self.state, self.pincode)
+        return self.display_address
+
+class RefreshToken(models.Model):
+    """
+    Revocable refresh token for the JSON API. Only a SHA-256 digest of the
+    token is stored.
+    """
+    user = models.ForeignKey(
+        'users.CustomUser',
+        on_delete=models.CASCADE,
+        related_name='refresh_tokens'
+    )
+    token_hash = models.CharField(max_length=64, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Refresh token for {self.user_id}"
+
+
+class LoginEventQuerySet(models.QuerySet):
+    def page(self, cursor=None, limit=50):
+        """
+        One page of events, newest first, using keyset pagination on
+        (created_at, id). Returns the events and the cursor of the next page,
+        which is None on the last page.
+        """
+        queryset = self.order_by('-created_at', '-id')
+        if cursor:
+            created_at, pk = LoginEvent.decode_cursor(cursor)
+            queryset = queryset.filter(
+                models.Q(created_at__lt=created_at) |
+                models.Q(created_at=created_at, id__lt=pk)
+            )
+        events = list(queryset[:limit + 1])
+        next_cursor = None
+        if len(events) > limit:
+            events = events[:limit]
+            next_cursor = events[-1].cursor
+        return events, next_cursor
+
+
+class LoginEvent(models.Model):
+    """
+    Append-only record of a login attempt, written in batches by users.audit
+    """
+    SUCCESS = 'success'
+    FAILURE = 'failure'
+    LOCKOUT = 'lockout'
+    EVENT_CHOICES = (
+        (SUCCESS, 'Success'),
+        (FAILURE, 'Failure'),
+        (LOCKOUT, 'Lockout'),
+    )
+
+    event = models.CharField(max_length=10, choices=EVENT_CHOICES)
+    # The username as typed, and the user it resolved to if any. user_id is
+    # not a foreign key so the log outlives deleted users.
+    username = models.CharField(max_length=254, blank=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    ip_address = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = LoginEventQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='users_loginevent_time_idx'),
+            models.Index(fields=['user_id', 'created_at'], name='users_loginevent_user_idx'),
+            # The admin's username and event filters, paged by (created_at, id)
+            models.Index(fields=['username', 'created_at', 'id'], name='users_loginevent_username_idx'),
+            models.Index(fields=['event', 'created_at', 'id'], name='users_loginevent_event_idx'),
         ]
-        return ', '.join(filter(None, address_parts))
\ No newline at end of file
+
+    def __str__(self):
+        return f"{self.get_event_display()} for {self.username} at {self.created_at:%Y-%m-%d %H:%M:%S}"
+
+    @property
+    def cursor(self):
+        delta = self.created_at - EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+        return f"{micros}.{self.pk}"
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            micros, pk = cursor.split('.')
+            return EPOCH + timedelta(microseconds=int(micros)), int(pk)
+        except ValueError:
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+class ArchivedUser(models.Model):
+    """
+    A dormant user moved out of users_customuser by archive_inactive_users.
+    The username and email stay reserved through their unique indexes; the
+    rest of the row is kept in data and put back by users.archive when the
+    user logs in again.
+    """
+    # The user's original id, reused on restore
+    id = models.BigIntegerField(primary_key=True)
+    username = models.CharField(max_length=150, unique=True)
+    email = models.EmailField(unique=True)
+    data = models.JSONField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-archived_at']
+        verbose_name = 'Archived user'
+        verbose_name_plural = 'Archived users'
+
+    def __str__(self):
+        return f"{self.username} (archived {self.archived_at:%Y-%m-%d})"
+
+
+class EmailOutbox(models.Model):
+    """
+    An email waiting to be sent. Rows are written in the same transaction as
+    the change that calls for them and sent in batches by users.outbox.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),
+    )
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True,
+                             related_name='outbox_emails')
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Not tried again before this time: retry backoff, or a dispatcher's claim
+    send_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Outbox email'
+        verbose_name_plural = 'Outbox emails'
+        indexes = [
+            models.Index(fields=['send_after', 'id'], name='users_outbox_pending_idx',
+                         condition=models.Q(status='pending')),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {self.to_email} ({self.get_status_display()})"
+
+
+class BulkJob(models.Model):
+    """
+    An admin bulk action run in the background by users.bulk. Progress lives
+    here rather than in a per-process cache so any worker can show it, and a
+    job whose worker went away can be resumed by `manage.py run_bulk_jobs`.
+    """
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATE_CHOICES = (
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    action = models.CharField(max_length=30)
+    # The selected user ids, in processing order; the first `done` are done
+    pks = models.JSONField()
+    total = models.PositiveIntegerField()
+    done = models.PositiveIntegerField(default=0)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default=RUNNING)
+    error = models.TextField(blank=True)
+    # Not a foreign key, so jobs do not get in the way of deleting users
+    actor_id = models.BigIntegerField(null=True, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    # Touched after every chunk, a running job not touched for a while has
+    # lost its worker
+    updated_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"{self.action}: {self.done}/{self.total} ({self.get_state_display()})"
@@ -0,0 +1,133 @@
+"""
+Transactional email outbox.
+
+queue_email() writes an EmailOutbox row inside the caller's transaction, so
+an email exists if and only if the change that called for it was committed,
+and the request never waits for SMTP. dispatch_outbox() sends what is due:
+
+- due rows are claimed in batches of EMAIL_OUTBOX_BATCH_SIZE by pushing their
+  send_after forward, so concurrent dispatchers (one per web worker, or the
+  dispatch_outbox command) do not send the same email twice;
+- each batch goes over a single backend connection, opened once;
+- an email that fails is retried after EMAIL_OUTBOX_RETRY_DELAY seconds,
+  doubling on every attempt up to EMAIL_OUTBOX_MAX_RETRY_DELAY, and marked
+  failed after EMAIL_OUTBOX_MAX_ATTEMPTS attempts.
+
+With EMAIL_OUTBOX_DISPATCH_INTERVAL above 0 every process runs a dispatcher
+thread, started by its first request (so it also sends rows and retries left
+by a process that went away, and never runs in a preloading parent before a
+fork) and woken when a queued email is committed. It sends nothing at exit,
+so a worker shutting down never waits on SMTP: due rows are left for the
+next tick of another process. With 0, run `manage.py dispatch_outbox --loop`
+instead.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .background import PeriodicFlusher
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+def queue_email(to_email, subject, body, user=None):
+    """Add an email to the outbox, sent once the current transaction commits"""
+    return queue_emails([EmailOutbox(to_email=to_email, subject=subject, body=body, user=user)])[0]
+
+
+def queue_emails(emails):
+    """queue_email() for a list of unsaved EmailOutbox rows, in one INSERT"""
+    emails = EmailOutbox.objects.bulk_create(emails)
+    if emails and settings.EMAIL_OUTBOX_DISPATCH_INTERVAL > 0:
+        dispatcher.start()
+        transaction.on_commit(dispatcher.wake)
+    return emails
+
+
+def start_dispatcher(sender, **kwargs):
+    """request_started receiver, a no-op once this process's thread runs"""
+    if settings.EMAIL_OUTBOX_DISPATCH_INTERVAL > 0:
+        dispatcher.start()
+
+
+def retry_delay(attempts):
+    """Seconds to wait after the attempts-th failed attempt"""
+    return min(settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1), settings.EMAIL_OUTBOX_MAX_RETRY_DELAY)
+
+
+def claim_batch(now):
+    """Due emails, claimed for EMAIL_OUTBOX_CLAIM_SECONDS"""
+    pending = EmailOutbox.objects.filter(status=EmailOutbox.PENDING, send_after__lte=now)
+    ids = list(pending.order_by('send_after', 'id').values_list('id', flat=True)[:settings.EMAIL_OUTBOX_BATCH_SIZE])
+    if not ids:
+        return []
+    claimed_until = now + timedelta(seconds=settings.EMAIL_OUTBOX_CLAIM_SECONDS)
+    pending.filter(pk__in=ids).update(send_after=claimed_until)
+    # Rows another dispatcher claimed first did not match the update
+    return list(EmailOutbox.objects.filter(
+        pk__in=ids, status=EmailOutbox.PENDING, send_after=claimed_until
+    ).order_by('id'))
+
+
+def record_failure(email, error, now):
+    attempts = email.attempts + 1
+    if attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        status, send_after = EmailOutbox.FAILED, now
+        logger.error('Giving up on email %s to %s after %d attempts: %s', email.pk, email.to_email, attempts, error)
+    else:
+        status, send_after = EmailOutbox.PENDING, now + timedelta(seconds=retry_delay(attempts))
+        logger.warning('Email %s to %s failed (attempt %d), retrying: %s', email.pk, email.to_email, attempts, error)
+    EmailOutbox.objects.filter(pk=email.pk).update(
+        status=status, attempts=attempts, send_after=send_after, last_error=str(error)[:1000]
+    )
+
+
+def send_batch(emails):
+    """Send emails over one connection, returns how many were sent"""
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        now = timezone.now()
+        for email in emails:
+            record_failure(email, exc, now)
+        return 0
+
+    sent = []
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, to=[email.to_email], connection=connection)
+            try:
+                message.send()
+            except Exception as exc:
+                record_failure(email, exc, timezone.now())
+            else:
+                sent.append(email.pk)
+    finally:
+        connection.close()
+    EmailOutbox.objects.filter(pk__in=sent).update(status=EmailOutbox.SENT, sent_at=timezone.now(), last_error='')
+    return len(sent)
+
+
+def dispatch_outbox():
+    """Send every email that is due, batch by batch. Returns the number sent."""
+    sent = 0
+    while True:
+        batch = claim_batch(timezone.now())
+        if not batch:
+            return sent
+        sent += send_batch(batch)
+        if len(batch) < settings.EMAIL_OUTBOX_BATCH_SIZE:
+            return sent
+
+
+dispatcher = PeriodicFlusher(
+    'email-outbox-dispatcher', dispatch_outbox, lambda: settings.EMAIL_OUTBOX_DISPATCH_INTERVAL,
+    flush_at_exit=False,
+)
@@ -0,0 +1,53 @@
+"""
+Password reset links.
+
+A link carries the user id and a default_token_generator token, which is
+derived from the password hash and last login, so it stops working once the
+password is changed or the user logs in, and after PASSWORD_RESET_TIMEOUT.
+The emails go through the outbox like the verification emails.
+"""
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+
+from .models import CustomUser, EmailOutbox
+
+RESET_SUBJECT = 'Reset your password'
+
+# Everything the token and the email need
+RESET_FIELDS = ('password', 'last_login', 'email', 'username', 'first_name', 'last_name')
+
+
+def reset_url(user, request=None):
+    """Absolute reset link, on SITE_URL when there is no request (bulk actions)"""
+    path = reverse('users:password_reset_confirm', args=[
+        urlsafe_base64_encode(force_bytes(user.pk)), default_token_generator.make_token(user),
+    ])
+    if request is not None:
+        return request.build_absolute_uri(path)
+    return settings.SITE_URL.rstrip('/') + path
+
+
+def reset_email(user, request=None, forced=False):
+    """Unsaved outbox row with a reset link for user, for queue_emails()"""
+    body = render_to_string('users/emails/password_reset.txt', {
+        'user': user,
+        'url': reset_url(user, request),
+        'forced': forced,
+        'days': settings.PASSWORD_RESET_TIMEOUT // 86400,
+    })
+    return EmailOutbox(user=user, to_email=user.email, subject=RESET_SUBJECT, body=body)
+
+
+def user_from_link(uidb64, token):
+    """The active user a reset link was made for, None if it is invalid or used"""
+    try:
+        pk = int(urlsafe_base64_decode(uidb64).decode())
+        user = CustomUser.objects.get(pk=pk, is_active=True)
+    except (ValueError, OverflowError, UnicodeDecodeError, CustomUser.DoesNotExist):
+        return None
+    return user if default_token_generator.check_token(user, token) else None
@@ -0,0 +1,220 @@
+"""
+Pincode and city lookups from a prebuilt, memory-mapped index.
+
+The index file is written by `manage.py build_postal_index` from a postal
+CSV. It is a header followed by flat arrays of native-endian uint32:
+
+    pincodes, entry_city, entry_state    one entry per (pincode, city, state),
+                                         sorted by pincode
+    place_key, place_city, place_state   one place per (city, state), sorted
+                                         by the case-folded city name
+    string_offsets, string blob          every name, stored once in UTF-8
+
+Nothing is parsed at load time: the file is mapped and the arrays are
+memoryviews over the mapping, so workers forked from a warmed-up parent share
+the same pages and a lookup is a couple of binary searches.
+"""
+
+import csv
+import logging
+import mmap
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PINIDX1' + (b'L' if sys.byteorder == 'little' else b'B')
+HEADER = struct.Struct('=8sIIII')
+PINCODE_DIGITS = 6
+
+# Column names accepted by the builder, including the India Post directory's
+CSV_COLUMNS = {
+    'pincode': ('pincode', 'pin', 'postcode'),
+    'city': ('city', 'district', 'districtname'),
+    'state': ('state', 'statename'),
+}
+
+
+def fold(name):
+    return name.casefold()
+
+
+def clean_name(value):
+    """Strip and, for ALL CAPS sources, title-case a place name"""
+    value = ' '.join(value.split())
+    return value.title() if value.isupper() else value
+
+
+def read_postal_csv(path):
+    """Yield (pincode, city, state) from a postal CSV, skipping unusable rows"""
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        reader = csv.DictReader(source)
+        fields = {name.strip().lower(): name for name in reader.fieldnames or []}
+        columns = {}
+        for key, aliases in CSV_COLUMNS.items():
+            for alias in aliases:
+                if alias in fields:
+                    columns[key] = fields[alias]
+                    break
+            else:
+                raise ValueError(f'{path} has no {key} column (expected one of {", ".join(aliases)})')
+        for row in reader:
+            pincode = (row[columns['pincode']] or '').strip()
+            city = clean_name(row[columns['city']] or '')
+            state = clean_name(row[columns['state']] or '')
+            if len(pincode) == PINCODE_DIGITS and pincode.isdigit() and city and state:
+                yield pincode, city, state
+
+
+def build_index(rows):
+    """Serialize (pincode, city, state) rows into the index format"""
+    entries = sorted(set(rows))
+    places = sorted({(city, state) for _, city, state in entries}, key=lambda p: (fold(p[0]), p[1]))
+
+    strings = {}
+
+    def string_id(value):
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    pincodes = array('I', (int(pincode) for pincode, _, _ in entries))
+    entry_city = array('I', (string_id(city) for _, city, _ in entries))
+    entry_state = array('I', (string_id(state) for _, _, state in entries))
+    place_key = array('I', (string_id(fold(city)) for city, _ in places))
+    place_city = array('I', (string_id(city) for city, _ in places))
+    place_state = array('I', (string_id(state) for _, state in places))
+
+    encoded = [value.encode('utf-8') for value in strings]
+    offsets = array('I', [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    blob = b''.join(encoded)
+
+    return b''.join([
+        HEADER.pack(MAGIC, len(entries), len(places), len(strings), len(blob)),
+        pincodes.tobytes(), entry_city.tobytes(), entry_state.tobytes(),
+        place_key.tobytes(), place_city.tobytes(), place_state.tobytes(),
+        offsets.tobytes(), blob,
+    ])
+
+
+class PostalIndex:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        view = memoryview(buffer)
+        magic, entries, places, strings, blob_length = HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError('Not a postal index for this platform, rebuild it with build_postal_index')
+
+        position = HEADER.size
+
+        def take(count):
+            nonlocal position
+            part = view[position:position + count * 4].cast('I')
+            position += count * 4
+            return part
+
+        self.pincodes = take(entries)
+        self.entry_city = take(entries)
+        self.entry_state = take(entries)
+        self.place_key = take(places)
+        self.place_city = take(places)
+        self.place_state = take(places)
+        self.string_offsets = take(strings + 1)
+        self.blob = view[position:position + blob_length]
+        self._states = None
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as index_file:
+            return cls(mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return len(self.pincodes)
+
+    def string(self, string_id):
+        offsets = self.string_offsets
+        return str(self.blob[offsets[string_id]:offsets[string_id + 1]], 'utf-8')
+
+    def entry(self, index):
+        return {
+            'pincode': f'{self.pincodes[index]:0{PINCODE_DIGITS}d}',
+            'city': self.string(self.entry_city[index]),
+            'state': self.string(self.entry_state[index]),
+        }
+
+    def by_pincode_prefix(self, prefix, limit=10):
+        """Entries whose pincode starts with the digits in prefix"""
+        if not prefix.isdigit() or len(prefix) > PINCODE_DIGITS:
+            return []
+        scale = 10 ** (PINCODE_DIGITS - len(prefix))
+        start = bisect_left(self.pincodes, int(prefix) * scale)
+        end = min(start + limit, bisect_left(self.pincodes, (int(prefix) + 1) * scale, lo=start))
+        return [self.entry(index) for index in range(start, end)]
+
+    def by_city_prefix(self, prefix, limit=10):
+        """(city, state) places whose city name starts with prefix, in any case"""
+        prefix = fold(prefix.strip())
+        if not prefix:
+            return []
+        low, high = 0, len(self.place_key)
+        while low < high:
+            middle = (low + high) // 2
+            if self.string(self.place_key[middle]) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        places = []
+        for index in range(low, min(low + limit, len(self.place_key))):
+            if not self.string(self.place_key[index]).startswith(prefix):
+                break
+            places.append({
+                'city': self.string(self.place_city[index]),
+                'state': self.string(self.place_state[index]),
+            })
+        return places
+
+    def canonical_state(self, name):
+        """The state's spelling in the index, matched in any case (None if unknown)"""
+        if self._states is None:
+            self._states = {fold(state): state for state in map(self.string, set(self.place_state))}
+        return self._states.get(fold(name.strip()))
+
+    def lookup(self, query, limit=10):
+        query = query.strip()
+        if query.isdigit():
+            return self.by_pincode_prefix(query, limit)
+        return self.by_city_prefix(query, limit)
+
+
+EMPTY_INDEX = PostalIndex(build_index([]))
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_postal_index():
+    """The index at POSTAL_INDEX_PATH, mapped on first use (empty if it is missing)"""
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                try:
+                    _index = PostalIndex.open(settings.POSTAL_INDEX_PATH)
+                except (OSError, ValueError) as exc:
+                    logger.warning('Postal index unavailable (%s), run manage.py build_postal_index', exc)
+                    _index = EMPTY_INDEX
+    return _index
+
+
+def reset_postal_index():
+    """Forget the mapped index, e.g. after rebuilding the file"""
+    global _index
+    with _lock:
+        _index = None
@@ -0,0 +1,7 @@
+from django.dispatch import Signal
+
+# Sent once per batch by users.bulk with sender=CustomUser and the keyword
+# arguments action, pks (the ids changed in this batch), changes (a dict of
+# the field values written, empty for deletes) and actor (the acting user or
+# None).
+users_bulk_changed = Signal()
@@ -1,3 +1,876 @@
-from django.test import TestCase
+import gzip
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.utils import timezone
+
+from auth_project.compression import CompressionMiddleware, body_cache
+from auth_project.db_routers import PrimaryReplicaRouter, _replica_down_until, fall_back_to_primary, reset_pinning
+from auth_project.profiling import sampler
 
 # Create your tests here.
+from .audit import AuditLog, audit_log
+from .background import PeriodicFlusher
+from .backends import SlimUserBackend
+from .bulk import run_bulk_job
+from .directory import search_doctors
+from .forms import SignUpForm
+from .hashing import HashingOverloaded, make_password, pool
+from .last_login import last_login_buffer
+from .models import ArchivedUser, BulkJob, CustomUser, EmailOutbox, LoginEvent, RefreshToken
+from .outbox import dispatch_outbox, dispatcher, queue_email
+from .password_reset import RESET_SUBJECT
+from .postal import reset_postal_index
+from .signals import users_bulk_changed
+from .tokens import InvalidToken, issue_refresh_token, rotate_refresh_token
+from .verification import InvalidVerificationToken, make_verification_token, verify_email
+from .warmup import STEPS, warm_up
+
+# Logins write last_login and audit events straight away in tests;
+# LastLoginBufferTests and AuditLogTests cover the buffered paths. Outbox
+# emails wait for dispatch_outbox() instead of a dispatcher thread.
+synchronous_writes = override_settings(
+    LAST_LOGIN_FLUSH_INTERVAL=0, AUDIT_LOG_FLUSH_INTERVAL=0, EMAIL_OUTBOX_DISPATCH_INTERVAL=0
+)
+
+
+def setUpModule():
+    synchronous_writes.enable()
+
+
+def tearDownModule():
+    synchronous_writes.disable()
+
+
+class DisplayFieldsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='asha', email='asha@example.com', password='x',
+            first_name='Asha', last_name='Rao', user_type='doctor',
+            address_line1='12 MG Road', city='Pune', state='Maharashtra', pincode='411001',
+        )
+
+    def test_display_fields_are_stored_on_save(self):
+        user = CustomUser.objects.only('id', 'username', 'display_name', 'display_address').get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.get_full_name(), 'Asha Rao')
+            self.assertEqual(user.full_address, '12 MG Road, Pune, Maharashtra, 411001')
+
+    def test_empty_display_fields_do_not_load_deferred_columns(self):
+        admin = CustomUser.objects.create_superuser(username='root', email='root@example.com', password='x')
+        user = CustomUser.objects.for_dashboard().get(pk=admin.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(user.get_full_name(), 'root')
+            self.assertEqual(user.full_address, '')
+
+    def test_update_fields_refreshes_display_fields(self):
+        self.user.last_name = 'Iyer'
+        self.user.save(update_fields=['last_name'])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.display_name, 'Asha Iyer')
+
+    def test_str_uses_role_label(self):
+        self.assertEqual(str(self.user), 'asha (Doctor)')
+
+
+class SlimUserBackendTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='ravi', email='ravi@example.com', password='x',
+            first_name='Ravi', last_name='Das', city='Kochi', state='Kerala',
+        )
+
+    def test_get_user_defers_address_and_loads_rest_in_one_query(self):
+        user = SlimUserBackend().get_user(self.user.pk)
+        self.assertIn('city', user.get_deferred_fields())
+        with self.assertNumQueries(0):
+            self.assertEqual(user.get_full_name(), 'Ravi Das')
+        with self.assertNumQueries(1):
+            self.assertEqual(user.city, 'Kochi')
+            self.assertEqual(user.state, 'Kerala')
+            self.assertEqual(user.email, 'ravi@example.com')
+
+    def test_dashboard_renders_for_slim_user(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/users/dashboard/patient/')
+        self.assertContains(response, 'Kochi, Kerala')
+
+
+class SignupViewTests(TestCase):
+    def test_cached_signup_page_carries_a_working_csrf_token(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.get('/users/signup/')
+        self.assertNotContains(response, '__signup_csrf_token__')
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        response = client.post('/users/signup/', {'csrfmiddlewaretoken': token})
+        self.assertEqual(response.status_code, 200)
+
+    def test_form_errors_are_reported_in_one_message(self):
+        response = self.client.post('/users/signup/', {})
+        self.assertEqual(len(list(response.context['messages'])), 1)
+
+
+class TokenApiTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='meera', email='meera@example.com', password='S3cret!pass',
+            first_name='Meera', last_name='Nair', user_type='doctor',
+        )
+
+    def obtain(self, username='meera'):
+        return self.client.post(
+            '/users/api/token/', {'username': username, 'password': 'S3cret!pass'},
+            content_type='application/json',
+        )
+
+    def test_access_token_is_verified_without_queries(self):
+        access = self.obtain(username='meera@example.com').json()['access']
+        with self.assertNumQueries(0):
+            response = self.client.get('/users/api/dashboard/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.json()['full_name'], 'Meera Nair')
+        self.assertEqual(response.json()['dashboard'], 'doctor')
+
+    def test_invalid_credentials_and_tokens_are_rejected(self):
+        response = self.client.post('/users/api/token/', {'username': 'meera', 'password': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/users/api/profile/', HTTP_AUTHORIZATION='Bearer forged')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.client.get('/users/api/profile/').status_code, 401)
+
+    def test_refresh_rotates_and_reuse_revokes_all(self):
+        refresh = self.obtain().json()['refresh']
+        response = self.client.post('/users/api/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200)
+        new_refresh = response.json()['refresh']
+
+        # Replaying the used token revokes the whole family
+        response = self.client.post('/users/api/token/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.post('/users/api/token/refresh/', {'refresh': new_refresh})
+        self.assertEqual(response.status_code, 401)
+
+    def test_profile_of_deleted_user_is_rejected(self):
+        access = self.obtain().json()['access']
+        self.user.delete()
+        response = self.client.get('/users/api/profile/', HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()['error'], 'invalid_token')
+
+    def test_concurrent_refresh_counts_as_reuse(self):
+        refresh = self.obtain().json()['refresh']
+        # Read before a concurrent refresh of the same token claimed it
+        stale = RefreshToken.objects.select_related('user').get()
+        rotate_refresh_token(refresh)
+        with mock.patch.object(RefreshToken.objects, 'select_related') as select_related:
+            select_related.return_value.get.return_value = stale
+            with self.assertRaises(InvalidToken):
+                rotate_refresh_token(refresh)
+        self.assertFalse(RefreshToken.objects.filter(revoked_at__isnull=True).exists())
+
+    def test_profile_accepts_session_auth(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/users/api/profile/').json()['email'], 'meera@example.com')
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        reset_pinning()
+        _replica_down_until.clear()
+        self.addCleanup(reset_pinning)
+        self.addCleanup(_replica_down_until.clear)
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_replica_until_a_write(self):
+        with override_settings(DATABASE_REPLICAS=['replica']), \
+                mock.patch.object(self.router, 'replica_available', return_value=True), \
+                mock.patch('auth_project.db_routers.connections') as connections:
+            connections.__getitem__.return_value.in_atomic_block = False
+            self.assertEqual(self.router.db_for_read(CustomUser), 'replica')
+            self.assertEqual(self.router.db_for_write(CustomUser), 'default')
+            self.assertEqual(self.router.db_for_read(CustomUser), 'default')
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        with override_settings(DATABASE_REPLICAS=['missing']):
+            self.assertEqual(self.router.db_for_read(CustomUser), 'default')
+
+    def test_failing_replica_query_runs_on_primary(self):
+        CustomUser.objects.create_user(username='solo', email='solo@example.com')
+
+        def replica_execute(sql, params, many, context):
+            raise OperationalError('no such table: users_customuser')
+
+        with connection.cursor() as cursor, self.assertLogs('auth_project.db_routers', 'WARNING'):
+            fall_back_to_primary(
+                replica_execute, 'SELECT COUNT(*) FROM users_customuser', [], False,
+                {'connection': mock.Mock(alias='replica'), 'cursor': cursor},
+            )
+            self.assertEqual(cursor.fetchone(), (1,))
+        self.assertIn('replica', _replica_down_until)
+        with override_settings(DATABASE_REPLICAS=['replica']):
+            self.assertIsNone(self.router.pick_replica())
+
+    def test_background_threads_read_from_the_primary(self):
+        reads = []
+        flushed = threading.Event()
+
+        def flush():
+            if not flushed.is_set():
+                reads.append(self.router.db_for_read(CustomUser))
+                flushed.set()
+
+        flusher = PeriodicFlusher('test-flusher', flush, lambda: 3600 if flushed.is_set() else 0.01)
+        with override_settings(DATABASE_REPLICAS=['replica']), \
+                mock.patch.object(PrimaryReplicaRouter, 'replica_available', return_value=True):
+            flusher.start()
+            self.assertTrue(flushed.wait(5))
+        self.assertEqual(reads, ['default'])
+
+    def test_write_sets_pin_cookie_when_replicas_configured(self):
+        with override_settings(DATABASE_REPLICAS=['missing']):
+            response = self.client.post('/users/ajax/check-username/', {'username': 'nobody'})
+            self.assertNotIn('db_primary_pin', response.cookies)
+            self.client.force_login(CustomUser.objects.create_user(username='pin', email='pin@example.com'))
+            response = self.client.get('/users/logout/')
+            self.assertIn('db_primary_pin', response.cookies)
+
+
+@override_settings(LAST_LOGIN_FLUSH_INTERVAL=30)
+class LastLoginBufferTests(TestCase):
+    def setUp(self):
+        self.buffer = last_login_buffer
+        self.buffer.flush()
+        self.user = CustomUser.objects.create_user(username='kabir', email='kabir@example.com', password='x')
+
+    def test_login_is_buffered_then_flushed_without_touching_updated_at(self):
+        updated_at = self.user.updated_at
+        self.client.force_login(self.user)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(self.user.updated_at, updated_at)
+
+    def test_zero_interval_writes_immediately(self):
+        with override_settings(LAST_LOGIN_FLUSH_INTERVAL=0):
+            self.client.force_login(self.user)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(len(self.buffer), 0)
+
+
+@override_settings(AUDIT_LOG_FLUSH_INTERVAL=30)
+class AuditLogTests(TestCase):
+    def setUp(self):
+        self.audit_log = audit_log
+        # Flush by hand instead of from the background thread, and inside
+        # the test transaction so nothing leaks into the next test
+        patcher = mock.patch.object(audit_log.flusher, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(audit_log.flush)
+        self.user = CustomUser.objects.create_user(username='zoya', email='zoya@example.com', password='S3cure!pass')
+
+    def test_login_attempts_are_queued_then_written_in_batches(self):
+        self.client.post('/users/login/', {'username': 'zoya', 'password': 'wrong'},
+                         HTTP_USER_AGENT='pytest-agent')
+        self.client.post('/users/login/', {'username': 'zoya', 'password': 'S3cure!pass'})
+        self.assertFalse(LoginEvent.objects.exists())
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.audit_log.flush(), 2)
+        failure, success = LoginEvent.objects.order_by('created_at', 'id')
+        self.assertEqual((failure.event, failure.username, failure.user_id), (LoginEvent.FAILURE, 'zoya', None))
+        self.assertEqual(failure.user_agent, 'pytest-agent')
+        self.assertEqual(failure.ip_address, '127.0.0.1')
+        self.assertEqual((success.event, success.user_id), (LoginEvent.SUCCESS, self.user.pk))
+
+    def test_refused_login_of_inactive_user_is_a_lockout(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.client.post('/users/login/', {'username': 'zoya', 'password': 'wrong'})
+        response = self.client.post('/users/login/', {'username': 'zoya', 'password': 'S3cure!pass'})
+        self.assertEqual(response.status_code, 200)
+        self.audit_log.flush()
+        self.assertEqual(
+            list(LoginEvent.objects.order_by('id').values_list('event', 'user_id')),
+            [(LoginEvent.FAILURE, None), (LoginEvent.LOCKOUT, self.user.pk)],
+        )
+
+    def test_admin_filters_page_along_an_index(self):
+        for filters in ({'username': 'zoya'}, {'event': LoginEvent.LOCKOUT}, {'username': 'zoya', 'event': 'failure'}):
+            plan = LoginEvent.objects.filter(**filters).order_by('-created_at', '-id')[:101].explain()
+            self.assertIn('USING INDEX users_loginevent_', plan)
+            # Neither a full scan nor a sort of the matching rows
+            self.assertNotIn('SCAN', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    @override_settings(AUDIT_LOG_BUFFER_SIZE=1, AUDIT_LOG_ENQUEUE_TIMEOUT=0)
+    def test_full_buffer_drops_and_counts(self):
+        audit_log = AuditLog()
+        audit_log.flusher = mock.Mock()
+        self.assertTrue(audit_log.record(LoginEvent.FAILURE, username='a'))
+        with self.assertLogs('users.audit', 'WARNING'):
+            self.assertFalse(audit_log.record(LoginEvent.FAILURE, username='b'))
+        self.assertEqual(audit_log.dropped, 1)
+        self.assertEqual(audit_log.flush(), 1)
+
+    def test_keyset_pages(self):
+        LoginEvent.objects.bulk_create(
+            LoginEvent(event=LoginEvent.SUCCESS, username=f'user{i}') for i in range(5)
+        )
+        first, cursor = LoginEvent.objects.page(limit=3)
+        second, last_cursor = LoginEvent.objects.page(cursor, limit=3)
+        self.assertEqual(len(first), 3)
+        self.assertEqual(len(second), 2)
+        self.assertIsNone(last_cursor)
+        self.assertEqual(
+            [e.username for e in first + second],
+            [f'user{i}' for i in reversed(range(5))],
+        )
+
+        admin = CustomUser.objects.create_superuser(username='root', email='root@example.com', password='x')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/users/loginevent/', {'cursor': cursor})
+        self.assertContains(response, 'user1')
+        self.assertNotContains(response, 'user4')
+
+
+class WarmupTests(TestCase):
+    def test_warm_up_runs_every_step(self):
+        with self.assertNoLogs('users.warmup', 'ERROR'):
+            timings = warm_up(freeze=False)
+        self.assertEqual(list(timings), [name for name, _ in STEPS])
+
+
+class DoctorDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.patient = CustomUser.objects.create_user(username='meera', email='meera@example.com', password='x')
+        for index, (first, city) in enumerate([('Anil', 'Pune'), ('Anita', 'Pune'), ('Anand', 'Mumbai'), ('Bela', 'Pune')]):
+            CustomUser.objects.create_user(
+                username=f'doc{index}', email=f'doc{index}@example.com', password='x',
+                user_type='doctor', first_name=first, last_name='Rao', city=city,
+            )
+        self.client.force_login(self.patient)
+
+    def test_filters_prefix_and_keyset_pages(self):
+        rows, cursor = search_doctors(name='an', city='Pune', limit=1)
+        self.assertEqual([row['display_name'] for row in rows], ['Anil Rao'])
+        self.assertEqual(set(rows[0]), set(CustomUser.DIRECTORY_FIELDS) | {'picture_url'})
+        rows, cursor = search_doctors(name='an', city='Pune', cursor=cursor, limit=1)
+        self.assertEqual([row['display_name'] for row in rows], ['Anita Rao'])
+        self.assertIsNone(cursor)
+
+    def test_cached_pages_are_dropped_when_a_doctor_changes(self):
+        response = self.client.get('/users/doctors/', {'city': 'Pune'})
+        self.assertContains(response, 'Dr. Bela Rao')
+        # Session and request user only
+        with self.assertNumQueries(2):
+            self.client.get('/users/doctors/', {'city': 'Pune'})
+
+        CustomUser.objects.create_user(username='newpatient', email='np@example.com', password='x')
+        with self.assertNumQueries(2):
+            self.client.get('/users/doctors/', {'city': 'Pune'})
+
+        doctor = CustomUser.objects.get(username='doc3')
+        doctor.city = 'Mumbai'
+        doctor.save()
+        response = self.client.get('/users/doctors/', {'city': 'Pune'})
+        self.assertNotContains(response, 'Dr. Bela Rao')
+
+
+class PostalLookupTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'postal_index.bin'
+        call_command('build_postal_index', output=str(path), verbosity=0)
+        settings_override = override_settings(POSTAL_INDEX_PATH=path)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_postal_index()
+        self.addCleanup(reset_postal_index)
+
+    def test_pincode_and_city_prefixes(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/users/ajax/postal-lookup/', {'q': '41100'})
+        self.assertEqual(
+            [place['pincode'] for place in response.json()['results']],
+            ['411001', '411004', '411007'],
+        )
+        response = self.client.get('/users/ajax/postal-lookup/', {'q': 'new D'})
+        self.assertEqual(response.json()['results'], [{'city': 'New Delhi', 'state': 'Delhi'}])
+        response = self.client.get('/users/ajax/postal-lookup/', {'q': '4'})
+        self.assertEqual(response.json()['results'], [])
+
+    def test_signup_form_uses_canonical_spelling(self):
+        form = SignUpForm(data={
+            'user_type': 'patient', 'first_name': 'Ria', 'last_name': 'Das',
+            'username': 'riadas', 'email': 'ria@example.com',
+            'address_line1': '1 MG Road', 'city': ' pune', 'state': 'maharashtra',
+            'pincode': '411001', 'password1': 'Str0ng!Passw0rd#', 'password2': 'Str0ng!Passw0rd#',
+        })
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual((form.cleaned_data['city'], form.cleaned_data['state']), ('Pune', 'Maharashtra'))
+
+    def test_directory_finds_doctors_whatever_the_case_typed(self):
+        cache.clear()
+        CustomUser.objects.create_user(
+            username='drasha', email='drasha@example.com', password='x', user_type='doctor',
+            first_name='Asha', last_name='Rao', city='Pune', state='Maharashtra',
+        )
+        patient = CustomUser.objects.create_user(username='meera', email='meera@example.com', password='x')
+        self.client.force_login(patient)
+
+        response = self.client.get('/users/doctors/', {'city': ' pune', 'state': 'MAHARASHTRA'})
+        self.assertContains(response, 'Dr. Asha Rao')
+        response = self.client.get('/users/doctors/', {'state': 'maharashtra'})
+        self.assertContains(response, 'Dr. Asha Rao')
+
+
+class UsernameSuggestionTests(TestCase):
+    def test_taken_username_gets_free_alternatives_in_one_query(self):
+        CustomUser.objects.create_user(username='arjun', email='arjun@example.com', password='x')
+        CustomUser.objects.create_user(username='arjun.mehta', email='am@example.com', password='x')
+
+        with self.assertNumQueries(1):
+            response = self.client.post('/users/ajax/check-username/', {
+                'username': 'arjun', 'first_name': 'Arjun', 'last_name': 'Mehta',
+            })
+        data = response.json()
+        self.assertFalse(data['available'])
+        self.assertEqual(len(data['suggestions']), 3)
+        self.assertNotIn('arjun.mehta', data['suggestions'])
+        self.assertFalse(CustomUser.objects.filter(username__in=data['suggestions']).exists())
+
+    def test_free_username(self):
+        response = self.client.post('/users/ajax/check-username/', {'username': 'kavya'})
+        self.assertTrue(response.json()['available'])
+
+
+@override_settings(BULK_ACTION_BATCH_SIZE=2)
+class BulkAdminActionTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser(username='root', email='root@example.com', password='x')
+        self.users = [
+            CustomUser.objects.create_user(username=f'bulk{i}', email=f'bulk{i}@example.com', password='x')
+            for i in range(5)
+        ]
+        self.client.force_login(self.admin)
+
+    def post_action(self, action, users, **extra):
+        return self.client.post('/admin/users/customuser/', {
+            'action': action,
+            'index': 0,
+            '_selected_action': [user.pk for user in users],
+            **extra,
+        })
+
+    def test_deactivate_runs_in_batches_and_skips_the_acting_user(self):
+        batches = []
+
+        def receiver(sender, action, pks, changes, **kwargs):
+            batches.append((action, len(pks), changes))
+
+        users_bulk_changed.connect(receiver)
+        self.addCleanup(users_bulk_changed.disconnect, receiver)
+        self.post_action('deactivate_users', self.users + [self.admin])
+
+        self.assertEqual(batches, [
+            ('deactivate', 2, {'is_active': False}),
+            ('deactivate', 2, {'is_active': False}),
+            ('deactivate', 1, {'is_active': False}),
+        ])
+        self.assertFalse(CustomUser.objects.filter(username__startswith='bulk', is_active=True).exists())
+        self.admin.refresh_from_db()
+        self.assertTrue(self.admin.is_active)
+
+    def test_delete_asks_for_confirmation_then_cascades(self):
+        issue_refresh_token(self.users[0])
+        response = self.post_action('delete_users', self.users)
+        self.assertContains(response, 'Are you sure you want to delete 5 users?')
+        self.assertEqual(CustomUser.objects.filter(username__startswith='bulk').count(), 5)
+
+        self.post_action('delete_users', self.users, post='yes')
+        self.assertFalse(CustomUser.objects.filter(username__startswith='bulk').exists())
+        self.assertFalse(RefreshToken.objects.exists())
+
+    @override_settings(BULK_ACTION_BACKGROUND_THRESHOLD=3)
+    def test_large_selection_runs_as_a_job_any_worker_can_show(self):
+        # Run the job here instead of in a thread, inside the test transaction
+        with mock.patch('users.bulk.threading.Thread') as thread:
+            response = self.post_action('make_doctors', self.users)
+        job = BulkJob.objects.get()
+        self.assertRedirects(response, f'/admin/users/customuser/bulk-jobs/{job.pk}/')
+        self.assertEqual(thread.call_args.kwargs['args'], (job,))
+        self.assertContains(self.client.get(response.url), '0 of 5 users')
+
+        run_bulk_job(job)
+        self.assertContains(self.client.get(response.url), 'Done.')
+        self.assertEqual(CustomUser.objects.filter(user_type='doctor').count(), 5)
+
+    def test_stale_job_is_resumed_where_it_stopped(self):
+        pks = [user.pk for user in self.users]
+        job = BulkJob.objects.create(
+            action='deactivate', pks=pks, total=len(pks), done=2,
+            updated_at=timezone.now() - timedelta(hours=1),
+        )
+        BulkJob.objects.create(action='activate', pks=[], total=0, state=BulkJob.DONE,
+                               finished_at=timezone.now() - timedelta(days=30))
+        call_command('run_bulk_jobs', verbosity=0)
+
+        job.refresh_from_db()
+        self.assertEqual((job.state, job.done), (BulkJob.DONE, 5))
+        self.assertEqual(
+            list(CustomUser.objects.filter(pk__in=pks).order_by('pk').values_list('is_active', flat=True)),
+            [True, True, False, False, False],
+        )
+        self.assertEqual(list(BulkJob.objects.all()), [job])
+
+    def test_forced_password_reset_emails_a_link_back_in(self):
+        user = self.users[0]
+        user_client = Client()
+        user_client.force_login(user)
+        self.post_action('force_password_reset', [user])
+        self.assertEqual(user_client.get('/users/dashboard/').status_code, 302)
+        self.assertFalse(self.client.login(username=user.username, password='x'))
+
+        dispatch_outbox()
+        self.assertEqual(mail.outbox[0].to, [user.email])
+        path = re.search(r'http://localhost:8000(/users/password-reset/\S+/)', mail.outbox[0].body).group(1)
+        response = user_client.post(path, {'new_password1': 'N3w!Passw0rd#', 'new_password2': 'N3w!Passw0rd#'})
+        self.assertRedirects(response, '/users/login/', fetch_redirect_response=False)
+        self.assertTrue(user_client.login(username=user.username, password='N3w!Passw0rd#'))
+
+        # The link works once
+        response = user_client.post(path, {'new_password1': 'An0ther!Pass#', 'new_password2': 'An0ther!Pass#'})
+        self.assertRedirects(response, '/users/password-reset/', fetch_redirect_response=False)
+
+
+class PasswordResetTests(TestCase):
+    def test_reset_link_is_sent_only_to_known_addresses(self):
+        CustomUser.objects.create_user(username='tara', email='tara@example.com', password='x')
+        for email in ('tara@example.com', 'nobody@example.com'):
+            response = self.client.post('/users/password-reset/', {'email': email})
+            self.assertRedirects(response, '/users/login/', fetch_redirect_response=False)
+        self.assertEqual(
+            list(EmailOutbox.objects.values_list('to_email', 'subject')), [('tara@example.com', RESET_SUBJECT)]
+        )
+
+    def test_forged_link_is_rejected(self):
+        user = CustomUser.objects.create_user(username='tara', email='tara@example.com', password='x')
+        response = self.client.get(f'/users/password-reset/{user.pk}/forged-token/')
+        self.assertRedirects(response, '/users/password-reset/', fetch_redirect_response=False)
+
+
+class CompressionMiddlewareTests(TestCase):
+    def setUp(self):
+        body_cache.clear()
+        self.addCleanup(body_cache.clear)
+
+    def compress(self, body, content_type='application/json', accept='gzip, deflate', token=False, shared=True):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept)
+        if token:
+            request.META['CSRF_COOKIE_NEEDS_UPDATE'] = True
+        response = HttpResponse(body, content_type=content_type)
+        response.shared_body = shared
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_shared_bodies_are_compressed_once(self):
+        body = '{"results": [%s]}' % ', '.join(['{"city": "Pune"}'] * 100)
+        first = self.compress(body)
+        second = self.compress(body)
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+        self.assertEqual(first['Vary'], 'Accept-Encoding')
+        self.assertEqual(gzip.decompress(first.content).decode(), body)
+        self.assertEqual(first.content, second.content)
+        self.assertEqual((body_cache.hits, body_cache.misses), (1, 1))
+
+    def test_small_unaccepted_and_binary_responses_are_left_alone(self):
+        body = 'x' * 1000
+        self.assertFalse(self.compress('{}').has_header('Content-Encoding'))
+        self.assertFalse(self.compress(body, accept='gzip;q=0, identity').has_header('Content-Encoding'))
+        self.assertFalse(self.compress(body, content_type='image/png').has_header('Content-Encoding'))
+
+    def test_token_bearing_pages_are_padded_and_not_cached(self):
+        body = '<html>%s</html>' % ('<p>Sign in</p>' * 100)
+        lengths = {len(self.compress(body, 'text/html', token=True).content) for _ in range(10)}
+        response = self.compress(body, 'text/html', accept='br, gzip', token=True)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content).decode(), body)
+        self.assertGreater(len(lengths), 1)
+        self.assertEqual(len(body_cache), 0)
+
+        response = self.client.get('/users/login/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(response.content))
+        self.assertEqual(len(body_cache), 0)
+
+    def test_only_shared_responses_are_kept(self):
+        body = '{"results": [%s]}' % ', '.join(['{"city": "Pune"}'] * 100)
+        self.assertEqual(gzip.decompress(self.compress(body, shared=False).content).decode(), body)
+        self.assertEqual(len(body_cache), 0)
+
+        for i in range(3):
+            user = CustomUser.objects.create_user(
+                username=f'dash{i}', email=f'dash{i}@example.com', password='x', address_line1='1 MG Road' * 60,
+            )
+            self.client.force_login(user)
+            response = self.client.get('/users/dashboard/patient/', HTTP_ACCEPT_ENCODING='gzip')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(body_cache), 0)
+
+        # Marked shared, but the view read the session
+        with mock.patch('auth_project.compression.has_vary_header', return_value=True):
+            self.compress(body)
+        self.assertEqual(len(body_cache), 0)
+        self.compress(body)
+        self.assertEqual(len(body_cache), 1)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(sampler.flusher, 'start')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_samples_are_reported_as_collapsed_stacks(self):
+        def busy(seconds):
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                pass
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(PROFILING_DIR=directory.name, PROFILING_INTERVAL=0.001):
+            sampler.start('users:login')
+            try:
+                busy(0.2)
+            finally:
+                sampler.stop()
+            sampler.flush()
+
+        output = io.StringIO()
+        call_command('profile_report', dir=directory.name, view=['users:login'], stdout=output)
+        stacks = output.getvalue().splitlines()
+        self.assertTrue(stacks)
+        self.assertTrue(all(line.startswith('users:login;') for line in stacks))
+        self.assertTrue(any(line.rpartition(' ')[0].endswith('<locals>.busy') for line in stacks))
+
+    @override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0)
+    def test_staff_can_force_profiling(self):
+        user = CustomUser.objects.create_user(username='nina', email='nina@example.com', password='x')
+        self.client.force_login(user)
+        with mock.patch.object(sampler, 'start') as start, mock.patch.object(sampler, 'stop') as stop:
+            self.client.get('/users/dashboard/patient/', {'_profile': '1'})
+            start.assert_not_called()
+
+            user.is_staff = True
+            user.save()
+            self.client.get('/users/dashboard/patient/', {'_profile': '1'})
+            self.assertEqual(start.call_args.args[0], 'users:patient_dashboard')
+            stop.assert_called_once()
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        long_ago = timezone.now() - timedelta(days=800)
+        self.dormant = CustomUser.objects.create_user(
+            username='dormant', email='dormant@example.com', password='Str0ng!Passw0rd#', city='Pune'
+        )
+        self.dormant.groups.add(Group.objects.create(name='Readers'))
+        CustomUser.objects.filter(pk=self.dormant.pk).update(last_login=long_ago, created_at=long_ago)
+        self.created_at = long_ago
+        self.staff = CustomUser.objects.create_user(
+            username='oldadmin', email='oldadmin@example.com', password='x', is_staff=True
+        )
+        CustomUser.objects.filter(pk=self.staff.pk).update(last_login=long_ago)
+        CustomUser.objects.create_user(username='recent', email='recent@example.com', password='x')
+
+    def archive(self):
+        call_command('archive_inactive_users', days=365, verbosity=0)
+
+    def test_archived_names_stay_taken(self):
+        self.archive()
+        self.assertEqual(list(ArchivedUser.objects.values_list('username', flat=True)), ['dormant'])
+        self.assertEqual(
+            sorted(CustomUser.objects.values_list('username', flat=True)), ['oldadmin', 'recent']
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.post('/users/ajax/check-username/', {'username': 'dormant'})
+        self.assertFalse(response.json()['available'])
+        response = self.client.post('/users/ajax/check-email/', {'email': 'dormant@example.com'})
+        self.assertFalse(response.json()['available'])
+
+    def test_login_restores_archived_user(self):
+        self.archive()
+        response = self.client.post('/users/login/', {'username': 'dormant', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(ArchivedUser.objects.filter(username='dormant').exists())
+
+        response = self.client.post('/users/login/', {'username': 'dormant@example.com', 'password': 'Str0ng!Passw0rd#'})
+        self.assertRedirects(response, '/users/dashboard/', fetch_redirect_response=False)
+        self.assertFalse(ArchivedUser.objects.exists())
+        user = CustomUser.objects.get(username='dormant')
+        self.assertEqual(user.pk, self.dormant.pk)
+        self.assertEqual((user.city, user.created_at), ('Pune', self.created_at))
+        self.assertEqual(list(user.groups.values_list('name', flat=True)), ['Readers'])
+
+
+def async_auth_urlconf():
+    """The project's URLs with the async login and signup views"""
+    from types import ModuleType
+
+    from django.urls import include, path
+
+    from . import urls, views
+
+    patterns = [pattern for pattern in urls.urlpatterns if pattern.name not in ('login', 'signup')] + [
+        path('login/', views.async_login_view, name='login'),
+        path('signup/', views.async_signup_view, name='signup'),
+    ]
+    urlconf = ModuleType('async_auth_urls')
+    urlconf.urlpatterns = [path('users/', include((patterns, 'users')))]
+    return urlconf
+
+
+class AsyncAuthViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.addClassCleanup(pool.shutdown)
+        urlconf = override_settings(ROOT_URLCONF=async_auth_urlconf())
+        urlconf.enable()
+        cls.addClassCleanup(urlconf.disable)
+
+    async def test_signup_then_login_hash_in_the_pool(self):
+        response = await self.async_client.post('/users/signup/', {
+            'user_type': 'patient', 'first_name': 'Ria', 'last_name': 'Das',
+            'username': 'riadas', 'email': 'ria@example.com',
+            'address_line1': '1 MG Road', 'city': 'Pune', 'state': 'Maharashtra',
+            'pincode': '411001', 'password1': 'Str0ng!Passw0rd#', 'password2': 'Str0ng!Passw0rd#',
+        })
+        self.assertRedirects(response, '/users/dashboard/', fetch_redirect_response=False)
+        user = await CustomUser.objects.aget(username='riadas')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+        await self.async_client.alogout()
+        response = await self.async_client.post('/users/login/', {'username': 'riadas', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 200)
+        response = await self.async_client.post(
+            '/users/login/', {'username': 'ria@example.com', 'password': 'Str0ng!Passw0rd#'}
+        )
+        self.assertRedirects(response, '/users/dashboard/', fetch_redirect_response=False)
+        self.assertEqual(pool.pending, 0)
+
+    @override_settings(PASSWORD_HASHING_MAX_PENDING=0)
+    async def test_full_pool_sheds_logins(self):
+        response = await self.async_client.post('/users/login/', {'username': 'riadas', 'password': 'x'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    async def test_broken_pool_sheds_the_call_and_starts_again(self):
+        with self.assertRaises(HashingOverloaded):
+            await pool.submit(os._exit, 1)
+        self.assertEqual(pool.pending, 0)
+        self.assertTrue((await make_password('Str0ng!Passw0rd#')).startswith('pbkdf2_sha256$'))
+
+
+class EmailVerificationTests(TestCase):
+    signup_data = {
+        'user_type': 'patient', 'first_name': 'Ria', 'last_name': 'Das',
+        'username': 'riadas', 'email': 'ria@example.com',
+        'address_line1': '1 MG Road', 'city': 'Pune', 'state': 'Maharashtra',
+        'pincode': '411001', 'password1': 'Str0ng!Passw0rd#', 'password2': 'Str0ng!Passw0rd#',
+    }
+
+    def test_signup_queues_email_and_link_verifies(self):
+        response = self.client.post('/users/signup/', self.signup_data)
+        self.assertRedirects(response, '/users/dashboard/', fetch_redirect_response=False)
+        queued = EmailOutbox.objects.get()
+        self.assertEqual((queued.to_email, queued.status), ('ria@example.com', EmailOutbox.PENDING))
+        self.assertEqual(mail.outbox, [])
+        self.assertContains(self.client.get('/users/dashboard/', follow=True), 'verify-banner')
+
+        self.assertEqual(dispatch_outbox(), 1)
+        self.assertEqual(EmailOutbox.objects.get().status, EmailOutbox.SENT)
+        self.assertEqual(mail.outbox[0].to, ['ria@example.com'])
+        path = re.search(r'http://testserver(/users/verify-email/\S+/)', mail.outbox[0].body).group(1)
+
+        response = self.client.get(path, follow=True)
+        self.assertNotContains(response, 'verify-banner')
+        self.assertTrue(CustomUser.objects.get(username='riadas').email_verified)
+
+    def test_invalid_links_are_rejected(self):
+        user = CustomUser.objects.create_user(username='asha', email='asha@example.com', password='x')
+        token = make_verification_token(user)
+        with self.assertRaises(InvalidVerificationToken):
+            verify_email(token[:-1] + ('A' if token[-1] != 'A' else 'B'))
+        with override_settings(EMAIL_VERIFICATION_MAX_AGE=timedelta(seconds=-1)):
+            with self.assertRaises(InvalidVerificationToken):
+                verify_email(token)
+        CustomUser.objects.filter(pk=user.pk).update(email='asha.rao@example.com')
+        with self.assertRaises(InvalidVerificationToken):
+            verify_email(token)
+        self.assertFalse(CustomUser.objects.get(pk=user.pk).email_verified)
+
+    @override_settings(EMAIL_OUTBOX_BATCH_SIZE=2)
+    def test_dispatch_sends_in_batches_over_one_connection(self):
+        for n in range(5):
+            queue_email(f'user{n}@example.com', 'Hello', 'Hi')
+        with mock.patch('users.outbox.get_connection', wraps=mail.get_connection) as get_connection:
+            self.assertEqual(dispatch_outbox(), 5)
+        self.assertEqual(get_connection.call_count, 3)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(dispatch_outbox(), 0)
+
+    def test_first_request_starts_the_dispatcher(self):
+        with mock.patch.object(dispatcher, 'start') as start:
+            self.client.get('/users/login/')
+            start.assert_not_called()
+            with override_settings(EMAIL_OUTBOX_DISPATCH_INTERVAL=5):
+                self.client.get('/users/login/')
+            start.assert_called_once_with()
+
+    def test_dispatcher_sends_nothing_at_exit(self):
+        with mock.patch.object(dispatcher, '_thread', None), mock.patch.object(dispatcher, '_pid', None), \
+                mock.patch('users.background.threading.Thread'), \
+                mock.patch('users.background.atexit.register') as register:
+            dispatcher.start()
+        register.assert_not_called()
+
+    @override_settings(EMAIL_OUTBOX_MAX_ATTEMPTS=3, EMAIL_OUTBOX_RETRY_DELAY=30)
+    def test_failures_back_off_then_give_up(self):
+        email = queue_email('asha@example.com', 'Hello', 'Hi')
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('refused')), \
+                self.assertLogs('users.outbox', 'WARNING'):
+            self.assertEqual(dispatch_outbox(), 0)
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), (EmailOutbox.PENDING, 1, 'refused'))
+            self.assertGreater(email.send_after, timezone.now() + timedelta(seconds=25))
+            # Not due yet
+            self.assertEqual(dispatch_outbox(), 0)
+            self.assertEqual(EmailOutbox.objects.get().attempts, 1)
+
+            for _ in range(2):
+                EmailOutbox.objects.update(send_after=timezone.now())
+                dispatch_outbox()
+            email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (EmailOutbox.FAILED, 3))
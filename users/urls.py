@@ -1,21 +1,41 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'users'
 
+#Async login/signup hash passwords in a process pool, for ASGI deployments
+if settings.ASYNC_AUTH_VIEWS:
+    signup_view, login_view = views.async_signup_view, views.async_login_view
+else:
+    signup_view, login_view = views.signup_view, views.login_view
+
 urlpatterns = [
     #Authentication URLS
-    path('signup/', views.signup_view, name='signup'),
-    path('login/', views.login_view, name='login'),
+    path('signup/', signup_view, name='signup'),
+    path('login/', login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
+    path('verify-email/resend/', views.resend_verification_email, name='resend_verification'),
+    path('verify-email/<str:token>/', views.verify_email_view, name='verify_email'),
+    path('password-reset/', views.password_reset_request_view, name='password_reset'),
+    path('password-reset/<str:uidb64>/<str:token>/', views.password_reset_confirm_view, name='password_reset_confirm'),
     
     #Dashboard URLS
     path('dashboard/', views.dashboard_redirect, name='dashboard_redirect'),
     path('dashboard/patient/', views.patient_dashboard, name='patient_dashboard'),
     path('dashboard/doctor/', views.doctor_dashboard, name='doctor_dashboard'),
+    path('doctors/', views.doctor_directory, name='doctor_directory'),
     
     #AJAX Validation URLS
     path('ajax/check-username/', views.check_username_availability, name='check_username'),
     path('ajax/check-email/', views.check_email_availability, name='check_email'),
     path('ajax/validate-password/', views.validate_password, name='validate_password'),
+    path('ajax/postal-lookup/', views.postal_lookup, name='postal_lookup'),
+
+    #Token API URLS
+    path('api/token/', views.api_token_obtain, name='api_token_obtain'),
+    path('api/token/refresh/', views.api_token_refresh, name='api_token_refresh'),
+    path('api/token/revoke/', views.api_token_revoke, name='api_token_revoke'),
+    path('api/dashboard/', views.api_dashboard, name='api_dashboard'),
+    path('api/profile/', views.api_profile, name='api_profile'),
 ]
\ No newline at end of file
@@ -0,0 +1,68 @@
+"""
+Username suggestions for the signup form.
+
+Alternatives are built from the requested name and the user's first and last
+name, and all of them, the requested name included, are checked with a single
+`username__in` query over live and archived users.
+"""
+
+import random
+import re
+
+from .models import ArchivedUser, CustomUser
+
+# Characters Django's username validator does not allow
+DISALLOWED = re.compile(r'[^\w.@+-]')
+MAX_LENGTH = CustomUser._meta.get_field('username').max_length
+
+
+def clean_part(value):
+    return DISALLOWED.sub('', value.strip().lower())
+
+
+def username_candidates(username, first_name='', last_name='', rng=random):
+    """Alternatives to username, most natural first, without duplicates"""
+    base = DISALLOWED.sub('', username.strip())
+    first = clean_part(first_name)
+    last = clean_part(last_name)
+
+    candidates = []
+    if first and last:
+        candidates += [
+            f'{first}.{last}', f'{first}_{last}', f'{first}{last}',
+            f'{first[0]}{last}', f'{first}{last[0]}', f'{last}.{first}',
+        ]
+    if base:
+        candidates += [f'{base}{n}' for n in range(1, 4)]
+        if first and first not in base.lower():
+            candidates.append(f'{base}_{first}')
+        if last and last not in base.lower():
+            candidates.append(f'{base}.{last}')
+        candidates += [f'{base}{rng.randrange(10, 1000)}' for _ in range(3)]
+    if first and last:
+        candidates += [f'{first}.{last}{rng.randrange(10, 100)}' for _ in range(2)]
+
+    seen = {username}
+    unique = []
+    for candidate in candidates:
+        if 3 <= len(candidate) <= MAX_LENGTH and candidate not in seen:
+            seen.add(candidate)
+            unique.append(candidate)
+    return unique
+
+
+def check_username(username, first_name='', last_name='', count=3):
+    """
+    Whether username is free and, when it is taken, up to count free
+    alternatives. One query either way.
+    """
+    candidates = username_candidates(username, first_name, last_name)
+    names = [username, *candidates]
+    live = CustomUser._base_manager.filter(username__in=names).order_by()
+    archived = ArchivedUser.objects.filter(username__in=names).order_by()
+    taken = set(
+        live.values_list('username', flat=True).union(archived.values_list('username', flat=True), all=True)
+    )
+    if username not in taken:
+        return True, []
+    return False, [candidate for candidate in candidates if candidate not in taken][:count]
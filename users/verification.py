@@ -0,0 +1,68 @@
+"""
+Email verification.
+
+The link in the verification email carries a signed token with the user's
+id and email address, so checking it needs no table of issued tokens: a
+valid signature younger than EMAIL_VERIFICATION_MAX_AGE is proof enough.
+Binding the address means a link stops working once the email is changed.
+"""
+
+from django.conf import settings
+from django.core import signing
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+from .models import CustomUser, EmailOutbox
+from .outbox import queue_email
+
+VERIFICATION_SALT = 'users.verification.email'
+VERIFICATION_SUBJECT = 'Verify your email address'
+
+
+class InvalidVerificationToken(Exception):
+    pass
+
+
+def make_verification_token(user):
+    return signing.dumps({'uid': user.pk, 'em': user.email}, salt=VERIFICATION_SALT)
+
+
+def read_verification_token(token):
+    """(user id, email) from a valid token, or raise InvalidVerificationToken"""
+    try:
+        claims = signing.loads(token, salt=VERIFICATION_SALT, max_age=settings.EMAIL_VERIFICATION_MAX_AGE)
+    except signing.SignatureExpired:
+        raise InvalidVerificationToken('This verification link has expired')
+    except signing.BadSignature:
+        raise InvalidVerificationToken('This verification link is invalid')
+    return claims['uid'], claims['em']
+
+
+def verify_email(token):
+    """Mark the address in token verified, returns the user id"""
+    user_id, email = read_verification_token(token)
+    if not CustomUser.objects.filter(pk=user_id, email=email).update(email_verified=True):
+        # The account is gone or its email has changed since
+        raise InvalidVerificationToken('This verification link is no longer valid')
+    return user_id
+
+
+def send_verification_email(user, request):
+    """
+    Queue the verification email for user. Call it in the transaction that
+    creates or changes the user, so the email goes out only if that commits.
+    """
+    url = request.build_absolute_uri(reverse('users:verify_email', args=[make_verification_token(user)]))
+    body = render_to_string('users/emails/verify_email.txt', {
+        'user': user,
+        'url': url,
+        'days': settings.EMAIL_VERIFICATION_MAX_AGE.days,
+    })
+    return queue_email(user.email, VERIFICATION_SUBJECT, body, user=user)
+
+
+def verification_pending(user):
+    """Whether a verification email for user is still waiting to be sent"""
+    return EmailOutbox.objects.filter(
+        user=user, subject=VERIFICATION_SUBJECT, status=EmailOutbox.PENDING
+    ).exists()
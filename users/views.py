@@ -1,17 +1,37 @@
 from django.shortcuts import render, redirect
-from django.contrib.auth import login, logout, authenticate
+from asgiref.sync import sync_to_async
+from django.contrib.auth import alogin, login, logout
+from django.contrib.auth.signals import user_logged_in
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.conf import settings
+from django.db import transaction
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
 from django.views.decorators.http import require_http_methods
-from django.views.decorators.cache import never_cache
-from django.http import JsonResponse
+from django.views.decorators.cache import cache_control, never_cache
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from functools import lru_cache
+import json
 import re
-from .forms import SignUpForm, LoginForm
+from auth_project.compression import shared_response
+from .archive import is_taken
+from .decorators import invalid_token_response, token_or_session_required
+from .directory import cached_search_doctors
+from .forms import SignUpForm, LoginForm, DoctorDirectoryForm, PasswordResetRequestForm, ResetPasswordForm
+from .hashing import HashingOverloaded, make_password
 from .models import CustomUser
+from .outbox import queue_emails
+from .password_reset import RESET_FIELDS, reset_email, user_from_link
+from .postal import get_postal_index
+from .tokens import InvalidToken, issue_token_pair, revoke_refresh_token, rotate_refresh_token
+from .usernames import check_username
+from .verification import InvalidVerificationToken, send_verification_email, verification_pending, verify_email
 
 # ======= AJAX Validation Views ========
 
+@shared_response
 @require_http_methods(["POST"])
 def check_username_availability(request):
     """AJAX endpoint to check if username is available"""
@@ -31,11 +51,17 @@ def check_username_availability(request):
             'type': 'error'
         })
     
-    #Check if username exists
-    if CustomUser.objects.filter(username=username).exists():
+    #Check the username and its alternatives in one query
+    available, suggestions = check_username(
+        username,
+        request.POST.get('first_name', ''),
+        request.POST.get('last_name', ''),
+    )
+    if not available:
         return JsonResponse({
             'available': False,
             'message': 'This username is already taken',
+            'suggestions': suggestions,
             'type': 'error'
         })
     
@@ -45,6 +71,7 @@ def check_username_availability(request):
         'type': 'success'
     })
 
+@shared_response
 @require_http_methods(["POST"])
 def check_email_availability(request):
     """AJAX endpoint to check if email is available"""
@@ -65,8 +92,8 @@ def check_email_availability(request):
             'type': 'error'
         })
     
-    #Check if email exists
-    if CustomUser.objects.filter(email=email).exists():
+    #Check if email exists, archived users included
+    if is_taken('email', email):
         return JsonResponse({
             'available': False,
             'message': 'This email address is already registered',
@@ -130,8 +157,52 @@ def validate_password(request):
         'type': 'success' if valid and strength != 'weak' else 'warning'
     })
 
+@shared_response
+@cache_control(max_age=3600)
+@require_http_methods(["GET"])
+def postal_lookup(request):
+    """AJAX endpoint suggesting pincodes or cities for what has been typed"""
+    query = request.GET.get('q', '').strip()[:100]
+
+    #Wait for two characters before suggesting anything
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+
+    return JsonResponse({'results': get_postal_index().lookup(query)})
+
 # ==================== Original Views ====================
 
+SIGNUP_CSRF_PLACEHOLDER = '__signup_csrf_token__'
+
+@lru_cache(maxsize=1)
+def signup_page_skeleton():
+    """
+    The blank signup page rendered once, with a placeholder where the
+    per-request CSRF token goes. Anonymous visitors all get the same page.
+    """
+    return render_to_string('users/signup.html', {
+        'form': SignUpForm(),
+        'title': 'Sign Up',
+        'csrf_token': SIGNUP_CSRF_PLACEHOLDER,
+    })
+
+
+def create_account(form, request, encoded_password=None):
+    """Save the signup form and queue the verification email in one transaction"""
+    with transaction.atomic():
+        user = form.save(encoded_password=encoded_password)
+        send_verification_email(user, request)
+    return user
+
+
+def blank_signup_page(request):
+    """Serve the cached blank form, re-rendered on every request while DEBUG is on"""
+    if settings.DEBUG:
+        signup_page_skeleton.cache_clear()
+    html = signup_page_skeleton().replace(SIGNUP_CSRF_PLACEHOLDER, get_token(request))
+    return HttpResponse(html)
+
+
 @never_cache
 @require_http_methods(["GET", "POST"])
 def signup_view(request):
@@ -143,7 +214,7 @@ def signup_view(request):
         form = SignUpForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                user = form.save()
+                user = create_account(form, request)
                 #Log the user in automatically after signup
                 login(request, user)
                 messages.success(
@@ -158,12 +229,14 @@ def signup_view(request):
                     f'An error occurred during registration: {str(e)}'
                 )
         else:
-            # Display form errors
-            for field, errors in form.errors.items():
-                for error in errors:
-                    messages.error(request, f'{field}: {error}')
+            # Display form errors as one message
+            messages.error(request, '; '.join(
+                f'{field}: {error}'
+                for field, errors in form.errors.items()
+                for error in errors
+            ))
     else:
-        form = SignUpForm()
+        return blank_signup_page(request)
     
     context = {
         'form': form,
@@ -181,25 +254,111 @@ def login_view(request):
     if request.method == 'POST':
         form = LoginForm(request, data=request.POST)
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
+            #The form has authenticated the user already
+            user = form.get_user()
+            login(request, user)
+            messages.success(
+                request,
+                f'Welcome back, {user.get_full_name()}!'
+            )
+            #Redirect to next page or dashboard
+            next_url = request.GET.get('next')
+            if next_url:
+                return redirect(next_url)
+            return redirect('users:dashboard_redirect')
+        else:
+            messages.error(
+                request,
+                'Invalid username or password. Please try again.'
+            )
+    else:
+        form = LoginForm()
+        
+    context = {
+        'form': form,
+        'title': 'Login'
+    }
+    return render(request, 'users/login.html', context)
+
+# ==================== Async Authentication Views ====================
+# Used instead of signup_view and login_view when ASYNC_AUTH_VIEWS is on and
+# the app is served by auth_project/asgi.py. Passwords are hashed in the
+# users.hashing process pool rather than on the event loop.
+
+def hashing_overloaded():
+    """Answer for a login or signup shed because the hashing pool is full"""
+    return HttpResponse(
+        'The server is busy. Please try again in a moment.',
+        status=503,
+        headers={'Retry-After': '1'},
+    )
+
+@never_cache
+@require_http_methods(["GET", "POST"])
+async def async_signup_view(request):
+    """signup_view for ASGI"""
+    if (await request.auser()).is_authenticated:
+        return redirect('users:dashboard_redirect')
+
+    if request.method == 'POST':
+        form = SignUpForm(request.POST, request.FILES)
+        if await sync_to_async(form.is_valid)():
+            try:
+                encoded_password = await make_password(form.cleaned_data['password1'])
+            except HashingOverloaded:
+                return hashing_overloaded()
+            try:
+                user = await sync_to_async(create_account)(form, request, encoded_password)
+                await alogin(request, user)
                 messages.success(
                     request,
-                    f'Welcome back, {user.get_full_name()}!'
+                    f'Welcome {user.get_full_name()}! Your account has been created successfully.'
                 )
-                #Redirect to next page or dashboard
-                next_url = request.GET.get('next')
-                if next_url:
-                    return redirect(next_url)
                 return redirect('users:dashboard_redirect')
-            else:
+            except Exception as e:
                 messages.error(
                     request,
-                    'Invalid username or password. Please try again.'
+                    f'An error occurred during registration: {str(e)}'
                 )
+        else:
+            messages.error(request, '; '.join(
+                f'{field}: {error}'
+                for field, errors in form.errors.items()
+                for error in errors
+            ))
+    else:
+        return blank_signup_page(request)
+
+    context = {
+        'form': form,
+        'title': 'Sign Up'
+    }
+    return await sync_to_async(render)(request, 'users/signup.html', context)
+
+@never_cache
+@require_http_methods(["GET", "POST"])
+async def async_login_view(request):
+    """login_view for ASGI"""
+    if (await request.auser()).is_authenticated:
+        return redirect('users:dashboard_redirect')
+
+    if request.method == 'POST':
+        form = LoginForm(request, data=request.POST)
+        try:
+            valid = await form.ais_valid()
+        except HashingOverloaded:
+            return hashing_overloaded()
+        if valid:
+            user = form.get_user()
+            await alogin(request, user)
+            messages.success(
+                request,
+                f'Welcome back, {user.get_full_name()}!'
+            )
+            next_url = request.GET.get('next')
+            if next_url:
+                return redirect(next_url)
+            return redirect('users:dashboard_redirect')
         else:
             messages.error(
                 request,
@@ -207,12 +366,84 @@ def login_view(request):
             )
     else:
         form = LoginForm()
-        
+
     context = {
         'form': form,
         'title': 'Login'
     }
-    return render(request, 'users/login.html', context)
+    return await sync_to_async(render)(request, 'users/login.html', context)
+
+@require_http_methods(["GET"])
+def verify_email_view(request, token):
+    """Mark the email address in a verification link verified"""
+    try:
+        verified_id = verify_email(token)
+    except InvalidVerificationToken as e:
+        messages.error(request, f'{e}. You can ask for a new one from your dashboard.')
+    else:
+        messages.success(request, 'Thank you, your email address is verified.')
+        if request.user.is_authenticated and request.user.pk == verified_id:
+            request.user.email_verified = True
+    if request.user.is_authenticated:
+        return redirect('users:dashboard_redirect')
+    return redirect('users:login')
+
+@login_required
+@require_http_methods(["POST"])
+def resend_verification_email(request):
+    """Queue a new verification email for the logged in user"""
+    user = request.user
+    if user.email_verified:
+        messages.info(request, 'Your email address is already verified.')
+    elif verification_pending(user):
+        messages.info(request, 'A verification email is already on its way.')
+    else:
+        with transaction.atomic():
+            send_verification_email(CustomUser.objects.get(pk=user.pk), request)
+        messages.success(request, 'We have sent you a new verification email.')
+    return redirect('users:dashboard_redirect')
+
+@never_cache
+@require_http_methods(["GET", "POST"])
+def password_reset_request_view(request):
+    """Email a password reset link to the account using an address"""
+    if request.method == 'POST':
+        form = PasswordResetRequestForm(request.POST)
+        if form.is_valid():
+            user = CustomUser.objects.filter(
+                email=form.cleaned_data['email'], is_active=True
+            ).only('pk', *RESET_FIELDS).first()
+            if user is not None:
+                with transaction.atomic():
+                    queue_emails([reset_email(user, request)])
+            #Same answer either way, so the form does not tell who has an account
+            messages.success(
+                request,
+                'If an account uses that address, we have sent it a link to reset the password.'
+            )
+            return redirect('users:login')
+    else:
+        form = PasswordResetRequestForm()
+    return render(request, 'users/password_reset.html', {'form': form, 'title': 'Reset Password'})
+
+@never_cache
+@require_http_methods(["GET", "POST"])
+def password_reset_confirm_view(request, uidb64, token):
+    """Set a new password from a reset link"""
+    user = user_from_link(uidb64, token)
+    if user is None:
+        messages.error(request, 'This password reset link is invalid or has already been used. You can ask for a new one.')
+        return redirect('users:password_reset')
+
+    if request.method == 'POST':
+        form = ResetPasswordForm(user, request.POST)
+        if form.is_valid():
+            form.save()
+            messages.success(request, 'Your password has been changed. You can log in with it now.')
+            return redirect('users:login')
+    else:
+        form = ResetPasswordForm(user)
+    return render(request, 'users/password_reset_confirm.html', {'form': form, 'title': 'Choose a New Password'})
 
 @login_required
 def logout_view(request):
@@ -242,7 +473,7 @@ def patient_dashboard(request):
         return redirect('users:dashboard_redirect')
     
     context = {
-        'user': request.user,
+        'user': CustomUser.objects.for_dashboard().get(pk=request.user.pk),
         'title': 'Patient Dashboard'
     }
     return render(request, 'users/patient_dashboard.html', context)
@@ -256,10 +487,119 @@ def doctor_dashboard(request):
         return redirect('users:dashboard_redirect')
     
     context = {
-        'user': request.user,
+        'user': CustomUser.objects.for_dashboard().get(pk=request.user.pk),
         'title': 'Doctor Dashboard'
     }
     return render(request, 'users/doctor_dashboard.html', context)
+
+@login_required
+def doctor_directory(request):
+    """Doctor directory for Patient users"""
+    if request.user.user_type != 'patient':
+        messages.error(request, 'Access denied. You are not a patient.')
+        return redirect('users:dashboard_redirect')
+
+    form = DoctorDirectoryForm(request.GET)
+    filters = form.cleaned_data if form.is_valid() else {}
+    doctors, next_cursor = cached_search_doctors(
+        {key: value for key, value in filters.items() if value},
+        cursor=request.GET.get('cursor'),
+        limit=settings.DOCTOR_DIRECTORY_PAGE_SIZE,
+    )
+
+    #Keep the filters in the page links
+    query = request.GET.copy()
+    first_page = query.urlencode() if query.pop('cursor', None) else None
+    next_page = None
+    if next_cursor:
+        query['cursor'] = next_cursor
+        next_page = query.urlencode()
+    context = {
+        'form': form,
+        'doctors': doctors,
+        'first_page': first_page,
+        'next_page': next_page,
+        'title': 'Find a Doctor'
+    }
+    return render(request, 'users/doctor_directory.html', context)
+
+# ==================== Token API Views ====================
+
+def _api_payload(request):
+    """Request body as a dict, from JSON or form encoding"""
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body or b'{}')
+        except ValueError:
+            return {}
+        return payload if isinstance(payload, dict) else {}
+    return request.POST
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_token_obtain(request):
+    """Exchange username (or email) and password for an access/refresh token pair"""
+    form = LoginForm(request, data=_api_payload(request))
+    if not form.is_valid():
+        return JsonResponse({
+            'error': 'invalid_credentials',
+            'message': 'Invalid username or password.'
+        }, status=400)
+    user = form.get_user()
+    user_logged_in.send(sender=user.__class__, request=request, user=user)
+    return JsonResponse(issue_token_pair(user))
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_token_refresh(request):
+    """Rotate a refresh token into a new token pair"""
+    token = _api_payload(request).get('refresh', '')
+    try:
+        return JsonResponse(rotate_refresh_token(token))
+    except InvalidToken as e:
+        return JsonResponse({'error': 'invalid_token', 'message': str(e)}, status=401)
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def api_token_revoke(request):
+    """Revoke a refresh token"""
+    revoke_refresh_token(_api_payload(request).get('refresh', ''))
+    return JsonResponse({'revoked': True})
+
+@require_http_methods(["GET"])
+@token_or_session_required
+def api_dashboard(request):
+    """Dashboard summary, served from the token claims for token requests"""
+    user = request.user
+    return JsonResponse({
+        'id': user.pk,
+        'username': user.username,
+        'full_name': user.get_full_name(),
+        'user_type': user.user_type,
+        'dashboard': 'doctor' if user.user_type == 'doctor' else 'patient',
+    })
+
+@require_http_methods(["GET"])
+@token_or_session_required
+def api_profile(request):
+    """Full profile of the authenticated user"""
+    user = CustomUser.objects.for_dashboard().filter(pk=request.user.pk).first()
+    if user is None:
+        # A still valid access token for a user deleted or archived since
+        return invalid_token_response('User no longer exists')
+    return JsonResponse({
+        'id': user.pk,
+        'username': user.username,
+        'email': user.email,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'full_name': user.get_full_name(),
+        'user_type': user.user_type,
+        'phone_number': user.phone_number,
+        'address': user.full_address,
+        'profile_picture': user.profile_picture.url if user.profile_picture else None,
+        'date_joined': user.date_joined.isoformat(),
+    })
 #     Handle user registration for both Patient and Doctor
 #     """
 #     if request.user.is_authenticated:
@@ -0,0 +1,139 @@
+"""
+Worker warmup.
+
+Left alone, the first request of every worker imports the views, compiles
+templates, reads CommonPasswordValidator's word list, loads the translation
+catalogs, registers Pillow's plugins and maps the postal index. warm_up()
+does all of that up front and is called from wsgi.py / asgi.py once the
+application is built, so a server that loads the app before forking
+(gunicorn --preload, uwsgi without lazy-apps) does the work once and its
+workers share the memory copy-on-write.
+
+The database is touched only to check it answers, and the connection is closed
+again: a connection opened before the fork must not be shared by workers.
+"""
+
+import gc
+import logging
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES = [
+    'base.html',
+    'users/login.html',
+    'users/signup.html',
+    'users/patient_dashboard.html',
+    'users/doctor_dashboard.html',
+]
+
+
+def warm_urls():
+    from django.urls import get_resolver, reverse
+
+    # Populating the resolver imports every view module
+    get_resolver().url_patterns
+    reverse('users:login')
+
+
+def warm_templates():
+    from django.template.loader import get_template
+
+    for name in TEMPLATES:
+        get_template(name)
+
+
+def warm_password_validation():
+    from django.contrib.auth.hashers import get_hashers
+    from django.contrib.auth.password_validation import get_default_password_validators
+
+    get_default_password_validators()
+    get_hashers()
+
+
+def warm_forms():
+    from .forms import LoginForm, SignUpForm
+    from .views import signup_page_skeleton
+
+    # Rendering loads the widget templates through the form renderer's own
+    # template engine
+    str(LoginForm())
+    str(SignUpForm())
+    if not settings.DEBUG:
+        signup_page_skeleton()
+
+
+def warm_translations():
+    from django.utils import translation
+
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('Password')
+
+
+def warm_pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        return
+    Image.init()
+
+
+def warm_postal_index():
+    from .postal import get_postal_index
+
+    get_postal_index()
+
+
+def warm_database():
+    from django.db import connections
+
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+        except Exception:
+            logger.warning('Warmup could not connect to database %r', alias, exc_info=True)
+    connections.close_all()
+
+
+STEPS = [
+    ('urls', warm_urls),
+    ('templates', warm_templates),
+    ('password_validation', warm_password_validation),
+    ('forms', warm_forms),
+    ('translations', warm_translations),
+    ('pillow', warm_pillow),
+    ('postal_index', warm_postal_index),
+    ('database', warm_database),
+]
+
+
+def warm_up(freeze=None):
+    """
+    Run every warmup step, returns the seconds each one took. With freeze
+    (WORKER_WARMUP_GC_FREEZE by default) the objects created so far are
+    moved out of the garbage collector's reach, so collections in the
+    workers do not write to, and un-share, the parent's pages.
+    """
+    timings = {}
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.exception('Warmup step %s failed', name)
+        timings[name] = time.perf_counter() - start
+    if freeze is None:
+        freeze = settings.WORKER_WARMUP_GC_FREEZE
+    if freeze:
+        gc.collect()
+        gc.freeze()
+    return timings
+
+
+def maybe_warm_up():
+    """Entry point for wsgi.py / asgi.py"""
+    if settings.WORKER_WARMUP:
+        return warm_up()
+    return None